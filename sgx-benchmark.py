@@ -0,0 +1,594 @@
+#!/usr/bin/env python3
+
+import argparse
+import hashlib
+import json
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from collections import deque
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+DOWNLOADER = Path(__file__).resolve().parent / "sgx-downloader.py"
+
+FEED = "derivatives-historical"
+
+FILE_NAME = {
+    "td": "WEBPXTICK_DT.zip",
+    "tds": "TickData_structure.dat",
+    "tc": "TC.txt",
+    "tcs": "TC_structure.dat",
+}
+
+# Name in the Content-Disposition of each file, '{day}' is replaced by the day of the id.
+SAVED_NAME = {
+    "WEBPXTICK_DT.zip": "WEBPXTICK_DT-{day}.zip",
+    "TickData_structure.dat": "TickData_structure.dat",
+    "TC.txt": "TC_{day}.txt",
+    "TC_structure.dat": "TC_structure.dat",
+}
+
+MODES = ["day", "past", "range", "retry", "scan"]
+
+WRITE_CHUNK_SIZE = 16 * 1024
+
+
+###################### Mock server section #############################
+
+
+def _parse_id_ranges(text):
+    """Parse id ranges like '2725-2754,3590' into a set of ids."""
+    ids = set()
+    for part in filter(None, (part.strip() for part in text.split(','))):
+        start, _, end = part.partition('-')
+        ids.update(range(int(start), int(end or start) + 1))
+    return ids
+
+
+class MockFeed:
+    """Calendar of a fake feed: day_ids count back from the pivot over business days.
+
+    Ids in `gaps` have no data and do not take a day, like the not downloadable ids of SGX, so the
+    estimate of the downloader drifts past them and it has to search.
+    """
+
+    def __init__(self, pivot_date, pivot_id, history, gaps, holidays):
+        self.pivot_date = pivot_date
+        self.pivot_id = pivot_id
+        self.gaps = gaps
+        self.days = {}
+        day = pivot_date
+        for qid in range(pivot_id, pivot_id - history, -1):
+            if qid in gaps:
+                continue
+            while day.weekday() >= 5 or day in holidays:
+                day -= timedelta(days=1)
+            self.days[qid] = day
+            day -= timedelta(days=1)
+        self.ids_with_data = sorted(self.days, reverse=True)
+
+    def business_id(self, offset):
+        """The id of the `offset`-th day before the pivot that has data."""
+        return self.ids_with_data[offset]
+
+
+class MockStats:
+    """Counters of the requests served by the mock server."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.requests = 0
+            self.probes = 0
+            self.gets = 0
+            self.errors = 0
+            self.bytes_sent = 0
+            self.files = set()
+            # (method, path, request headers) of each request.
+            self.log = []
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "probes": self.probes,
+                "gets": self.gets,
+                "errors": self.errors,
+                "bytes": self.bytes_sent,
+                "files": len(self.files),
+            }
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    """Serve /1.0.0/<feed>/<id>/<file> like links.sgx.com (HEAD, GET and Range requests)."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _respond(self, send_body):
+        server = self.server
+        stats = server.stats
+        range_header = self.headers.get("Range")
+        is_probe = self.command == "HEAD" or range_header == "bytes=0-0"
+        with stats.lock:
+            stats.requests += 1
+            if is_probe:
+                stats.probes += 1
+            else:
+                stats.gets += 1
+            stats.log.append((self.command, self.path, dict(self.headers)))
+            scripted = server.scripted.popleft() if server.scripted else None
+        if server.latency > 0:
+            time.sleep(server.latency)
+
+        if scripted is not None:
+            status, headers = scripted
+            with stats.lock:
+                stats.errors += status >= 400
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        match = re.match(r"/1\.0\.0/[^/]+/(\d+)/([^/?]+)$", self.path)
+        if match is None:
+            self.send_error(404)
+            return
+        if server.error_rate > 0 and server.random.random() < server.error_rate:
+            with stats.lock:
+                stats.errors += 1
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        qid, file_name = int(match.group(1)), match.group(2)
+        day = server.feed.days.get(qid)
+        if day is None or file_name not in SAVED_NAME:
+            # SGX answers the ids without data with an empty page.
+            self.send_response(200)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        body = server.bodies.get(file_name, server.body)
+        size = len(body)
+        etag = f'"{qid}-{file_name}-{size}"'
+        if file_name in server.bodies:
+            # The same content has the same ETag on every day, like the structure files of SGX.
+            etag = f'"{hashlib.md5(body).hexdigest()}"'
+        if_range = self.headers.get("If-Range")
+        if range_header and if_range and if_range != etag:
+            # The file changed, send the whole file.
+            range_header = None
+        start, end = 0, size - 1
+        if range_header:
+            range_match = re.match(r"bytes=(\d+)-(\d*)$", range_header)
+            if range_match is None or int(range_match.group(1)) >= size:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            start = int(range_match.group(1))
+            end = min(int(range_match.group(2) or size - 1), size - 1)
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        else:
+            self.send_response(200)
+        saved_name = SAVED_NAME[file_name].format(day=day.strftime("%Y%m%d"))
+        self.send_header("Content-Disposition",
+                         f'attachment; filename="{saved_name}"')
+        if server.etag:
+            self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+        if not send_body:
+            return
+
+        body = body[start:end + 1]
+        if not is_probe and self.path in server.cut:
+            # Break the connection in the middle of the body, once.
+            with stats.lock:
+                server.cut.discard(self.path)
+            body = body[:len(body) // 2]
+            self.close_connection = True
+        for offset in range(0, len(body), WRITE_CHUNK_SIZE):
+            chunk = body[offset:offset + WRITE_CHUNK_SIZE]
+            self.wfile.write(chunk)
+            with stats.lock:
+                stats.bytes_sent += len(chunk)
+            if server.bandwidth > 0:
+                time.sleep(len(chunk) / server.bandwidth)
+        if not is_probe and end == size - 1 and not self.close_connection:
+            with stats.lock:
+                stats.files.add(self.path)
+
+    def do_HEAD(self):
+        self._respond(False)
+
+    def do_GET(self):
+        self._respond(True)
+
+
+def start_mock_server(feed, file_size, latency, bandwidth, error_rate, seed):
+    """Start the mock SGX server on a free local port in a daemon thread.
+
+    Args:
+        feed (MockFeed): Calendar of the feed.
+        file_size (int): Size of every file in bytes.
+        latency (float): Delay in seconds before each response.
+        bandwidth (float): Bytes per second of each connection (0 for no limit).
+        error_rate (float): Probability that a request is answered with 503.
+        seed (int): Seed of the error generator.
+
+    The tests change the answers of the server with its attributes:
+
+    - `bodies`: file name -> content of the file (instead of `file_size` random bytes),
+    - `etag`: send an ETag (True by default),
+    - `cut`: paths whose next GET is closed in the middle of the body,
+    - `scripted`: (status, headers) of the next responses, before any other check.
+
+    Returns:
+        ThreadingHTTPServer: The running server (its `stats` has the counters).
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockHandler)
+    server.daemon_threads = True
+    server.feed = feed
+    server.file_size = file_size
+    block = random.Random(seed).randbytes(4096)
+    server.body = (block * (file_size // len(block) + 1))[:file_size]
+    server.latency = latency
+    server.bandwidth = bandwidth
+    server.error_rate = error_rate
+    server.random = random.Random(seed)
+    server.stats = MockStats()
+    server.bodies = {}
+    server.etag = True
+    server.cut = set()
+    server.scripted = deque()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+###################### Benchmark section ###############################
+
+
+def _write_config(path, server, args, day="off", start="off", end="off"):
+    """Write a downloader config that points to the mock server."""
+    feed = server.feed
+    port = server.server_address[1]
+    gaps = "" if args.hide_gaps else ",".join(map(str, sorted(feed.gaps)))
+    holidays = "" if args.hide_holidays else ",".join(sorted(args.holidays))
+    lines = [
+        "[BASE]",
+        f"link_pattern = http://127.0.0.1:{port}/1.0.0/{FEED}/%%d/%%s",
+        f"pivotdate = {feed.pivot_date:%Y%m%d}",
+        f"pivotorder = {feed.pivot_id + args.drift}",
+        "dayformat = %%Y%%m%%d",
+        "quiet = true",
+        "output = ./data",
+        "logfile = bench.log",
+        f"loglevel = {args.loglevel}",
+        "errorfile = failed.txt",
+        f"downloadfiles = {','.join(args.file)}",
+        "keyfilename = tc",
+        f"max_retry = {args.max_retry}",
+        f"workers = {args.workers}",
+        f"max_rps = {args.max_rps}",
+        "indexfile =",
+        f"engine = {args.engine}",
+        f"timeout = {args.timeout}",
+        "",
+        "[FILE_NAME]",
+        *(f"{key} = {name}" for key, name in FILE_NAME.items()),
+        "",
+        "[DAYS]",
+        f"day = {day}",
+        f"start = {start}",
+        f"end = {end}",
+        "",
+        "[HOLIDAYS]",
+        f"days = {holidays}",
+        "",
+        "[NOT_DOWNLOADABLE]",
+        f"day_ids = {gaps}",
+        "",
+    ]
+    with open(path, "w") as config_file:
+        config_file.write("\n".join(lines))
+
+
+def _prepare_mode(mode, workdir, server, args):
+    """Write the config (and the failed list for retry) of a mode.
+
+    Returns:
+        tuple: Extra command line arguments and the number of days resolved by the mode.
+    """
+    feed = server.feed
+    config_path = workdir / "bench.cfg"
+    range_end = feed.days[feed.business_id(args.offset)]
+    range_start = feed.days[feed.business_id(args.offset + args.days - 1)]
+    if mode == "day":
+        _write_config(config_path, server, args, day=f"{range_end:%Y%m%d}")
+        return [], 1
+    if mode == "range":
+        _write_config(config_path, server, args,
+                      start=f"{range_start:%Y%m%d}", end=f"{range_end:%Y%m%d}")
+        return [], 2
+    if mode == "past":
+        _write_config(config_path, server, args)
+        return ["--past", str(args.days)], 2
+    if mode == "retry":
+        _write_config(config_path, server, args)
+        port = server.server_address[1]
+        with open(workdir / "retry.txt", "w") as failed_file:
+            failed_file.write("Link\tQueryDay\tErrorType\n")
+            for offset in range(args.offset, args.offset + args.days):
+                qid = feed.business_id(offset)
+                for key in args.file:
+                    failed_file.write(
+                        f"http://127.0.0.1:{port}/1.0.0/{FEED}/{qid}/{FILE_NAME[key]}\t{feed.days[qid]:%Y%m%d}\tURLError\n")
+        return ["--retry", "retry.txt"], 0
+    # scan
+    _write_config(config_path, server, args)
+    end_id = feed.pivot_id - args.offset
+    return ["--scan-blacklist", f"{end_id - args.scan_ids + 1}-{end_id}"], 0
+
+
+def run_mode(mode, server, args, run_index, workdir):
+    """Run the downloader once in a mode against the mock server and measure it.
+
+    Returns:
+        dict: Measures of the run.
+    """
+    extra, resolutions = _prepare_mode(mode, workdir, server, args)
+    command = [sys.executable, str(args.downloader), "-c", "bench.cfg", *extra]
+    server.stats.reset()
+    start = time.monotonic()
+    with open(workdir / "output.txt", "a") as output_file:
+        returncode = subprocess.call(command, cwd=workdir, stdout=output_file,
+                                     stderr=subprocess.STDOUT)
+    wall_time = time.monotonic() - start
+    stats = server.stats.snapshot()
+    result = {
+        "mode": mode,
+        "run": run_index,
+        "returncode": returncode,
+        "wall_time": round(wall_time, 3),
+        **stats,
+        "resolutions": resolutions,
+        "probes_per_resolution": round(stats["probes"] / resolutions, 2) if resolutions else None,
+        "requests_per_file": round(stats["requests"] / stats["files"], 2) if stats["files"] else None,
+        "mb_per_s": round(stats["bytes"] / wall_time / 1e6, 3),
+    }
+    if mode == "scan":
+        result["probes_per_id"] = round(stats["probes"] / args.scan_ids, 2)
+    return result
+
+
+def print_results(results):
+    """Print the results as a table."""
+    columns = [("mode", "mode"), ("run", "run"), ("wall_time", "wall s"), ("requests", "requests"),
+               ("probes", "probes"), ("probes_per_resolution", "probes/res"), ("files", "files"),
+               ("requests_per_file", "req/file"), ("bytes", "bytes"), ("mb_per_s", "MB/s"),
+               ("errors", "errors"), ("returncode", "rc")]
+    rows = [[title for _, title in columns]]
+    for result in results:
+        rows.append(["-" if result.get(key) is None else str(result[key])
+                     for key, _ in columns])
+    widths = [max(len(row[i]) for row in rows) for i in range(len(columns))]
+    for row in rows:
+        print("  ".join(cell.rjust(width) for cell, width in zip(row, widths)))
+
+
+def run():
+    """Run the benchmark with the settings from the command line."""
+    today = datetime.combine(datetime.today().date(), datetime.min.time())
+    pivot_date = today - timedelta(days=1)
+    while pivot_date.weekday() >= 5:
+        pivot_date -= timedelta(days=1)
+    holidays = {datetime.strptime(day, "%Y%m%d") for day in args.holidays}
+    feed = MockFeed(pivot_date, args.pivot_id, args.history,
+                    _parse_id_ranges(args.gaps), holidays)
+    server = start_mock_server(feed, args.file_size * 1024, args.latency / 1000,
+                               args.bandwidth * 1024, args.error_rate, args.seed)
+    results = []
+    try:
+        for mode in args.mode:
+            with tempfile.TemporaryDirectory(prefix=f"sgx-bench-{mode}-") as tmp_dir:
+                workdir = Path(tmp_dir)
+                for run_index in range(1, args.runs + 1):
+                    result = run_mode(mode, server, args, run_index, workdir)
+                    results.append(result)
+                    if result["returncode"] != 0:
+                        output = (workdir / "output.txt").read_text()
+                        print(f"{mode} run {run_index} failed:\n{output[-2000:]}", file=sys.stderr)
+    finally:
+        server.shutdown()
+    print_results(results)
+    if args.json:
+        with open(args.json, "w") as json_file:
+            json.dump(results, json_file, indent=2)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark sgx-downloader.py against a local mock SGX server")
+    parser.add_argument(
+        "--mode",
+        type=str,
+        nargs='+',
+        choices=MODES,
+        help="Modes to benchmark (default is all of them).",
+        default=MODES
+    )
+    parser.add_argument(
+        "--runs",
+        type=int,
+        help="Number of runs of each mode. The runs of a mode share their directory, so the first run is cold and the next ones use the day index and the manifest.",
+        default=1
+    )
+    parser.add_argument(
+        "--days",
+        type=int,
+        help="Number of days downloaded by the range, past and retry modes.",
+        default=10
+    )
+    parser.add_argument(
+        "--offset",
+        type=int,
+        help="Number of days with data between the last day of the range, retry and scan modes (the day of the day mode) and yesterday.",
+        default=200
+    )
+    parser.add_argument(
+        "--scan-ids",
+        type=int,
+        help="Number of day_ids scanned by the scan mode.",
+        default=200
+    )
+    parser.add_argument(
+        "--file",
+        type=str,
+        nargs='+',
+        choices=list(FILE_NAME),
+        help="Files downloaded for each day.",
+        default=list(FILE_NAME)
+    )
+    parser.add_argument(
+        "--pivot-id",
+        type=int,
+        help="day_id of the last business day before today.",
+        default=5420
+    )
+    parser.add_argument(
+        "--history",
+        type=int,
+        help="Number of day_ids served by the mock server before the pivot.",
+        default=2000
+    )
+    parser.add_argument(
+        "--gaps",
+        type=str,
+        help="day_ids without data (e.g. '5000-5004,5100'). They do not take a day, so the estimated day_ids drift.",
+        default="4900-4904,5100,5101,5300"
+    )
+    parser.add_argument(
+        "--hide-gaps",
+        action="store_true",
+        help="Do not list the gaps in the NOT_DOWNLOADABLE section of the config."
+    )
+    parser.add_argument(
+        "--holidays",
+        type=str,
+        nargs='*',
+        help="Weekdays without data (YYYYMMDD).",
+        default=[]
+    )
+    parser.add_argument(
+        "--hide-holidays",
+        action="store_true",
+        help="Do not list the holidays in the HOLIDAYS section of the config (the downloader learns them from the day_ids it resolves)."
+    )
+    parser.add_argument(
+        "--drift",
+        type=int,
+        help="Error added to the pivotorder of the config (a stale pivot).",
+        default=0
+    )
+    parser.add_argument(
+        "--file-size",
+        type=int,
+        help="Size of each file in KB.",
+        default=256
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        help="Delay before each response in milliseconds.",
+        default=20
+    )
+    parser.add_argument(
+        "--bandwidth",
+        type=float,
+        help="Bandwidth of each connection in KB/s (0 for no limit).",
+        default=0
+    )
+    parser.add_argument(
+        "--error-rate",
+        type=float,
+        help="Probability that a request is answered with 503.",
+        default=0
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        help="Seed of the random errors and file contents.",
+        default=0
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        help="workers of the downloader.",
+        default=1
+    )
+    parser.add_argument(
+        "--engine",
+        type=str,
+        choices=["thread", "async"],
+        help="engine of the downloader.",
+        default="thread"
+    )
+    parser.add_argument(
+        "--max-rps",
+        type=float,
+        help="max_rps of the downloader.",
+        default=0
+    )
+    parser.add_argument(
+        "-m",
+        "--max-retry",
+        type=int,
+        help="max_retry of the downloader.",
+        default=0
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        help="timeout of the downloader in seconds.",
+        default=10
+    )
+    parser.add_argument(
+        "-L",
+        "--loglevel",
+        type=str,
+        help="loglevel of the downloader.",
+        default="info"
+    )
+    parser.add_argument(
+        "--downloader",
+        type=str,
+        help="Path to the downloader script.",
+        default=str(DOWNLOADER)
+    )
+    parser.add_argument(
+        "--json",
+        type=str,
+        help="Save the results to a JSON file (to compare runs).",
+        default=None
+    )
+    args = parser.parse_args()
+    run()
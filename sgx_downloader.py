@@ -0,0 +1,4797 @@
+#!/usr/bin/env python3
+
+import argparse
+import asyncio
+import io
+import logging
+import cgi
+import json
+import os
+import re
+import sys
+import configparser
+import contextlib
+import contextvars
+import copy
+import hashlib
+import heapq
+import http.client
+import platform
+import random
+import shutil
+import ssl
+import threading
+import time
+import zipfile
+import zlib
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, as_completed, wait
+from datetime import datetime, timedelta
+from email.utils import parsedate_to_datetime
+from pathlib import Path, PurePosixPath
+from urllib.error import HTTPError, URLError, ContentTooShortError
+from urllib.parse import urljoin, urlsplit
+
+# Imported on first use (see _load_numpy and _load_pyarrow), so importing this module is fast.
+np = None
+
+pyarrow = None
+
+# The Feed (one config) whose jobs run in the current context.
+FEED = contextvars.ContextVar("feed")
+
+
+class _FeedAttribute:
+    """A module global that is an attribute of the Feed of the current context.
+
+    The functions of the script read the settings and the state of a feed from module globals
+    (`args`, `LINK_PATTERN`, `DAY_INDEX`...). Each of these globals forwards to the Feed set in
+    FEED, so several feeds run in one process, each one in its own context (see Feed.run).
+    """
+
+    def __init__(self, name):
+        object.__setattr__(self, "_name", name)
+
+    def _get(self):
+        return getattr(FEED.get(), self._name)
+
+    def __getattr__(self, name):
+        return getattr(self._get(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._get(), name, value)
+
+    def __getitem__(self, key):
+        return self._get()[key]
+
+    def __setitem__(self, key, value):
+        self._get()[key] = value
+
+    def __contains__(self, item):
+        return item in self._get()
+
+    def __iter__(self):
+        return iter(self._get())
+
+    def __len__(self):
+        return len(self._get())
+
+    def __bool__(self):
+        return bool(self._get())
+
+    def __mod__(self, values):
+        return self._get() % values
+
+    def __str__(self):
+        return str(self._get())
+
+    def __repr__(self):
+        return f"<{self._name} of the current feed>"
+
+
+# Settings of the current feed (the command line options and its config).
+args = _FeedAttribute("args")
+
+# Brute force :)
+NOT_DOWNLOADABLE = _FeedAttribute("not_downloadable")
+
+LINK_PATTERN = _FeedAttribute("link_pattern")
+
+FILE_NAME = _FeedAttribute("file_name")
+
+# The connections are shared by the feeds of a run (see _open_pools).
+HTTP_POOL = _FeedAttribute("http_pool")
+
+ASYNC_POOL = _FeedAttribute("async_pool")
+
+DAY_INDEX = _FeedAttribute("day_index")
+
+CALENDAR = _FeedAttribute("calendar")
+
+METRICS = _FeedAttribute("metrics")
+
+# Number of the try of the file being downloaded (0 for the first one), recorded with each request.
+ATTEMPT = contextvars.ContextVar("attempt", default=0)
+
+MANIFEST = _FeedAttribute("manifest")
+
+MANIFEST_NAME = "sgx-manifest.jsonl"
+
+SCHEMAS = _FeedAttribute("schemas")
+
+# Directory in the output directory that keeps one copy of each version of the structure files.
+SCHEMA_DIR_NAME = "schemas"
+
+BLOB_STORE = _FeedAttribute("blob_store")
+
+# Progress of the downloads of all the feeds (see Progress).
+PROGRESS = _FeedAttribute("progress")
+
+# Seconds between two redraws of the status line on a terminal.
+PROGRESS_TTY_INTERVAL = 0.5
+
+# Directory in the output directory that keeps one copy of each distinct file (with --dedup).
+BLOB_DIR_NAME = "blobs"
+
+# ioctl of Linux that makes a file share the blocks of another file (copy on write).
+FICLONE = 0x40049409
+
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+SCAN_CHECKPOINT_INTERVAL = 10
+
+USER_AGENT = "Python-urllib/%d.%d" % sys.version_info[:2]
+
+# HTTP status codes of a failed download that is worth another try later (rate limiting or outage).
+TRANSIENT_HTTP_CODES = {408, 425, 429, 500, 502, 503, 504}
+
+# Size of the CSV blocks read by --convert (the memory used by a conversion is a few blocks).
+CONVERT_BLOCK_SIZE = 16 * 1024 * 1024
+
+# Column that tells the contract of a row, converted files are partitioned by it.
+CONTRACT_COLUMN = "Comm"
+
+# Data types in *_structure.dat files, the last one found in the line of a column is its type.
+STRUCTURE_TYPE_PATTERN = re.compile(
+    r'\b(bigint|smallint|integer|int|long|decimal|numeric|number|double|float|real|varchar|char|string|text|date|time)\b', re.I)
+
+STRUCTURE_TYPES = {
+    "bigint": "int", "smallint": "int", "integer": "int", "int": "int", "long": "int",
+    "decimal": "float", "numeric": "float", "number": "float", "double": "float", "float": "float", "real": "float",
+}
+
+
+class Feed:
+    """Settings and state of one config (one feed of SGX), so several feeds can run in one process.
+
+    The functions of the script use the feed of the current context through the module globals
+    (see _FeedAttribute), so they are run with Feed.run.
+    """
+
+    def __init__(self, cli_args, config_path):
+        self.args = argparse.Namespace(**vars(cli_args))
+        self.args.config = config_path
+        self.link_pattern = str()
+        self.file_name = dict()
+        self.not_downloadable = None
+        # Whether HEAD responses of the server carry the Content-Disposition (None if not known yet).
+        self.head_supported = None
+        # Whether probes of the structure files carry an ETag (None if not known yet).
+        self.structure_etags = None
+        self.day_index = None
+        self.calendar = None
+        self.metrics = None
+        self.manifest = None
+        self.schemas = None
+        self.blob_store = None
+        self.rate_limiter = None
+        self.http_pool = None
+        self.async_pool = None
+        self.executor = None
+        self.progress = None
+
+    def __str__(self):
+        return self.args.config or "default config"
+
+    def run(self, function, *function_args):
+        """Call a function in a new context where this feed is the current feed."""
+        context = contextvars.copy_context()
+        context.run(FEED.set, self)
+        return context.run(function, *function_args)
+
+
+class FairExecutor:
+    """A pool of worker threads shared by the feeds of a run, with one queue of tasks for each feed.
+
+    The workers take the tasks from the queues of the feeds in turn (round robin), so a feed with
+    many files does not hold back the files of the other feeds. A task runs in the context of the
+    thread that submitted it, so it runs for the same feed.
+    """
+
+    def __init__(self, workers):
+        self.workers = max(workers, 1)
+        self.condition = threading.Condition()
+        self.queues = {}
+        # Feeds with queued tasks in the order they are served.
+        self.turns = deque()
+        self.threads = []
+        self.closed = False
+
+    def submit(self, function, *function_args):
+        """Queue a task for the current feed.
+
+        Returns:
+            Future: The future of the task.
+        """
+        future = Future()
+        context = contextvars.copy_context()
+        feed = FEED.get(None)
+        with self.condition:
+            if self.closed:
+                raise RuntimeError("The executor is closed.")
+            queue = self.queues.setdefault(feed, deque())
+            if not queue:
+                self.turns.append(feed)
+            queue.append((future, context, function, function_args))
+            if len(self.threads) < self.workers:
+                thread = threading.Thread(target=self._work, daemon=True)
+                thread.start()
+                self.threads.append(thread)
+            self.condition.notify()
+        return future
+
+    def _work(self):
+        while True:
+            with self.condition:
+                while not self.turns and not self.closed:
+                    self.condition.wait()
+                if not self.turns:
+                    return
+                feed = self.turns.popleft()
+                queue = self.queues[feed]
+                future, context, function, function_args = queue.popleft()
+                if queue:
+                    self.turns.append(feed)
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = context.run(function, *function_args)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+    def close(self):
+        """Cancel the queued tasks and wait for the running ones."""
+        with self.condition:
+            self.closed = True
+            for queue in self.queues.values():
+                for future, *_ in queue:
+                    future.cancel()
+                queue.clear()
+            self.turns.clear()
+            self.condition.notify_all()
+        for thread in self.threads:
+            thread.join()
+
+
+class Progress:
+    """Progress of all the downloads of a run (shared by the feeds): files, bytes, throughput and ETA.
+
+    On a terminal it is one status line, redrawn at most every PROGRESS_TTY_INTERVAL seconds. Otherwise
+    a JSON status line is written every `interval` seconds for log collectors. A thread redraws the
+    status when no transfer does (e.g. while the downloads stall). Nothing is written when `enabled`
+    is False, the counts are still kept (see status).
+    """
+
+    def __init__(self, interval, enabled=True, stream=None):
+        self.stream = stream or sys.stderr
+        self.tty = self.stream.isatty()
+        self.interval = PROGRESS_TTY_INTERVAL if self.tty else interval
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.start = time.monotonic()
+        self.next_draw = self.start + self.interval
+        self.files = 0
+        self.done = 0
+        self.failed = 0
+        # Transfers in flight: key -> [bytes received, total size or -1].
+        self.active = {}
+        self.bytes = 0
+        # Bytes and number of the finished transfers (for the size of the queued files).
+        self.transferred = 0
+        self.transfers = 0
+        # The status line is on the terminal (it is cleared before a log record, see hidden).
+        self.shown = False
+        self.closed = threading.Event()
+        self.refresher = None
+        if enabled:
+            self.refresher = threading.Thread(target=self._refresh, name="progress", daemon=True)
+            self.refresher.start()
+
+    def _refresh(self):
+        while True:
+            with self.lock:
+                self._draw()
+                delay = self.next_draw - time.monotonic()
+            if self.closed.wait(delay if delay > 0 else self.interval):
+                return
+
+    def add(self, count=1):
+        """Count files to download."""
+        with self.lock:
+            self.files += count
+
+    def finish(self, success):
+        """Count a file done for good."""
+        with self.lock:
+            if success:
+                self.done += 1
+            else:
+                self.failed += 1
+            self._draw()
+
+    @contextlib.contextmanager
+    def transfer(self):
+        """Track the body of a response.
+
+        Yields:
+            callable: Reporthook called with (bytes received, total size or -1) (see _save_body_steps).
+        """
+        key = object()
+
+        def reporthook(received, total_size):
+            with self.lock:
+                entry = self.active.setdefault(key, [0, total_size])
+                self.bytes += received - entry[0]
+                entry[0] = received
+                if time.monotonic() >= self.next_draw:
+                    self._draw()
+
+        try:
+            yield reporthook
+        finally:
+            with self.lock:
+                entry = self.active.pop(key, None)
+                if entry is not None:
+                    self.transferred += entry[0]
+                    self.transfers += 1
+
+    def status(self):
+        """Status of the downloads.
+
+        Returns:
+            dict: Files (total, done, failed, active and queued), bytes received, MB/s and the ETA of
+            all the files in seconds (None while it is not known).
+        """
+        with self.lock:
+            return self._status()
+
+    def _status(self):
+        elapsed = max(time.monotonic() - self.start, 1e-9)
+        active = len(self.active)
+        queued = max(self.files - self.done - self.failed - active, 0)
+        rate = self.bytes / elapsed
+        eta = None
+        known = [total - received for received, total in self.active.values() if total >= 0]
+        if rate > 0 and (self.transfers or not queued) and len(known) == active:
+            average = self.transferred / self.transfers if self.transfers else 0
+            eta = round((sum(known) + queued * average) / rate, 1)
+        return {"files": self.files, "done": self.done, "failed": self.failed, "active": active,
+                "queued": queued, "bytes": self.bytes, "mb_per_s": round(rate / 1e6, 3), "eta": eta}
+
+    def _draw(self, force=False):
+        now = time.monotonic()
+        if not self.enabled or not self.files or (now < self.next_draw and not force):
+            return
+        self.next_draw = now + self.interval
+        status = self._status()
+        if self.tty:
+            eta = "-" if status["eta"] is None else str(timedelta(seconds=round(status["eta"])))
+            self.stream.write(
+                f"\x1b[K{status['done'] + status['failed']}/{status['files']} file(s), {status['active']} active, "
+                f"{status['queued']} queued, {status['failed']} failed, {status['bytes'] / 1e6:.1f} MB, "
+                f"{status['mb_per_s']:.2f} MB/s, ETA {eta}\r")
+            self.shown = True
+        else:
+            self.stream.write(json.dumps({"time": datetime.utcnow().isoformat(timespec="seconds"),
+                                          "progress": status}) + "\n")
+        self.stream.flush()
+
+    @contextlib.contextmanager
+    def hidden(self):
+        """Clear the status line of the terminal while something else is written to it, then draw it again."""
+        with self.lock:
+            shown = self.shown
+            if shown:
+                self.stream.write("\x1b[K")
+                self.stream.flush()
+                self.shown = False
+            yield
+            if shown:
+                self._draw(force=True)
+
+    def close(self):
+        """Stop the refresh and draw the last status."""
+        self.closed.set()
+        if self.refresher is not None:
+            self.refresher.join()
+        with self.lock:
+            self._draw(force=True)
+            if self.shown:
+                self.stream.write("\n")
+                self.stream.flush()
+                self.shown = False
+
+
+class _TokenBucket:
+    """Tokens refilled at a rate per second, up to `burst` tokens. A reservation takes its tokens at once
+    (the bucket can go below zero) and tells how long to wait until they are refilled."""
+
+    def __init__(self, burst):
+        self.burst = burst
+        self.tokens = burst
+        self.time = time.monotonic()
+
+    def reserve(self, amount, rate, now):
+        if rate <= 0:
+            self.tokens, self.time = self.burst, now
+            return 0.0
+        self.tokens = min(self.burst, self.tokens + (now - self.time) * rate) - amount
+        self.time = now
+        return max(0.0, -self.tokens / rate)
+
+
+class RateLimiter:
+    """Token buckets of the requests and of the bytes received, shared by all workers and feeds.
+
+    The limits are `max_rps` and `max_bps`, or the lowest limits of the windows of `schedule` that contain
+    the time of day. When the server pushes back (see _report_push_back), every request is held for the
+    Retry-After and the request rate is halved, at most once per request interval. The rate then doubles
+    every RECOVERY_TIME seconds without a push back until the rate before the push back is reached again,
+    so a long job runs at the rate the server sustains.
+    """
+
+    # Seconds without a push back in which the request rate doubles.
+    RECOVERY_TIME = 10.0
+
+    # Lowest request rate after push backs, as a fraction of the rate before the first one.
+    MIN_ADAPTIVE_FRACTION = 0.125
+
+    # Seconds of requests used to measure the request rate when there is no limit.
+    RATE_WINDOW = 5.0
+
+    def __init__(self, max_rps, max_bps=0, schedule=()):
+        self.max_rps = max_rps
+        self.max_bps = max_bps
+        # (first minute, end minute, max_rps, max_bps) of each window.
+        self.schedule = list(schedule)
+        self.requests = _TokenBucket(1)
+        self.bytes = _TokenBucket(DOWNLOAD_CHUNK_SIZE)
+        self.lock = threading.Lock()
+        # Request rate set by the last push back of the server (None when there is no push back to recover from).
+        self.adaptive_rps = None
+        self.recovered_rps = None
+        self.last_push_back = 0.0
+        self.paused_until = 0.0
+        self.recent = deque()
+
+    def limits(self, when=None):
+        """Get the (max_rps, max_bps) of a time of day (default is now), 0 for no limit."""
+        when = when or datetime.now()
+        minute = when.hour * 60 + when.minute
+        windows = [window for window in self.schedule if _in_window(minute, window)]
+        if not windows:
+            return self.max_rps, self.max_bps
+        return (min((window[2] for window in windows if window[2] > 0), default=0),
+                min((window[3] for window in windows if window[3] > 0), default=0))
+
+    def _request_rate(self, max_rps, now):
+        if self.adaptive_rps is None:
+            return max_rps
+        adaptive_rps = self.adaptive_rps * 2 ** ((now - self.last_push_back) / self.RECOVERY_TIME)
+        if adaptive_rps >= self.recovered_rps:
+            self.adaptive_rps = self.recovered_rps = None
+            return max_rps
+        return min(max_rps, adaptive_rps) if max_rps > 0 else adaptive_rps
+
+    def _reserve(self):
+        """Reserve the next request and return how long to wait for it."""
+        max_rps = self.limits()[0]
+        with self.lock:
+            now = time.monotonic()
+            self.recent.append(now)
+            while self.recent[0] < now - self.RATE_WINDOW:
+                self.recent.popleft()
+            recovering = self.adaptive_rps is not None
+            wait_time = self.requests.reserve(1, self._request_rate(max_rps, now), now)
+            recovered = recovering and self.adaptive_rps is None
+        if recovered:
+            logging.info("The server accepts the requests again, back to the full request rate.")
+        return max(wait_time, self.paused_until - now)
+
+    def _reserve_bytes(self, size):
+        max_bps = self.limits()[1]
+        if max_bps <= 0:
+            return 0
+        with self.lock:
+            return self.bytes.reserve(size, max_bps, time.monotonic())
+
+    def wait(self):
+        """Block the calling thread until it is allowed to send the next request."""
+        wait_time = self._reserve()
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+    async def wait_async(self):
+        """Same as wait but only suspends the calling task."""
+        wait_time = self._reserve()
+        if wait_time > 0:
+            await asyncio.sleep(wait_time)
+
+    def wait_bytes(self, size):
+        """Block the calling thread until `size` received bytes fit in max_bps."""
+        wait_time = self._reserve_bytes(size)
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+    async def wait_bytes_async(self, size):
+        """Same as wait_bytes but only suspends the calling task."""
+        wait_time = self._reserve_bytes(size)
+        if wait_time > 0:
+            await asyncio.sleep(wait_time)
+
+    def push_back(self, retry_after=None):
+        """Slow down after the server pushed back.
+
+        Args:
+            retry_after (float): Seconds to hold every request (the Retry-After of the response).
+        """
+        max_rps = self.limits()[0]
+        with self.lock:
+            now = time.monotonic()
+            if retry_after:
+                self.paused_until = max(self.paused_until, now + retry_after)
+            rate = self._request_rate(max_rps, now)
+            if not rate:
+                # No limit: measure the request rate.
+                rate = len(self.recent) / max(now - self.recent[0], 1.0) if self.recent else 1.0
+            # The requests in flight when the server pushed back only halve the rate once.
+            if now - self.last_push_back < max(1.0, 1 / rate):
+                return
+            self.last_push_back = now
+            if self.recovered_rps is None:
+                self.recovered_rps = rate
+            self.adaptive_rps = max(self.recovered_rps * self.MIN_ADAPTIVE_FRACTION, rate / 2)
+        logging.warning(
+            f"The server pushes back, slow down to {self.adaptive_rps:.2f} request(s) per second"
+            + (f" after {retry_after:.0f} s." if retry_after else "."))
+
+
+def _in_window(minute, window):
+    """Check whether a minute of the day is in a (first minute, end minute, ...) window, which can wrap midnight."""
+    first, end = window[:2]
+    if first <= end:
+        return first <= minute < end
+    return minute >= first or minute < end
+
+
+def _parse_window(window, limits):
+    """Parse a window of the schedule like '0830-1700' with its limits like '2, 500000' (max_rps, max_bps).
+
+    Returns:
+        tuple: (first minute, end minute, max_rps, max_bps).
+    """
+    first, end = (int(hhmm[:2]) * 60 + int(hhmm[2:]) for hhmm in window.strip().split('-'))
+    values = [float(value) for value in limits.split(',')]
+    return first, end, values[0], values[1] if len(values) > 1 else 0
+
+
+def _schedule_window(text):
+    """Parse a window of the --schedule option like '0830-1700=2,500000'."""
+    return _parse_window(*text.split('=', 1))
+
+
+def _retry_after(error):
+    """Get the seconds to wait asked by the Retry-After header of a 429 or 503 error (None if there is none)."""
+    if not isinstance(error, HTTPError) or error.code not in (429, 503) or error.headers is None:
+        return None
+    return _parse_retry_after(error.headers.get("Retry-After"))
+
+
+def _parse_retry_after(value):
+    """Parse a Retry-After value (seconds or an HTTP date) into seconds from now (None if it is not valid)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (when - datetime.now(when.tzinfo)).total_seconds())
+
+
+def _report_push_back(rate_limiter, response):
+    """Tell the rate limiter when the server pushes back: a 429 response, or a 503 with a Retry-After.
+
+    A 503 without a Retry-After is taken as a server error, the file is retried with the backoff
+    without slowing down the other requests.
+    """
+    retry_after = _parse_retry_after(response.info().get("Retry-After"))
+    if response.status == 429 or (response.status == 503 and retry_after is not None):
+        rate_limiter.push_back(retry_after)
+
+
+class PooledResponse:
+    """A response from ConnectionPool. Its connection goes back to the pool when the response is closed
+    after the whole body has been read (a small unread rest is drained), otherwise the connection is closed."""
+
+    MAX_DRAIN = 64 * 1024
+
+    def __init__(self, pool, key, connection, response, request_info=None):
+        self.pool = pool
+        self.key = key
+        self.connection = connection
+        self.response = response
+        self.status = self.code = response.status
+        self.reason = response.reason
+        # (link, method, phase, start time, time to the headers) for the metrics.
+        self.request_info = request_info
+        self.bytes_read = 0
+
+    def info(self):
+        return self.response.headers
+
+    def read(self, amt=None):
+        data = self.response.read(amt)
+        self.bytes_read += len(data)
+        if self.pool.rate_limiter is not None:
+            self.pool.rate_limiter.wait_bytes(len(data))
+        return data
+
+    def close(self):
+        if self.connection is None:
+            return
+        if self.pool.metrics is not None and self.request_info is not None:
+            self.pool.metrics.record_response(self)
+        remaining = self.response.length
+        if not self.response.isclosed() and remaining is not None and remaining <= self.MAX_DRAIN:
+            try:
+                self.response.read()
+            except (http.client.HTTPException, OSError):
+                pass
+        if self.response.isclosed() and not self.response.will_close:
+            self.pool.release(self.key, self.connection)
+        else:
+            self.response.close()
+            self.connection.close()
+        self.connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ConnectionPool:
+    """Keep-alive HTTP(S) connections shared by all requests to SGX.
+
+    Every request takes an idle connection to the host (or opens a new one) and gives it back when
+    its response is closed, so the TCP and TLS handshakes are only paid once per connection.
+    """
+
+    MAX_REDIRECTS = 5
+
+    def __init__(self, pool_size, timeout, rate_limiter=None, metrics=None):
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter
+        self.metrics = metrics
+        self.ssl_context = ssl.create_default_context()
+        self.idle = {}
+        self.lock = threading.Lock()
+
+    def _acquire(self, key):
+        with self.lock:
+            connections = self.idle.get(key)
+            if connections:
+                return connections.pop(), True
+        scheme, host, port = key
+        if scheme == "https":
+            connection = http.client.HTTPSConnection(
+                host, port, timeout=self.timeout, context=self.ssl_context)
+        else:
+            connection = http.client.HTTPConnection(
+                host, port, timeout=self.timeout)
+        return connection, False
+
+    def release(self, key, connection):
+        """Give a connection back to the pool (or close it if the pool is full)."""
+        with self.lock:
+            connections = self.idle.setdefault(key, [])
+            if len(connections) < self.pool_size:
+                connections.append(connection)
+                return
+        connection.close()
+
+    def close(self):
+        """Close all idle connections."""
+        with self.lock:
+            for connections in self.idle.values():
+                for connection in connections:
+                    connection.close()
+            self.idle.clear()
+
+    def view(self, metrics):
+        """Get a pool that shares the connections and the limits of this pool but records its requests
+        to other metrics (one view for each feed)."""
+        view = copy.copy(self)
+        view.metrics = metrics
+        return view
+
+    def _send(self, method, link, headers):
+        url = urlsplit(link)
+        key = (url.scheme, url.hostname, url.port)
+        path = url.path + (f"?{url.query}" if url.query else "")
+        start = time.monotonic()
+        while True:
+            connection, reused = self._acquire(key)
+            try:
+                connection.request(method, path, headers=headers)
+                response = connection.getresponse()
+                return PooledResponse(self, key, connection, response, (link, method, _request_phase(
+                    method, headers), start, time.monotonic() - start))
+            except (http.client.HTTPException, OSError) as e:
+                connection.close()
+                # The server may have closed an idle keep-alive connection, then try a new one.
+                if not reused:
+                    raise URLError(e) from e
+
+    def request(self, link, method="GET", headers=None):
+        """Send a request and return the response. Redirects are followed.
+
+        Args:
+            link (str): The URL.
+            method (str): HTTP method.
+            headers (dict): Additional request headers.
+
+        Returns:
+            PooledResponse: The response. It must be closed (it is a context manager).
+
+        Raises:
+            HTTPError: The server returned an error status.
+            URLError: The server could not be reached.
+        """
+        headers = {"User-Agent": USER_AGENT, **(headers or {})}
+        for _ in range(self.MAX_REDIRECTS + 1):
+            if self.rate_limiter is not None:
+                self.rate_limiter.wait()
+            try:
+                response = self._send(method, link, headers)
+            except URLError as e:
+                if self.metrics is not None:
+                    self.metrics.record_error(link, method, _request_phase(method, headers), e)
+                raise
+            if response.status in (301, 302, 303, 307, 308) and response.info()["Location"]:
+                response.read()
+                response.close()
+                link = urljoin(link, response.info()["Location"])
+                continue
+            if self.rate_limiter is not None:
+                _report_push_back(self.rate_limiter, response)
+            if response.status >= 400:
+                response.read()
+                response.close()
+                raise HTTPError(link, response.status,
+                                response.reason, response.info(), None)
+            return response
+        raise URLError(f"Too many redirects: {link}")
+
+
+class IdRangeSet:
+    """A set of day_ids stored as sorted disjoint ranges (single ids are kept in a set).
+
+    Membership, the next id outside the set and the number of ids outside the set in a range take
+    O(log n) time where n is the number of ranges, so gaps like 3483-4481 are jumped over instead of
+    being walked through.
+    """
+
+    def __init__(self, ranges=()):
+        merged = []
+        for start, end in sorted(ranges):
+            if merged and start <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], end)
+            else:
+                merged.append([start, end])
+        self.singles = {start for start, end in merged if start == end}
+        self.single_list = sorted(self.singles)
+        self.starts = [start for start, end in merged if start != end]
+        self.ends = [end for start, end in merged if start != end]
+        # Number of ids in the ranges before the i-th range.
+        self.before = [0]
+        for start, end in zip(self.starts, self.ends):
+            self.before.append(self.before[-1] + end - start + 1)
+
+    @classmethod
+    def from_text(cls, text):
+        """Create the set from a text like '2725-2754,2771,2772'."""
+        return cls(_iter_id_ranges(text))
+
+    def _range_index(self, qid):
+        """Get the index of the range that contains `qid` or -1."""
+        i = bisect_right(self.starts, qid) - 1
+        return i if i >= 0 and qid <= self.ends[i] else -1
+
+    def __contains__(self, qid):
+        return qid in self.singles or self._range_index(qid) >= 0
+
+    def __len__(self):
+        return len(self.singles) + self.before[-1]
+
+    def __iter__(self):
+        ranges = [(qid, qid) for qid in self.single_list] + list(zip(self.starts, self.ends))
+        for start, end in sorted(ranges):
+            yield from range(start, end + 1)
+
+    def __str__(self):
+        return _format_id_ranges(self)
+
+    def next_downloadable(self, qid, step=1):
+        """Get the first id from `qid` (included) in the direction of `step` which is not in the set.
+
+        Args:
+            qid (int): The id to start from.
+            step (int): 1 to go forward, -1 to go backward.
+
+        Returns:
+            int: The id (it is negative if there is no such id going backward).
+        """
+        while qid in self:
+            i = self._range_index(qid)
+            if i >= 0:
+                qid = self.ends[i] + 1 if step > 0 else self.starts[i] - 1
+            else:
+                qid += step
+        return qid
+
+    def count(self, start, end):
+        """Count the ids of the set in [start, end]."""
+        if end < start:
+            return 0
+        number = bisect_right(self.single_list, end) - \
+            bisect_left(self.single_list, start)
+        # The ranges that end at or after start and begin at or before end.
+        first = bisect_left(self.ends, start)
+        last = bisect_right(self.starts, end) - 1
+        if first <= last:
+            number += self.before[last + 1] - self.before[first]
+            number -= max(0, start - self.starts[first])
+            number -= max(0, self.ends[last] - end)
+        return number
+
+    def count_downloadable(self, start, end):
+        """Count the ids in [start, end] which are not in the set."""
+        return max(0, end - start + 1) - self.count(start, end)
+
+
+class DayIndex:
+    """On-disk cache of every day_id -> day string mapping learned from the web.
+
+    The history of a feed never changes, so a resolved id is stored forever and the
+    web is only asked for ids that are not in the index yet. The file is a JSON
+    object keyed by link pattern, so several feeds can share the same index file.
+    """
+
+    # Serializes the saves of the indexes of all the feeds, which may share a file.
+    file_lock = threading.Lock()
+
+    def __init__(self, path, link_pattern, unique_days=True):
+        self.path = path
+        self.link_pattern = link_pattern
+        self.unique_days = unique_days
+        self.lock = threading.Lock()
+        self.data = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r") as index_file:
+                    self.data = json.load(index_file)
+            except (OSError, ValueError) as e:
+                logging.warning(f"Can not read the day_id index {path}: {e}")
+        if not isinstance(self.data, dict):
+            logging.warning(f"Can not read the day_id index {path}: it is not a JSON object.")
+            self.data = {}
+        feed = self.data.get(link_pattern, {})
+        try:
+            self.days = {int(qid): str_day for qid, str_day in feed.get("days", {}).items()}
+            self.missing = set(map(int, feed.get("missing", [])))
+        except (AttributeError, TypeError, ValueError) as e:
+            logging.warning(f"Can not read the day_ids of {link_pattern} in the index {path}: {e}")
+            self.days, self.missing = {}, set()
+        self.ids_of_day = {}
+        for qid, str_day in self.days.items():
+            self.ids_of_day.setdefault(str_day, []).append(qid)
+        self.max_id = max(self.days, default=-1)
+        self.changed = False
+
+    def get(self, qid):
+        """Get the day string of `qid` from the index.
+
+        Returns:
+            str: The day string, '' if the id is known to have no data or None if the id is not indexed.
+        """
+        if qid in self.days:
+            return self.days[qid]
+        # An id after the latest known day may get its data later.
+        if qid in self.missing and qid < self.max_id:
+            return ''
+        return None
+
+    def put(self, qid, str_day):
+        """Record that the web returned `str_day` for `qid` ('' when there is no data)."""
+        with self.lock:
+            if str_day == '':
+                old_day = self.days.pop(qid, None)
+                if old_day is not None:
+                    # The day was inferred (see resolve_range) and the id has no data.
+                    logging.warning(f"The day_id {qid} has no data, it is not {old_day}.")
+                    self.ids_of_day[old_day].remove(qid)
+                    self.changed = True
+                if qid not in self.missing:
+                    self.missing.add(qid)
+                    self.changed = True
+                return
+            old_day = self.days.get(qid)
+            if old_day == str_day:
+                return
+            if old_day is not None:
+                # The day was inferred (see resolve_range) and the web tells another day.
+                logging.warning(f"The day of the day_id {qid} is {str_day}, not {old_day}.")
+                self.ids_of_day[old_day].remove(qid)
+            self.days[qid] = str_day
+            self.ids_of_day.setdefault(str_day, []).append(qid)
+            self.missing.discard(qid)
+            self.max_id = max(self.max_id, qid)
+            self.changed = True
+
+    def forget(self, qid):
+        """Remove the day of `qid` from the index, so it is read from the web again when it is needed."""
+        with self.lock:
+            old_day = self.days.pop(qid, None)
+            if old_day is not None:
+                self.ids_of_day[old_day].remove(qid)
+                self.changed = True
+
+    def find(self, str_day, near_id):
+        """Find the indexed day_id of `str_day`.
+
+        Day strings without a year (e.g. '%m%d') repeat every year so the id nearest to `near_id` is chosen.
+
+        Returns:
+            int: The day_id or None if the day is not indexed.
+        """
+        ids = self.ids_of_day.get(str_day)
+        if not ids:
+            return None
+        if self.unique_days:
+            return ids[0]
+        best = min(ids, key=lambda qid: abs(qid - near_id))
+        # Two ids of the same '%m%d' string are about 250 ids apart.
+        return best if abs(best - near_id) < 125 else None
+
+    def save(self):
+        """Write the index back to its file if it has changed."""
+        with self.lock, DayIndex.file_lock:
+            if not self.changed:
+                return
+            # Another feed of the run may have saved its days to the same file.
+            if os.path.exists(self.path):
+                try:
+                    with open(self.path, "r") as index_file:
+                        self.data = json.load(index_file)
+                except (OSError, ValueError):
+                    pass
+            self.data[self.link_pattern] = {
+                "days": {str(qid): self.days[qid] for qid in sorted(self.days)},
+                "missing": sorted(self.missing),
+            }
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as index_file:
+                json.dump(self.data, index_file)
+            os.replace(tmp_path, self.path)
+            self.changed = False
+        logging.debug(f"Saved {len(self.days)} day_id(s) to {self.path}.")
+
+
+def _load_numpy():
+    """Import numpy (used by TradingCalendar) on first use."""
+    global np
+    if np is None:
+        import numpy
+        np = numpy
+
+
+class TradingCalendar:
+    """Business days of the feed, used to estimate day_ids with the business day arithmetic of NumPy.
+
+    The day_id of a day is estimated from the nearest day with a known id (the pivot or a day of
+    the day index): the business days between them are counted with `numpy.busday_count`, skipping
+    the weekends and the holidays, and as many ids with data are stepped over from the known id,
+    jumping over the ids without data (NOT_DOWNLOADABLE and the missing ids of the index). When the
+    holidays and the ids without data are all known the estimate is exact.
+
+    The holidays are the ones of the HOLIDAYS section of the config and the ones learned from the
+    known ids: the weekdays between two consecutive ids with data are holidays. A day of the config
+    that turns out to have data is dropped from the holidays.
+    """
+
+    def __init__(self, pivot_day, pivot_id, holidays=(), no_data=()):
+        _load_numpy()
+        self.lock = threading.Lock()
+        self.pivot = (pivot_id, np.datetime64(pivot_day.date(), "D"))
+        self.config_holidays = {np.datetime64(day.date(), "D") for day in holidays}
+        self.no_data = np.array(sorted(set(no_data)), dtype=np.int64)
+        self.known = {}
+        self._update()
+
+    def _count_no_data(self, lo, hi):
+        """Count the ids without data in (lo, hi] (arrays of the same shape)."""
+        return np.searchsorted(self.no_data, hi, "right") - np.searchsorted(self.no_data, lo, "right")
+
+    def _update(self):
+        """Rebuild the anchors and the holidays from the known ids."""
+        known = dict(self.known)
+        # The pivot of the config may be stale, the web is trusted when it tells the id of the pivot day.
+        if self.pivot[1] not in known.values():
+            known.setdefault(self.pivot[0], self.pivot[1])
+        ids = np.array(sorted(known), dtype=np.int64)
+        days = np.array([known[qid] for qid in ids], dtype="datetime64[D]")
+
+        # The web wins over the config: a day with data is not a holiday.
+        wrong = self.config_holidays.intersection(days)
+        if wrong:
+            logging.warning(
+                f"The day(s) {', '.join(sorted(str(day) for day in wrong))} of the HOLIDAYS section have data, "
+                f"they are not holidays.")
+            self.config_holidays -= wrong
+        holidays = set(self.config_holidays)
+        # Pairs of consecutive ids without an id with data between them and at least one weekday between their days.
+        adjacent = np.flatnonzero(ids[1:] - ids[:-1] - self._count_no_data(ids[:-1], ids[1:] - 1) == 1)
+        adjacent = adjacent[np.busday_count(days[adjacent] + 1, days[adjacent + 1]) > 0]
+        for i in adjacent:
+            between = np.arange(days[i] + 1, days[i + 1])
+            holidays.update(between[np.is_busday(between)])
+        self.holidays = holidays
+        self.busdaycal = np.busdaycalendar(holidays=sorted(holidays))
+        order = np.argsort(days, kind="stable")
+        self.anchor_ids = ids[order]
+        self.anchor_days = days[order]
+
+    def learn(self, days):
+        """Learn the days of some ids.
+
+        Args:
+            days (iterable): (day_id, day) pairs where day is a datetime.
+        """
+        with self.lock:
+            changed = False
+            for qid, day in days:
+                day = np.datetime64(day.date(), "D")
+                if self.known.get(qid) != day:
+                    self.known[qid] = day
+                    changed = True
+            if changed:
+                self._update()
+
+    def learn_index(self, index):
+        """Learn the days of the ids in a DayIndex.
+
+        Day strings without a year are read going away from the pivot one id after the other, each
+        in the year of the business day expected after (or before) the previous one.
+        """
+        pivot_id, pivot_day = self.pivot
+        ids = sorted(index.days)
+        days = []
+        for side in ([qid for qid in ids if qid >= pivot_id], [qid for qid in reversed(ids) if qid < pivot_id]):
+            prev_id, prev_day = pivot_id, pivot_day
+            for qid in side:
+                lo, hi = sorted((prev_id, qid))
+                steps = hi - lo - int(self._count_no_data(lo, hi - 1))
+                near_day = np.busday_offset(prev_day, steps if qid > prev_id else -steps,
+                                            roll="forward", busdaycal=self.busdaycal)
+                day = _parse_str_day(index.days[qid], _to_datetime(near_day))
+                days.append((qid, day))
+                prev_id, prev_day = qid, np.datetime64(day.date(), "D")
+        self.learn(days)
+        logging.debug(f"Learned {len(days)} day(s) and {len(self.holidays)} holiday(s) from {index.path}.")
+
+    def estimate(self, days):
+        """Estimate the day_ids of many days at once.
+
+        Args:
+            days (iterable): The days (datetime).
+
+        Returns:
+            numpy.ndarray: The estimated day_id of each day (a day without data gets the id of the
+                business day next to it on the side of the nearest known day).
+        """
+        days = np.array([day.date() for day in days], dtype="datetime64[D]")
+        with self.lock:
+            anchor_ids, anchor_days = self.anchor_ids, self.anchor_days
+            busdaycal = self.busdaycal
+        # The nearest anchor of each day.
+        right = np.clip(np.searchsorted(anchor_days, days), 0, len(anchor_days) - 1)
+        left = np.maximum(right - 1, 0)
+        nearest = np.where(np.abs(anchor_days[right] - days) < np.abs(anchor_days[left] - days), right, left)
+        base_ids, base_days = anchor_ids[nearest], anchor_days[nearest]
+        steps = np.busday_count(base_days, days, busdaycal=busdaycal)
+        # Step over the ids without data: iterate until the ids without data between the base and the
+        # estimate do not change (the estimate only moves away from the base).
+        qids = base_ids + steps
+        while True:
+            skipped = np.where(steps >= 0, self._count_no_data(base_ids, qids),
+                               -self._count_no_data(qids - 1, base_ids - 1))
+            new_qids = base_ids + steps + skipped
+            if np.array_equal(new_qids, qids):
+                return qids
+            qids = new_qids
+
+    def business_days(self, first_day, last_day):
+        """List the business days strictly between two days (datetime)."""
+        with self.lock:
+            busdaycal = self.busdaycal
+        days = np.arange(np.datetime64(first_day.date(), "D") + 1, np.datetime64(last_day.date(), "D"))
+        return [_to_datetime(day) for day in days[np.is_busday(days, busdaycal=busdaycal)]]
+
+
+def _to_datetime(day):
+    """Convert a numpy.datetime64 day to a datetime at midnight."""
+    return datetime.combine(day.astype(object), datetime.min.time())
+
+
+class Manifest:
+    """Record of the files downloaded into the output directory (one JSON object per line).
+
+    Each line has the day_id, date, link, saved file name, size, SHA-256 checksum and fetch time of a
+    file. Lines are only appended, the last line of a link wins.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, "r") as manifest_file:
+                for line in manifest_file:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A line cut by a crash.
+                        continue
+                    self.entries[entry["link"]] = entry
+
+    def add(self, link, day_id, str_day, path, size, checksum):
+        """Record a downloaded file.
+
+        Args:
+            link (str): Link of the file.
+            day_id (int): day_id of the file.
+            str_day (str): String of the day.
+            path (Path): Path to the saved file.
+            size (int): Size of the file.
+            checksum (str): SHA-256 hex digest of the file.
+        """
+        entry = {
+            "day_id": day_id,
+            "date": str_day,
+            "link": link,
+            "filename": os.path.basename(path),
+            "size": size,
+            "checksum": checksum,
+            "mtime": os.path.getmtime(path),
+            "fetched_at": datetime.utcnow().isoformat(timespec="seconds"),
+        }
+        with self.lock:
+            self.entries[link] = entry
+            with open(self.path, "a") as manifest_file:
+                manifest_file.write(json.dumps(entry) + "\n")
+
+    def verified(self, link, save_dir):
+        """Check whether the file of a link is in `save_dir` and complete.
+
+        The size is always compared. The checksum is only computed again when the file has been
+        modified since it was recorded.
+
+        Returns:
+            str: Name of the file or None if the file must be downloaded.
+        """
+        entry = self.entries.get(link)
+        if entry is None:
+            return None
+        path = save_dir / entry["filename"]
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        if stat.st_size != entry["size"]:
+            return None
+        if stat.st_mtime != entry["mtime"]:
+            if _file_checksum(path) != entry["checksum"]:
+                return None
+            with self.lock:
+                entry["mtime"] = stat.st_mtime
+                with open(self.path, "a") as manifest_file:
+                    manifest_file.write(json.dumps(entry) + "\n")
+        return entry["filename"]
+
+
+class BlobStore:
+    """Content-addressed store of the downloaded files (with --dedup).
+
+    Each distinct file is stored once as `<checksum[:2]>/<checksum>` (its SHA-256 checksum, computed
+    while it is downloaded) and the day folders get a hard link or a reflink to it, so the structure
+    files and the re-issued files of every day take the space of one file.
+    """
+
+    def __init__(self, directory, mode):
+        self.directory = directory
+        self.mode = mode
+        self.lock = threading.Lock()
+        # Files of this run linked to a blob that was already stored, and their bytes.
+        self.deduplicated = 0
+        self.saved = 0
+
+    def blob_path(self, checksum):
+        return self.directory / checksum[:2] / checksum
+
+    def _link(self, blob, path):
+        """Link a blob to a path (replacing the file at the path). A reflink falls back to a hard link
+        and a hard link falls back to a copy (another file system or too many links)."""
+        tmp_path = f"{path}.link"
+        if self.mode == "reflink":
+            try:
+                import fcntl
+                with open(blob, "rb") as source, open(tmp_path, "wb") as target:
+                    fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+                os.replace(tmp_path, path)
+                return
+            except (ImportError, OSError) as e:
+                logging.debug(f"Can not reflink {blob} ({e}), use a hard link.")
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+        try:
+            os.link(blob, tmp_path)
+        except OSError as e:
+            logging.debug(f"Can not hard link {blob} ({e}), copy it.")
+            shutil.copyfile(blob, tmp_path)
+        os.replace(tmp_path, path)
+
+    def put(self, part_path, path, size, checksum):
+        """Move a complete download into the store (or drop it if the blob is already stored) and link it to `path`.
+
+        Args:
+            part_path (Path): The complete download.
+            path (Path): Where the file is expected in the day folder.
+            size (int): Size of the file.
+            checksum (str): SHA-256 hex digest of the file.
+        """
+        blob = self.blob_path(checksum)
+        with self.lock:
+            try:
+                stored = os.stat(blob).st_size == size
+            except OSError:
+                stored = False
+            if stored:
+                os.remove(part_path)
+                self.deduplicated += 1
+                self.saved += size
+            else:
+                os.makedirs(blob.parent, exist_ok=True)
+                os.replace(part_path, blob)
+            self._link(blob, path)
+
+    def report(self, manifest):
+        """Summary lines of the space used by the files of the manifest.
+
+        Returns:
+            list: The deduplicated files (their size, the size of their blobs and the space saved) and
+            the files out of the store that have a duplicate.
+        """
+        stored = {}
+        logical = files = 0
+        outside = {}
+        for entry in manifest.entries.values():
+            if os.path.exists(self.blob_path(entry["checksum"])):
+                files += 1
+                logical += entry["size"]
+                stored[entry["checksum"]] = entry["size"]
+            else:
+                outside.setdefault(entry["checksum"], []).append(entry["size"])
+        lines = [f"{files} file(s) in the store, {logical / 1e6:.2f} MB in {len(stored)} blob(s) of "
+                 f"{sum(stored.values()) / 1e6:.2f} MB, saved {(logical - sum(stored.values())) / 1e6:.2f} MB"]
+        duplicates = [sizes for sizes in outside.values() if len(sizes) > 1]
+        if duplicates:
+            lines.append(
+                f"{sum(len(sizes) for sizes in duplicates)} file(s) out of the store have a duplicate, "
+                f"{sum(sum(sizes[1:]) for sizes in duplicates) / 1e6:.2f} MB can be saved by downloading them again with --dedup")
+        return lines
+
+
+def _file_checksum(path, digest=None):
+    """Compute the SHA-256 checksum of a file (or feed it into `digest`) without loading the whole file.
+
+    Returns:
+        str: Hex digest.
+    """
+    digest = digest or hashlib.sha256()
+    with open(path, "rb") as checked_file:
+        for block in iter(lambda: checked_file.read(DOWNLOAD_CHUNK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class SchemaRegistry:
+    """One copy of each distinct version of the structure files (*_structure.dat) with their parsed columns.
+
+    A version is the SHA-256 checksum of the file. `schemas.json` maps each structure file to its versions
+    (stored file, columns and the ETags it was served with) and each day_id to the version of that day.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.path = directory / "schemas.json"
+        self.lock = threading.Lock()
+        self.data = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r") as registry_file:
+                    self.data = json.load(registry_file)
+            except (OSError, ValueError) as e:
+                logging.warning(f"Can not read the schema registry {self.path}: {e}")
+        self.day_ids = {name: sorted(map(int, entry["days"]))
+                        for name, entry in self.data.items()}
+
+    def _save(self):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as registry_file:
+            json.dump(self.data, registry_file)
+        os.replace(tmp_path, self.path)
+
+    def _put_day(self, name, day_id, checksum):
+        entry = self.data[name]
+        if day_id is None or entry["days"].get(str(day_id)) == checksum:
+            return
+        if str(day_id) not in entry["days"]:
+            insort(self.day_ids[name], day_id)
+        entry["days"][str(day_id)] = checksum
+
+    def add(self, name, day_id, path, etag=None):
+        """Register the structure file of a day. A new version is copied into the registry.
+
+        Args:
+            name (str): File name in the link (e.g. 'TickData_structure.dat').
+            day_id (int): day_id of the file.
+            path (Path): Path to the downloaded file.
+            etag (str): ETag of the response.
+
+        Returns:
+            str: The version (SHA-256 checksum) of the file.
+        """
+        checksum = _file_checksum(path)
+        with self.lock:
+            entry = self.data.setdefault(name, {"versions": {}, "days": {}})
+            self.day_ids.setdefault(name, [])
+            version = entry["versions"].get(checksum)
+            if version is None:
+                stem, ext = os.path.splitext(name)
+                stored = f"{stem}/{checksum[:16]}{ext}"
+                os.makedirs(self.directory / stem, exist_ok=True)
+                shutil.copyfile(path, self.directory / stored)
+                version = entry["versions"][checksum] = {
+                    "file": stored,
+                    "columns": _parse_structure(path),
+                    "etags": [],
+                }
+                logging.info(f"New version of {name}: {checksum[:16]} (day_id {day_id}).")
+            if etag and etag not in version["etags"]:
+                version["etags"].append(etag)
+            self._put_day(name, day_id, checksum)
+            self._save()
+        return checksum
+
+    def known(self, name, day_id, etag):
+        """Map a day to a known version if the structure file is served with the ETag of that version.
+
+        Returns:
+            str: The version or None if the ETag is not known.
+        """
+        if not etag:
+            return None
+        with self.lock:
+            entry = self.data.get(name)
+            if entry is None:
+                return None
+            for checksum, version in entry["versions"].items():
+                if etag in version["etags"]:
+                    self._put_day(name, day_id, checksum)
+                    self._save()
+                    return checksum
+        return None
+
+    def has_etags(self, name):
+        """Check whether a registered version of a structure file has an ETag (a probe can find it)."""
+        with self.lock:
+            entry = self.data.get(name)
+            return entry is not None and any(version["etags"] for version in entry["versions"].values())
+
+    def lookup(self, name, day_id):
+        """Get the columns of a structure file on a day: the version of the nearest registered day at or
+        before `day_id` (or of the first registered day if `day_id` is before all of them).
+
+        Returns:
+            list: (column name, type) of each column or None if no version is registered.
+        """
+        with self.lock:
+            day_ids = self.day_ids.get(name)
+            if not day_ids:
+                return None
+            i = bisect_right(day_ids, day_id)
+            registered_id = day_ids[i - 1] if i > 0 else day_ids[0]
+            entry = self.data[name]
+            checksum = entry["days"][str(registered_id)]
+            return [tuple(column) for column in entry["versions"][checksum]["columns"]]
+
+
+def _request_phase(method, headers):
+    """Phase of a request for the metrics: 'probe' (headers only) or 'transfer' (a file body)."""
+    if method == "HEAD" or headers.get("Range") == "bytes=0-0":
+        return "probe"
+    return "transfer"
+
+
+def _percentile(values, q):
+    """Nearest-rank percentile of a list of numbers (None if the list is empty)."""
+    if not values:
+        return None
+    values = sorted(values)
+    return values[max(0, min(len(values) - 1, round(q / 100 * len(values)) - 1))]
+
+
+class Metrics:
+    """Measures of every request of a run and of every file downloaded by download_jobs.
+
+    A request is recorded when its response is closed with its phase ('probe' or 'transfer'), link,
+    method, HTTP status, time to the headers, latency, bytes read and the try of its file. A file is
+    recorded with the phase 'file', its total time, retries and result.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.records = []
+        self.start = time.monotonic()
+
+    def _add(self, record):
+        record["time"] = round(time.time(), 3)
+        with self.lock:
+            self.records.append(record)
+
+    def record_response(self, response):
+        """Record a closed PooledResponse or AsyncResponse."""
+        link, method, phase, start, ttfb = response.request_info
+        self._add({
+            "phase": phase,
+            "link": link,
+            "method": method,
+            "status": response.status,
+            "ttfb": round(ttfb, 4),
+            "latency": round(time.monotonic() - start, 4),
+            "bytes": response.bytes_read,
+            "attempt": ATTEMPT.get(),
+        })
+
+    def record_error(self, link, method, phase, error):
+        """Record a request that got no response."""
+        self._add({
+            "phase": phase,
+            "link": link,
+            "method": method,
+            "status": None,
+            "error": type(error).__name__,
+            "attempt": ATTEMPT.get(),
+        })
+
+    def record_file(self, link, day, latency, retries, success):
+        """Record a file downloaded by download_jobs (with all its tries)."""
+        self._add({
+            "phase": "file",
+            "link": link,
+            "day": day,
+            "latency": round(latency, 4),
+            "retries": retries,
+            "success": success,
+        })
+
+    @classmethod
+    def merged(cls, metrics):
+        """Merge the records of several Metrics (e.g. of the feeds that write the same file).
+
+        Args:
+            metrics (list): The Metrics to merge.
+
+        Returns:
+            Metrics: The records of all of them sorted by time, the run starts with the first one.
+        """
+        result = cls()
+        result.start = min(item.start for item in metrics)
+        for item in metrics:
+            with item.lock:
+                result.records.extend(item.records)
+        result.records.sort(key=lambda record: record["time"])
+        return result
+
+    def _phase_records(self, phase):
+        with self.lock:
+            return [record for record in self.records if record["phase"] == phase]
+
+    def summary(self):
+        """Summary lines of the run: latency percentiles, throughput, probes and retries."""
+        wall_time = time.monotonic() - self.start
+        lines = []
+        for phase in ("probe", "transfer"):
+            records = self._phase_records(phase)
+            if not records:
+                continue
+            latencies = [record["latency"] for record in records if "latency" in record]
+            errors = sum(1 for record in records if record["status"] is None or record["status"] >= 400)
+            size = sum(record.get("bytes", 0) for record in records)
+            line = f"{phase}: {len(records)} request(s), {errors} error(s)"
+            if latencies:
+                line += f", latency p50 {_percentile(latencies, 50) * 1000:.1f} ms, p95 {_percentile(latencies, 95) * 1000:.1f} ms"
+            if phase == "transfer":
+                line += f", {size / 1e6:.2f} MB, {size / 1e6 / max(wall_time, 1e-9):.2f} MB/s"
+            lines.append(line)
+            if latencies and phase == "transfer":
+                slowest = max((record for record in records if "latency" in record),
+                              key=lambda record: record["latency"])
+                lines.append(
+                    f"slowest transfer: {slowest['link']} ({slowest['latency']:.2f} s)")
+        files = self._phase_records("file")
+        if files:
+            succeeded = sum(1 for record in files if record["success"])
+            retries = sum(record["retries"] for record in files)
+            lines.append(
+                f"file: {len(files)} file(s), {succeeded} succeeded, {retries} retry(s)")
+        lines.append(f"wall time: {wall_time:.2f} s")
+        return lines
+
+    def write_jsonl(self, path):
+        """Write every record as a JSON line."""
+        with self.lock:
+            records = list(self.records)
+        with open(path, "w") as metrics_file:
+            for record in records:
+                metrics_file.write(json.dumps(record) + "\n")
+
+    def write_prometheus(self, path):
+        """Write the totals of the run in the Prometheus text format (for the textfile collector of the
+        node exporter). The file is replaced atomically."""
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                label_text = ",".join(f'{key}="{label_value}"' for key, label_value in labels.items())
+                lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+
+        counts = {}
+        durations = {}
+        sizes = {}
+        for phase in ("probe", "transfer"):
+            for record in self._phase_records(phase):
+                status = "error" if record["status"] is None else str(record["status"])
+                counts[(phase, status)] = counts.get((phase, status), 0) + 1
+                if "latency" in record:
+                    durations.setdefault(phase, []).append(record["latency"])
+                sizes[phase] = sizes.get(phase, 0) + record.get("bytes", 0)
+        metric("sgx_downloader_requests_total", "counter", "Requests sent to SGX.",
+               [({"phase": phase, "status": status}, count) for (phase, status), count in sorted(counts.items())])
+        samples = []
+        for phase, values in sorted(durations.items()):
+            for q in (0.5, 0.95):
+                samples.append(({"phase": phase, "quantile": q},
+                                _percentile(values, q * 100)))
+        metric("sgx_downloader_request_duration_seconds", "summary",
+               "Latency of the requests to SGX.", samples)
+        for phase, values in sorted(durations.items()):
+            lines.append(f'sgx_downloader_request_duration_seconds_sum{{phase="{phase}"}} {sum(values)}')
+            lines.append(f'sgx_downloader_request_duration_seconds_count{{phase="{phase}"}} {len(values)}')
+        metric("sgx_downloader_bytes_total", "counter", "Bytes read from SGX.",
+               [({"phase": phase}, size) for phase, size in sorted(sizes.items())])
+        files = self._phase_records("file")
+        metric("sgx_downloader_files_total", "counter", "Files downloaded (with all their tries).",
+               [({"result": "success"}, sum(1 for record in files if record["success"])),
+                ({"result": "fail"}, sum(1 for record in files if not record["success"]))])
+        metric("sgx_downloader_retries_total", "counter", "Retries of the files.",
+               [({}, sum(record["retries"] for record in files))])
+        metric("sgx_downloader_run_duration_seconds", "gauge", "Wall time of the run.",
+               [({}, round(time.monotonic() - self.start, 3))])
+        metric("sgx_downloader_last_run_timestamp_seconds", "gauge", "End time of the run.",
+               [({}, round(time.time(), 3))])
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as metrics_file:
+            metrics_file.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, path)
+
+
+###################### Config section ##################################
+
+
+def _create_default_config(config, config_path):
+    """Create a default config file and save it to the default location.
+
+    Args:
+        config (ConfigParser): The config object to store config options.
+
+        config_path (str): Path to the file save default config (None to not save it).
+
+    Returns:
+        ConfigParser: The config that has been created.
+    """
+    config.add_section("BASE")
+    config.set("BASE", "LINK_PATTERN",
+               "https://links.sgx.com/1.0.0/derivatives-historical/%%d/%%s")
+    config.set("BASE", "pivotdate", "20230516")
+    config.set("BASE", "pivotorder", "5420")
+    config.set("BASE", "dayformat", "%%Y%%m%%d")
+    config.set("BASE", "quiet", "False")
+    config.set("BASE", "output", "./downloadedData")
+    config.set("BASE", "logfile", "sgx-downloader.log")
+    config.set("BASE", "errorfile", "sgx-failed.txt")
+    config.set("BASE", "loglevel", "INFO")
+    config.set("BASE", "downloadfiles", "td,tds,tc,tcs")
+    config.set("BASE", "keyfilename", "tc")
+    config.set("BASE", "max_retry", "3")
+    config.set("BASE", "backoff", "1")
+    config.set("BASE", "max_backoff", "60")
+    config.set("BASE", "workers", "1")
+    config.set("BASE", "max_rps", "0")
+    config.set("BASE", "max_bps", "0")
+    config.set("BASE", "indexfile", "")
+    config.set("BASE", "inferrange", "True")
+    config.set("BASE", "pool_size", "8")
+    config.set("BASE", "timeout", "60")
+    config.set("BASE", "sync", "False")
+    config.set("BASE", "verify", "False")
+    config.set("BASE", "extract", "False")
+    config.set("BASE", "convert", "off")
+    config.set("BASE", "convertfiles", "td")
+    config.set("BASE", "skipstructure", "False")
+    config.set("BASE", "dedup", "off")
+    config.set("BASE", "progressinterval", "10")
+    config.set("BASE", "engine", "thread")
+    config.set("BASE", "host_workers", "0")
+    config.set("BASE", "metricsfile", "")
+    config.set("BASE", "prometheusfile", "")
+
+    config.add_section("FILE_NAME")
+    config.set("FILE_NAME", "td", "WEBPXTICK_DT.zip")
+    config.set("FILE_NAME", "tds", "TickData_structure.dat")
+    config.set("FILE_NAME", "tc", "TC.txt")
+    config.set("FILE_NAME", "tcs", "TC_structure.dat")
+
+    config.add_section("DAYS")
+    config.set("DAYS", "day", "yesterday")
+    config.set("DAYS", "start", "yesterday")
+    config.set("DAYS", "end", "yesterday")
+
+    config.add_section("HOLIDAYS")
+    config.set("HOLIDAYS", "days", "")
+
+    config.add_section("SCHEDULE")
+
+    config.add_section("NOT_DOWNLOADABLE")
+    config.set("NOT_DOWNLOADABLE", "day_ids", "2725-2754,2771,2772,2873,3025,3257,3590,3591,3710,3711,3712,3848,3849,3874,4239,4766")
+    if config_path is not None:
+        with open(config_path, "w+") as config_file:
+            config.write(config_file)
+    return config
+
+
+def _get_default_config_path():
+    """Get the path of the default config file.
+
+    Returns:
+        str: '%APPDATA%/sgx-downloader.cfg' in Windows or '~/.config/sgx-downloader.cfg' in other systems.
+    """
+    if platform.system() == "Windows":
+        config_folder = os.getenv('APPDATA')
+    else:
+        config_folder = os.path.expanduser('~/.config')
+    return os.sep.join([config_folder, "sgx-downloader.cfg"])
+
+
+def _get_index_path(config, config_path, output=None):
+    """Get the path of the day_id index file. By default the index is saved next to the config file,
+    or in the output directory for a config that is not from a file.
+
+    Args:
+        config (ConfigParser): The loaded config.
+        config_path (str): Path to the config file (None for a config that is not from a file).
+        output (str): The output directory (default is the output of the config).
+
+    Returns:
+        str: Path to the day_id index file.
+    """
+    index_path = config.get("BASE", "indexfile", fallback="")
+    if index_path == "" and config_path is None:
+        index_path = os.path.join(output or config.get("BASE", "output"), "sgx-downloader.index.json")
+    elif index_path == "":
+        index_path = os.path.splitext(config_path)[0] + ".index.json"
+    return index_path
+
+
+def _iter_id_ranges(text):
+    """Parse a list of day_ids like '2725-2754,2771,2772' into (start, end) ranges.
+
+    Args:
+        text (str): Comma-separated ids and ranges of ids (both ends included).
+
+    Yields:
+        tuple: (start, end) of each item, e.g. (2725, 2754), (2771, 2771), (2772, 2772).
+    """
+    for day in text.split(','):
+        day = day.strip()
+        if day == '':
+            continue
+        if '-' not in day:
+            yield int(day), int(day)
+        else:
+            start, end = map(int, day.split('-'))
+            yield start, end
+
+
+def _parse_id_ranges(text):
+    """Parse a list of day_ids like '2725-2754,2771,2772' into a list of ids.
+
+    Args:
+        text (str): Comma-separated ids and ranges of ids (both ends included).
+
+    Returns:
+        list: Every id in the text.
+    """
+    return [qid for start, end in _iter_id_ranges(text) for qid in range(start, end + 1)]
+
+
+def _format_id_ranges(ids):
+    """Compress a list of day_ids into ranges, the reverse of _parse_id_ranges.
+
+    Args:
+        ids (iterable): The ids.
+
+    Returns:
+        str: Comma-separated ids and ranges of ids, e.g. '2725-2754,2771-2772'.
+    """
+    ranges = []
+    for qid in sorted(set(ids)):
+        if ranges and ranges[-1][1] == qid - 1:
+            ranges[-1][1] = qid
+        else:
+            ranges.append([qid, qid])
+    return ','.join(str(start) if start == end else f"{start}-{end}" for start, end in ranges)
+
+
+def _parse_days(text):
+    """Parse a list of days like '20231225,20240101' (YYYYMMDD)."""
+    return [datetime.strptime(day.strip(), "%Y%m%d") for day in text.split(',') if day.strip()]
+
+
+def _save_not_downloadable(config_path, ids):
+    """Write the day_ids of the NOT_DOWNLOADABLE section in a config file. Other lines (and comments) are kept.
+
+    Args:
+        config_path (str): Path to the config file.
+        ids (iterable): The day_ids that are not downloadable.
+    """
+    line = f"day_ids = {_format_id_ranges(ids)}"
+    with open(config_path, "r", newline='') as config_file:
+        text = config_file.read()
+    newline = "\r\n" if "\r\n" in text else "\n"
+    # The section ends at the next line that starts a section, a '[' elsewhere (e.g. in a comment) is kept in it.
+    section = re.search(r'^\[NOT_DOWNLOADABLE\](?:(?!^\[).)*', text, flags=re.M | re.S)
+    if section is None:
+        text = text.rstrip("\r\n") + f"{newline}{newline}[NOT_DOWNLOADABLE]{newline}{line}{newline}"
+    else:
+        # The value and its indented continuation lines.
+        body, count = re.subn(r'^day_ids\s*=[^\r\n]*(?:\r?\n[ \t]+\S[^\r\n]*)*', line.replace('\\', '\\\\'),
+                              section.group(0), count=1, flags=re.M)
+        if count == 0:
+            body = section.group(0).rstrip("\r\n") + f"{newline}{line}{newline}"
+        text = text[:section.start()] + body + text[section.end():]
+    with open(config_path, "w", newline='') as config_file:
+        config_file.write(text)
+
+
+def _get_default_config():
+    """Get the default config stored in the config file. If the config file does not exist then create a new file.
+
+    Returns:
+        ConfigParser: config object contain default config.
+    """
+    config = configparser.ConfigParser()
+    config_path = _get_default_config_path()
+    if os.path.exists(config_path):
+        config.read(config_path)
+        return config
+    return _create_default_config(config, config_path)
+
+
+def _load_config(config=None):
+    """Load config file which path have stored in option passed from the command line or the default path.
+
+    Args:
+        config (ConfigParser): An already loaded config to use instead of the file.
+
+    Returns:
+        ConfigParser: A config that is loaded from the file whose path is passed."""
+    feed = FEED.get()
+    if config is None:
+        config = configparser.ConfigParser()
+        config.read(args.config)
+    # BASE section
+    feed.link_pattern = config.get("BASE", "LINK_PATTERN")
+    args.pivotdate = config.get("BASE", "pivotdate")
+    args.pivotorder = config.getint("BASE", "pivotorder")
+    args.dayformat = config.get("BASE", "dayformat")
+    args.quiet = config.getboolean("BASE", "quiet")
+    args.output = config.get("BASE", "output")
+    args.logfile = config.get("BASE", "logfile")
+    args.error = config.get("BASE", "errorfile")
+    args.loglevel = config.get("BASE", "loglevel")
+    args.file = config.get("BASE", "downloadfiles").split(',')
+    args.max_retry = config.getint("BASE", "max_retry")
+    args.keyfile = config.get("BASE", "keyfilename")
+    args.backoff = config.getfloat("BASE", "backoff", fallback=args.backoff)
+    args.max_backoff = config.getfloat("BASE", "max_backoff", fallback=args.max_backoff)
+    args.workers = config.getint("BASE", "workers", fallback=args.workers)
+    args.max_rps = config.getfloat("BASE", "max_rps", fallback=args.max_rps)
+    args.max_bps = config.getfloat("BASE", "max_bps", fallback=args.max_bps)
+    args.index = _get_index_path(config, args.config)
+    if args.infer_range is None:
+        # Not set on the command line (--infer-range or --no-infer-range).
+        args.infer_range = config.getboolean("BASE", "inferrange", fallback=True)
+    args.pool_size = config.getint("BASE", "pool_size", fallback=args.pool_size)
+    args.timeout = config.getfloat("BASE", "timeout", fallback=args.timeout)
+    # A flag of the command line turns the setting on even when the config turns it off.
+    args.sync = args.sync or config.getboolean("BASE", "sync", fallback=False)
+    args.verify = args.verify or config.getboolean("BASE", "verify", fallback=False)
+    args.extract = args.extract or config.getboolean("BASE", "extract", fallback=False)
+    convert = config.get("BASE", "convert", fallback="off")
+    args.convert = args.convert if convert == "off" else convert
+    args.skip_structure = args.skip_structure or config.getboolean("BASE", "skipstructure", fallback=False)
+    dedup = config.get("BASE", "dedup", fallback="off")
+    args.dedup = args.dedup if dedup == "off" else dedup
+    args.progress_interval = config.getfloat("BASE", "progressinterval", fallback=args.progress_interval)
+    if config.has_option("BASE", "convertfiles"):
+        args.convert_files = config.get("BASE", "convertfiles").split(',')
+    args.engine = config.get("BASE", "engine", fallback=args.engine)
+    args.host_workers = config.getint("BASE", "host_workers", fallback=args.host_workers)
+    # An empty file name in the config keeps the file of the command line.
+    args.metrics = config.get("BASE", "metricsfile", fallback="") or args.metrics
+    args.prometheus = config.get("BASE", "prometheusfile", fallback="") or args.prometheus
+    # FILE_NAME section
+    for id, filename in config.items('FILE_NAME'):
+        FILE_NAME[id] = filename
+    # DAYS section
+    args.day = config.get("DAYS", "day")
+    args.start = config.get("DAYS", "start")
+    args.end = config.get("DAYS", "end")
+    # HOLIDAYS section
+    args.holidays = _parse_days(config.get("HOLIDAYS", "days", fallback=""))
+    # SCHEDULE section
+    if config.has_section("SCHEDULE"):
+        args.schedule = [_parse_window(window, limits) for window, limits in config.items("SCHEDULE")]
+    # NOT_DOWNLOADABLE section
+    feed.not_downloadable = IdRangeSet.from_text(
+        config.get("NOT_DOWNLOADABLE", "day_ids"))
+
+    return config
+
+
+def _load_feed(default_config, config=None):
+    """Load the settings of the current feed from its config, or from the default config if it has none.
+
+    Args:
+        default_config (ConfigParser): The default config.
+        config (ConfigParser): An already loaded config of the feed (args.config is then its path or None).
+
+    Returns:
+        ConfigParser: The config of the feed.
+    """
+    if config is not None or args.config is not None:
+        config = _load_config(config)
+        args.config_path = args.config
+        return config
+    feed = FEED.get()
+    args.config_path = _get_default_config_path()
+    feed.link_pattern = default_config.get("BASE", "LINK_PATTERN")
+    args.pivotdate = default_config.get("BASE", "pivotdate")
+    args.pivotorder = default_config.getint("BASE", "pivotorder")
+    args.dayformat = default_config.get("BASE", "dayformat")
+    args.keyfile = default_config.get("BASE", "keyfilename")
+    args.index = _get_index_path(
+        default_config, _get_default_config_path())
+    for id, filename in default_config.items('FILE_NAME'):
+        FILE_NAME[id] = filename
+    args.holidays = _parse_days(
+        default_config.get("HOLIDAYS", "days", fallback=""))
+    feed.not_downloadable = IdRangeSet.from_text(
+        default_config.get("NOT_DOWNLOADABLE", "day_ids"))
+    return default_config
+
+###################### Get day section #################################
+
+
+def _parse_str_day(str_day, near_day):
+    """Convert a day string from the web into a datetime.
+
+    Day strings without a year (e.g. '%m%d') take the year that puts them closest to `near_day`.
+
+    Args:
+        str_day (str): Day string in `dayformat`.
+        near_day (datetime): A day that is close to the day string.
+
+    Returns:
+        datetime: The day of the string.
+    """
+    if re.search(r'%[Yy]', args.dayformat):
+        return datetime.strptime(str_day, args.dayformat)
+    # 2000 is a leap year, so '0229' can be parsed.
+    day = datetime.strptime("2000" + str_day, "%Y" + args.dayformat)
+    candidates = []
+    for year in (near_day.year - 1, near_day.year, near_day.year + 1):
+        try:
+            candidates.append(day.replace(year=year))
+        except ValueError:
+            pass
+    return min(candidates, key=lambda candidate: abs(candidate - near_day))
+
+
+def _run_steps(steps):
+    """Run a generator of steps with blocking I/O.
+
+    The steps do no I/O themselves: they yield (function, *arguments) tuples and receive the result
+    of function(*arguments), or its exception is raised at the yield. The async engine runs the same
+    steps with _run_steps_async, which calls the async version of each function.
+
+    Args:
+        steps (generator): The steps (e.g. _find_day_id_steps).
+
+    Returns:
+        The return value of the steps.
+    """
+    try:
+        operation = next(steps)
+        while True:
+            try:
+                result = operation[0](*operation[1:])
+            except BaseException as e:
+                operation = steps.throw(e)
+            else:
+                operation = steps.send(result)
+    except StopIteration as stop:
+        return stop.value
+
+
+def _answer_ids(steps, answer):
+    """Run steps that yield ids and receive their days (like _search_steps) inside the steps of _run_steps.
+
+    Args:
+        steps (generator): The steps that yield ids.
+        answer (callable): Gives the steps that find the answer of an id (e.g. _Prober.probe).
+
+    Returns:
+        The return value of the steps.
+    """
+    try:
+        qid = next(steps)
+        while True:
+            qid = steps.send((yield from answer(qid)))
+    except StopIteration as stop:
+        return stop.value
+
+
+class _Prober:
+    """Probe day_ids for a search and count the probes.
+
+    Ids in NOT_DOWNLOADABLE are not probed (see _first_valid).
+    """
+
+    def __init__(self, day):
+        self.day = day
+        self.probes = 0
+        self.requests = 0
+
+    def _count(self, qid):
+        self.probes += 1
+        if DAY_INDEX.get(qid) is None:
+            self.requests += 1
+
+    def _to_day(self, str_day):
+        return _parse_str_day(str_day, self.day) if str_day != '' else None
+
+    def read(self, qid):
+        """Steps that get the day string of `qid` or '' if the id has no data."""
+        self._count(qid)
+        return (yield from _str_day_steps(qid))
+
+    def probe(self, qid):
+        """Steps that get the day of `qid` or None if the id has no data."""
+        return self._to_day((yield from self.read(qid)))
+
+
+def _first_valid(qid, step, stop=None, max_misses=None):
+    """Find the first id with data from `qid` going in the direction of `step`.
+
+    This is a generator used by _search_steps: it yields the ids to probe and receives their days
+    (None if the id has no data). Ranges of ids in NOT_DOWNLOADABLE are jumped over without a probe.
+
+    Args:
+        qid (int): The first id to probe.
+        step (int): 1 to go forward, -1 to go backward.
+        stop (int): The search ends before reaching this id.
+        max_misses (int): The search ends after this number of ids without data in a row.
+
+    Returns:
+        tuple: (id, day) of the found id or (None, None) if not found.
+    """
+    misses = 0
+    while True:
+        qid = NOT_DOWNLOADABLE.next_downloadable(qid, step)
+        if qid < 0 or (stop is not None and (stop - qid) * step <= 0):
+            break
+        day = yield qid
+        if day is not None:
+            return qid, day
+        misses += 1
+        if max_misses is not None and misses >= max_misses:
+            break
+        qid += step
+    return None, None
+
+
+def _gallop_back(qid):
+    """Find an id with data before the ids without data from `qid` on, e.g. when the estimate is past the latest id.
+
+    Like _first_valid going backward, but without a limit on the number of ids without data: the step
+    doubles after each of them, so an estimate that is n ids too far costs O(log n) probes.
+
+    Args:
+        qid (int): The first id to probe.
+
+    Returns:
+        tuple: (id, day) of the found id or (None, None) if no id before has data.
+    """
+    step = 1
+    while True:
+        qid = NOT_DOWNLOADABLE.next_downloadable(qid, -1)
+        if qid < 0:
+            return None, None
+        day = yield qid
+        if day is not None:
+            return qid, day
+        qid -= step
+        step *= 2
+
+
+# Ids without data which are not in NOT_DOWNLOADABLE are expected to come in short runs.
+# After an id with data, more ids than this without data in a row are taken as the end of the data.
+SEARCH_MAX_HOLE = 16
+
+
+def _search_steps(day, estimate_id):
+    """Find the exact day_id of the query day by galloping from the estimated id and then binary searching.
+
+    Day ids grow with days, so the search first doubles its step from the estimate until the day is
+    bracketed by two ids and then halves the bracket. It needs O(log n) probes where n is the error
+    of the estimate.
+
+    The search does no I/O itself: it is a generator that yields the ids to probe and receives
+    their days, so both the blocking and the async engine can drive it.
+
+    Args:
+        day (datetime): The query day.
+        estimate_id (int): The estimated day_id of the query day.
+
+    Returns:
+        str: String of the query day or '' if the day has no data.
+        int: day_id of the day, or the id after the day if the day has no data.
+    """
+    str_day = day.strftime(args.dayformat)
+    qid, qday = yield from _first_valid(max(estimate_id, 0), 1, max_misses=SEARCH_MAX_HOLE)
+    if qid is None:
+        # No data after the estimate, it may be far past the latest id (a stale pivot or unknown holidays).
+        qid, qday = yield from _gallop_back(estimate_id - 1)
+    if qid is None:
+        return '', estimate_id
+    if qday == day:
+        return str_day, qid
+
+    # Gallop until the day is between lo and hi.
+    step = 1
+    if qday < day:
+        lo, hi = qid, None
+        while hi is None:
+            qid, qday = yield from _first_valid(lo + step, 1, max_misses=SEARCH_MAX_HOLE)
+            if qid is None:
+                hi = lo + step
+            elif qday == day:
+                return str_day, qid
+            elif qday > day:
+                hi = qid
+            else:
+                lo = qid
+                step *= 2
+    else:
+        lo, hi = None, qid
+        while lo is None:
+            qid, qday = yield from _first_valid(hi - step, -1, max_misses=SEARCH_MAX_HOLE)
+            if qid is None:
+                lo = max(hi - step, 0) - 1
+            elif qday == day:
+                return str_day, qid
+            elif qday < day:
+                lo = qid
+            else:
+                hi = qid
+                step *= 2
+    logging.debug(f"The day_id of {str_day} is between {lo} and {hi}.")
+
+    # Binary search in (lo, hi).
+    while hi - lo > 1:
+        mid = (lo + hi) // 2
+        qid, qday = yield from _first_valid(mid, 1, stop=hi)
+        if qid is None:
+            # No data in [mid, hi), so look below mid.
+            qid, qday = yield from _first_valid(mid - 1, -1, stop=lo)
+            if qid is None or qday < day:
+                break
+        if qday == day:
+            return str_day, qid
+        if qday < day:
+            lo = qid
+        else:
+            hi = qid
+    return '', hi
+
+
+def _request_headers(link, method="GET", headers=None):
+    """Send a request and get the status and the headers of the response. The body is dropped.
+
+    Returns:
+        int: HTTP status code.
+        HTTPMessage: The response headers.
+    """
+    with HTTP_POOL.request(link, method=method, headers=headers) as response:
+        return response.status, response.info()
+
+
+def _request_headers_steps(link, method="GET", headers=None):
+    """Run _request_headers (steps of _run_steps), retried with the backoff after a transient error.
+
+    Raises:
+        HTTPError, URLError: The request failed for good (see _is_transient).
+    """
+    retry = 0
+    while True:
+        try:
+            return (yield (_request_headers, link, method, headers))
+        except URLError as e:
+            if not _is_transient(e) or retry >= args.max_retry:
+                raise
+            retry += 1
+            delay = _backoff_delay(retry, e)
+            logging.warning(f"Retry to probe {link} in {delay:.1f} s (retry {retry}). {e}")
+            yield (time.sleep, delay)
+
+
+def _probe_steps(link):
+    """Get the response headers of a link without downloading the file (steps of _run_steps).
+
+    HEAD is tried first. If the server does not answer HEAD with a Content-Disposition, a GET of
+    the first byte (Range: bytes=0-0) is sent instead and the body is dropped.
+
+    Args:
+        link (str): The link to probe.
+
+    Returns:
+        int: HTTP status code.
+        HTTPMessage: The response headers.
+    """
+    feed = FEED.get()
+    start = time.monotonic()
+    method = "HEAD"
+    status, headers = None, None
+    if feed.head_supported is not False:
+        try:
+            status, headers = yield from _request_headers_steps(link, "HEAD")
+        except HTTPError as he:
+            if he.code not in (405, 501):
+                raise
+            feed.head_supported = False
+    if headers is None or (feed.head_supported is None and headers["Content-Disposition"] is None):
+        method = "GET"
+        range_status, range_headers = yield from _request_headers_steps(link, "GET", {"Range": "bytes=0-0"})
+        if headers is not None and range_headers["Content-Disposition"] is not None:
+            logging.debug("HEAD responses have no Content-Disposition. Probe with GET from now on.")
+            feed.head_supported = False
+        status, headers = range_status, range_headers
+    elif feed.head_supported is None:
+        feed.head_supported = True
+    logging.debug(
+        f"Probed {link} ({method}, status {status}) in {(time.monotonic() - start) * 1000:.1f} ms.")
+    return status, headers
+
+
+def _probe_headers(link):
+    """Run _probe_steps with blocking requests."""
+    return _run_steps(_probe_steps(link))
+
+
+def _str_day_steps(qid):
+    """Get the day which have day_id = qid (steps of _run_steps).
+
+    Args:
+        qid (int): The query day_id.
+
+    Returns:
+        str: String format of the day which day_id(the_day) = qid or '' if can not found.
+    """
+    if qid in NOT_DOWNLOADABLE or qid < 0:
+        return ''
+    str_day = DAY_INDEX.get(qid)
+    if str_day is not None:
+        return str_day
+    _, headers = yield from _probe_steps(LINK_PATTERN % (qid, FILE_NAME[args.keyfile]))
+    content_disposition = headers["Content-Disposition"]
+    str_day = ''
+    if content_disposition is not None:
+        _, params = cgi.parse_header(content_disposition)
+        str_day = _get_str_day_from_filename(params["filename"])
+    DAY_INDEX.put(qid, str_day)
+    return str_day
+
+
+def _get_str_day_from_filename(filename):
+    """Get the day string in the name of a downloaded file (e.g. 'TC_20230516.txt' -> '20230516').
+
+    Args:
+        filename (str): File name in the Content-Disposition header.
+
+    Returns:
+        str: The digits of the day in the file name.
+    """
+    return ''.join(re.findall(r'\d+', filename))[:8]
+
+
+def _estimate_day_id(day):
+    """Estimate the day_id of a day with the business days between it and the nearest known day (see TradingCalendar).
+
+    Args:
+        day (datetime): The day you want to find day_id
+
+    Returns:
+        int: The estimated day_id.
+    """
+    return int(CALENDAR.estimate([day])[0])
+
+
+def _find_exact_day_id(day):
+    """Because there are missing data (they are listed in NOT_DOWNLOADABLE by Brute force) for unknown reasons, we need to estimate the id and then use the binary search to find the exact id base on the date.
+
+    This runs _find_day_id_steps with blocking probes.
+
+    Args:
+        day (datetime): The day you want to find day_id
+
+    Returns:
+        str: String format of the day if found or empty string if not found.
+        int: day_id of the day, the id after the day if the day has no data or the estimate if the search failed.
+    """
+    return _run_steps(_find_day_id_steps(day))
+
+
+def _find_day_id_steps(day):
+    """Find the day_id of a day (steps of _run_steps, see _find_exact_day_id).
+
+    Args:
+        day (datetime): The day you want to find day_id
+
+    Returns:
+        str: String format of the day if found or empty string if not found.
+        int: day_id of the day, the id after the day if the day has no data or the estimate if the search failed.
+    """
+    str_day = day.strftime(args.dayformat)
+    if day >= datetime.today():
+        logging.warning(
+            "You are going to download data from the future and I can not do it right now.")
+        return '', -1
+    logging.debug(f"Finding the day_id of {day}...")
+
+    # Try to estimate the day from day_id
+    current_id = _estimate_day_id(day)
+    logging.debug(f"estimate {day} = {current_id}")
+    indexed_id = DAY_INDEX.find(str_day, current_id)
+    if indexed_id is not None:
+        logging.debug(f"The day_id of {str_day} is {indexed_id} (indexed).")
+        return str_day, indexed_id
+    prober = _Prober(day)
+    try:
+        # Searching around the estimated day to find the exact day.
+        day_str, day_id = yield from _answer_ids(_search_steps(day, current_id), prober.probe)
+    except HTTPError as he:
+        logging.warning(he.reason)
+        logging.debug(
+            "Can not find the exact day_id because of HTTPError. Return the estimated value.")
+        return '', current_id
+    except Exception as e:
+        logging.warning(e)
+        logging.debug(
+            "Can not find the exact day_id because above Exception. Return the estimated value.")
+        return '', current_id
+    return _searched_day_id(str_day, day_str, day_id, prober)
+
+
+def _searched_day_id(str_day, day_str, day_id, prober):
+    """Log the result of a day_id search. Helper function for _find_day_id_steps.
+
+    Returns:
+        str: String format of the day if found or empty string if not found.
+        int: day_id of the day or the id after the day if the day has no data.
+    """
+    logging.info(
+        f"Searched the day_id of {str_day} with {prober.probes} probe(s) ({prober.requests} request(s) to the web).")
+    if day_str != '':
+        logging.debug(f"The day_id of {str_day} is {day_id}.")
+        CALENDAR.learn([(day_id, prober.day)])
+        return str_day, day_id
+    logging.debug(f"Not found the day_id for {str_day}.")
+    return '', day_id
+
+
+def _downloadable_ids(first, last):
+    """Iterate over the ids in [first, last] which are not in NOT_DOWNLOADABLE, jumping over its ranges."""
+    qid = NOT_DOWNLOADABLE.next_downloadable(first)
+    while qid <= last:
+        yield qid
+        qid = NOT_DOWNLOADABLE.next_downloadable(qid + 1)
+
+
+def _range_steps(lo_id, lo_day, hi_id, hi_day, infer=True):
+    """Find the day of every id with data between two bounds with as few probes as possible.
+
+    The ids strictly between lo_id and hi_id have days strictly between lo_day and hi_day. When an
+    interval has as many ids left (not in NOT_DOWNLOADABLE and not known to have no data) as
+    business days (see TradingCalendar), the ids are the business days in order and nothing is
+    probed. Otherwise the interval is split at a known id, or at the middle id which is probed, so
+    the number of probes grows with the number of unknown holidays and holes in the range instead
+    of its length. Ids in the day index are
+    never probed.
+
+    Like _search_steps, this is a generator that yields the ids to probe and receives their day
+    strings ('' if the id has no data).
+
+    Args:
+        lo_id (int): The id before the range.
+        lo_day (datetime): A day before the days of the range.
+        hi_id (int): The id after the range.
+        hi_day (datetime): A day after the days of the range.
+        infer (bool): Infer the days of the intervals that match the business days. An interval with a
+            hole (an id without data not in NOT_DOWNLOADABLE) and an unknown holiday also matches, so with False
+            every id which is not indexed is probed.
+
+    Returns:
+        list: (id, day) of each id with data in the range, sorted by id.
+        set: Ids whose day is inferred from the business days instead of read from the web.
+    """
+    # id -> day, or None if the id has no data.
+    known = {}
+    inferred = set()
+    intervals = [(lo_id, lo_day, hi_id, hi_day)]
+    while intervals:
+        lo_id, lo_day, hi_id, hi_day = intervals.pop()
+        ids = []
+        for qid in _downloadable_ids(lo_id + 1, hi_id - 1):
+            if qid not in known:
+                str_day = DAY_INDEX.get(qid)
+                if str_day is None:
+                    ids.append(qid)
+                    continue
+                near_day = lo_day + timedelta(days=(qid - lo_id) * 7 // 5)
+                known[qid] = _parse_str_day(str_day, near_day) if str_day else None
+            if known[qid] is not None:
+                ids.append(qid)
+        if not ids:
+            continue
+
+        business_days = CALENDAR.business_days(lo_day, hi_day)
+        if infer and len(ids) == len(business_days) \
+                and all(known.get(qid, day) == day for qid, day in zip(ids, business_days)):
+            for qid, day in zip(ids, business_days):
+                if qid not in known:
+                    known[qid] = day
+                    inferred.add(qid)
+            continue
+
+        middle = ids[len(ids) // 2]
+        split = min((qid for qid in ids if qid in known), default=None,
+                    key=lambda qid: abs(qid - middle))
+        if split is None:
+            split = middle
+            str_day = yield split
+            near_day = lo_day + timedelta(days=(split - lo_id) * 7 // 5)
+            known[split] = _parse_str_day(str_day, near_day) if str_day else None
+            if known[split] is None:
+                # The interval is checked again without this id.
+                intervals.append((lo_id, lo_day, hi_id, hi_day))
+                continue
+        intervals.append((split, known[split], hi_id, hi_day))
+        intervals.append((lo_id, lo_day, split, known[split]))
+    days = [(qid, day) for qid, day in sorted(known.items()) if day is not None]
+    return days, inferred
+
+
+def _range_bounds(start_day, end_day, start, end):
+    """Get the bounds of _range_steps from the results of _find_exact_day_id for the start and end days."""
+    (_, sid), (e, eid) = start, end
+    if e == '':
+        # eid is the id after the end day.
+        eid -= 1
+    logging.debug(f"[Check {sid} is {start_day}, {eid} is {end_day}.]")
+    return sid - 1, start_day - timedelta(days=1), eid + 1, end_day + timedelta(days=1)
+
+
+def _resolve_steps(start_day, end_day, start, end):
+    """Find the days between the start and end days once they are searched (steps of _run_steps, see resolve_range).
+
+    Args:
+        start_day (datetime): The first day of the range.
+        end_day (datetime): The last day of the range.
+        start (tuple): Result of _find_exact_day_id for the start day.
+        end (tuple): Result of _find_exact_day_id for the end day.
+
+    Returns:
+        tuple: The days, the inferred ids and the prober of _range_steps, or None if it failed.
+    """
+    prober = _Prober(start_day)
+    try:
+        days, inferred = yield from _answer_ids(
+            _range_steps(*_range_bounds(start_day, end_day, start, end), infer=args.infer_range), prober.read)
+    except Exception as e:
+        logging.error(f"Can not resolve the days from {start_day:%Y%m%d} to {end_day:%Y%m%d}. {e}")
+        return None
+    return days, inferred, prober
+
+
+def _resolved_range(start_day, end_day, days, inferred, prober):
+    """Save and log the days found by _range_steps. Helper function for resolve_range.
+
+    Returns:
+        list: (day_id, day string) of each day with data from the start day to the end day.
+    """
+    resolved = []
+    for qid, day in days:
+        if not start_day <= day <= end_day:
+            logging.warning(f"The day_id {qid} is {day:%Y%m%d} which is not in the range.")
+            continue
+        str_day = day.strftime(args.dayformat)
+        if qid in inferred:
+            DAY_INDEX.put(qid, str_day)
+        resolved.append((qid, str_day))
+    DAY_INDEX.save()
+    CALENDAR.learn(days)
+    logging.info(
+        f"Resolved {len(resolved)} day(s) from {start_day:%Y%m%d} to {end_day:%Y%m%d} with {prober.probes} "
+        f"probe(s) ({prober.requests} request(s) to the web), {len(inferred)} inferred from the business days.")
+    return resolved
+
+
+def resolve_range(start_day, end_day):
+    """Find the day_id and the day of every day with data from the start day to the end day in one pass.
+
+    The start and end days are searched like a single day, then the ids between them are filled
+    by _range_steps. Every day found is saved in the day index, so the files of the range can be
+    downloaded in any order without probing again.
+
+    Args:
+        start_day (datetime): The first day of the range.
+        end_day (datetime): The last day of the range.
+
+    Returns:
+        list: (day_id, day string) of each day with data, sorted by day_id.
+    """
+    resolved = _run_steps(_resolve_steps(start_day, end_day,
+                                         _find_exact_day_id(start_day), _find_exact_day_id(end_day)))
+    if resolved is None:
+        return []
+    return _resolved_range(start_day, end_day, *resolved)
+
+###################### Flow control section ############################
+
+
+class _FeedFilter(logging.Filter):
+    """Let through the records logged for a feed and the records logged out of any feed."""
+
+    def __init__(self, feed):
+        super().__init__()
+        self.feed = feed
+
+    def filter(self, record):
+        return FEED.get(None) in (None, self.feed)
+
+
+class _ConsoleHandler(logging.StreamHandler):
+    """Write the records of a feed to stderr without mixing them with the status line of the progress."""
+
+    def __init__(self, feed):
+        super().__init__()
+        self.feed = feed
+
+    def emit(self, record):
+        progress = self.feed.progress
+        if progress is None or progress.stream is not self.stream:
+            super().emit(record)
+            return
+        with progress.hidden():
+            super().emit(record)
+
+
+def _init_failed_log():
+    """Write the failed downloads of the current feed to its failed log (args.error).
+
+    The failed log is written even when the program has its own log handlers, so the files can be retried.
+    """
+    failed = logging.getLogger("failed")
+    failed.setLevel(logging.WARNING)
+    failed_file = logging.FileHandler(filename=args.error, encoding='utf8')
+    failed_file.addFilter(_FeedFilter(FEED.get()))
+    failed.addHandler(failed_file)
+
+
+def _init_logger():
+    """Initiate the root logger for the current feed.
+
+    Each feed has its own handlers (log file and console), which only get its records.
+    """
+    root_logger = logging.getLogger()
+    level = logging.getLevelName(args.loglevel.upper())
+    if root_logger.handlers:
+        # Another feed has set the level.
+        level = min(level, root_logger.level)
+    root_logger.setLevel(level)
+    feed_filter = _FeedFilter(FEED.get())
+    stream_handler = _ConsoleHandler(FEED.get())
+    stream_handler.setFormatter(logging.Formatter(
+        "%(asctime)s [%(name)s] %(levelname)s %(message)s"))
+    if args.quiet:
+        stream_handler.setLevel(logging.CRITICAL)
+    else:
+        stream_handler.setLevel(args.loglevel.upper())
+    file_handle = logging.FileHandler(filename=args.logfile, encoding='utf8')
+    file_handle.setFormatter(logging.Formatter(
+        "%(asctime)s [%(name)s] %(levelname)s %(message)s"))
+    file_handle.setLevel(args.loglevel.upper())
+
+    for handler in (stream_handler, file_handle):
+        handler.addFilter(feed_filter)
+    root_logger.addHandler(file_handle)
+    root_logger.addHandler(stream_handler)
+
+
+def _close_logger():
+    """Remove and close the handlers added by _init_logger and _init_failed_log for the current feed."""
+    feed = FEED.get()
+    for logger in (logging.getLogger(), logging.getLogger("failed")):
+        for handler in list(logger.handlers):
+            if any(isinstance(f, _FeedFilter) and f.feed is feed for f in handler.filters):
+                logger.removeHandler(handler)
+                handler.close()
+
+
+def _update_option(yesterday):
+    """Handle when the --update option is turned on. Try to download the latest data (data of yesterday).
+
+    Returns:
+        bool: Is the data of yesterday downloaded successfully?
+    """
+    logging.debug("Downloading latest data (yesterday data).")
+    str_day, day_id = _find_exact_day_id(
+        datetime.strptime(yesterday, "%Y%m%d"))
+    if str_day == '':
+        logging.error("Not found the data from yesterday.")
+        return False
+    metadata = {"id": day_id, "day": str_day}
+    logging.debug(f"Latest data: {metadata}.")
+    status = all(download_jobs([(metadata, FILE_NAME[file]) for file in args.file]))
+    _convert_days([(metadata, None)])
+    return status
+
+
+def _retry_jobs(rows, done):
+    """Yield the (metadata, file name) job of each link in the rows of a failed-downloads file once.
+
+    Rows that can not be parsed are logged and written back to the failed log, so they are not lost
+    when the retried file is removed.
+
+    Args:
+        rows (iterable): Rows of the file (without the header).
+        done (set): Links that are already retried (they are skipped).
+    """
+    seen = set(done)
+    for row in rows:
+        row = row.rstrip("\r\n")
+        if not row.strip():
+            continue
+        info = row.split('\t')
+        match = re.search(r'/(\d+)/([^/]+)$', info[0])
+        if len(info) < 2 or match is None:
+            logging.warning(f"Can not parse the row {row!r}, keep it in the failed log.")
+            logging.getLogger("failed").error(row)
+            continue
+        day_id, filename = int(match.group(1)), match.group(2)
+        link = LINK_PATTERN % (day_id, filename)
+        if link in seen:
+            continue
+        seen.add(link)
+        yield {"id": day_id, "day": info[1]}, filename
+
+
+def _retry_option():
+    """Handle when the --retry option is set. Try to redownload files from links in the text file that contain failed downloads.
+
+    The file is moved to '<file>.retrying' and read row by row. Each link is retried once even if it is in
+    many rows, with args.workers workers. Links that fail again are written to the failed log. If the
+    failed log is the retried file, a new file is started at its path. Every retried link is appended to
+    '<file>.done', so an interrupted retry continues where it stopped when --retry is run again.
+    """
+    if not args.retry:
+        args.retry = args.error
+    source_path = f"{args.retry}.retrying"
+    done_path = f"{args.retry}.done"
+    # The failed log may be open on the retried file, it is opened again at its path when a link fails.
+    for handler in logging.getLogger("failed").handlers:
+        if isinstance(handler, logging.FileHandler) \
+                and os.path.abspath(handler.baseFilename) == os.path.abspath(args.retry):
+            handler.close()
+    if os.path.exists(source_path):
+        logging.info(f"Continue the interrupted retry of {source_path}.")
+    elif not os.path.exists(args.retry):
+        logging.error(f"Not found the file to retry: {args.retry}")
+        return
+    else:
+        os.replace(args.retry, source_path)
+        if os.path.exists(done_path):
+            os.remove(done_path)
+    done = set()
+    if os.path.exists(done_path):
+        with open(done_path, "r") as done_file:
+            done = {line.rstrip("\n") for line in done_file if line.strip()}
+
+    with open(source_path, "r") as source:
+        header = source.readline()
+        if os.path.abspath(args.retry) == os.path.abspath(args.error) and not os.path.exists(args.retry):
+            with open(args.retry, "w") as error_list:
+                error_list.write(header)
+
+        with open(done_path, "a") as done_file:
+            def on_done(metadata, filename, success):
+                done_file.write(LINK_PATTERN % (metadata["id"], filename) + "\n")
+                done_file.flush()
+
+            statuses = download_jobs(_retry_jobs(source, done), on_done)
+    os.remove(source_path)
+    os.remove(done_path)
+    logging.info(
+        f"Retried {len(statuses)} file(s): {statuses.count(True)} success, {statuses.count(False)} fail.")
+
+
+def _day_option(yesterday):
+    """Handle --day option is set. Download the data for a specific day.
+
+    Args:
+        yesterday (str): String format of yesterday.
+
+    Returns:
+        bool: Is the download successfully?
+    """
+    logging.debug("Downloading data for the specific day.")
+    if args.day.lower() == "yesterday":
+        args.day = yesterday
+    jobs = _day_jobs(args.day)
+    if not jobs:
+        return False
+    status = all(download_jobs(jobs))
+    _convert_days(jobs)
+    return status
+
+
+def _range_option(yesterday):
+    """Handle if --start --end option present. Download data for each day from START to END.
+
+    Args:
+        yesterday (str): String format of yesterday.
+
+    Return:
+        int: Number of failed downloads.
+    """
+    number_of_fail = 0
+    if args.start.lower() != "off" and args.end.lower() != "off":
+        logging.debug("Downloading a batch of data from a range of days.")
+        if args.start.lower() == "yesterday":
+            args.start = yesterday
+        if args.end.lower() == "yesterday":
+            args.end = yesterday
+        number_of_fail = download_range()
+    return number_of_fail
+
+
+def _past_option(yesterday):
+    """Handle --past option. Download data for the last N days in recors.
+
+    Args:
+        yesterday (str): String format of yesterday.
+
+    Returns:
+        int: Number of failed downloads.
+    """
+    logging.debug(f"Downloading data for last {args.past} day(s).")
+    args.start = (datetime.today() -
+                  timedelta(days=args.past + 1)).strftime("%Y%m%d")
+    args.end = yesterday
+    number_of_fail = download_range()
+    return number_of_fail
+
+###################### Download section ################################
+
+
+def _open_part_file(save_path, offset, digest=None):
+    """Open a file to write a body from `offset`. The first `offset` bytes are fed into `digest`.
+
+    Returns:
+        file: The file positioned at `offset`.
+    """
+    save_file = open(save_path, "r+b" if offset else "wb")
+    if digest is not None:
+        while save_file.tell() < offset:
+            digest.update(save_file.read(
+                min(DOWNLOAD_CHUNK_SIZE, offset - save_file.tell())))
+    save_file.seek(offset)
+    save_file.truncate()
+    return save_file
+
+
+def _open_response(link, headers=None):
+    """Send a GET request and get the response (it must be closed with _close_response)."""
+    return HTTP_POOL.request(link, headers=headers)
+
+
+def _close_response(response):
+    response.close()
+
+
+def _read_block(response):
+    return response.read(DOWNLOAD_CHUNK_SIZE)
+
+
+def _save_body_steps(response, save_path, reporthook=None, offset=0, digest=None):
+    """Stream the body of a response to a file chunk by chunk (steps of _run_steps).
+
+    Args:
+        response (HTTPResponse): An opened response.
+        save_path (Path): Path to the file to save the body.
+        reporthook (callable): Called with (bytes received, total size or -1) after each block (see Progress.transfer).
+        offset (int): The body is appended to the first `offset` bytes of the file (0 to overwrite the file).
+        digest (hashlib hash): Updated with the whole file (the first `offset` bytes are read back from the file).
+
+    Returns:
+        int: Number of bytes saved.
+
+    Raises:
+        ContentTooShortError: The connection was closed before the whole body was received.
+    """
+    total_size = int(response.info().get("Content-Length", -1))
+    size = 0
+    if reporthook:
+        reporthook(size, total_size)
+    with _open_part_file(save_path, offset, digest) as save_file:
+        while True:
+            try:
+                block = yield (_read_block, response)
+            except (http.client.HTTPException, OSError, asyncio.IncompleteReadError, asyncio.TimeoutError) as e:
+                raise ContentTooShortError(
+                    f"retrieval incomplete: {e!r} after {size} out of {total_size} bytes", (save_path, response.info())) from e
+            if not block:
+                break
+            save_file.write(block)
+            if digest is not None:
+                digest.update(block)
+            size += len(block)
+            if reporthook:
+                reporthook(size, total_size)
+    if 0 <= size < total_size:
+        raise ContentTooShortError(
+            f"retrieval incomplete: got only {size} out of {total_size} bytes", (save_path, response.info()))
+    return size
+
+
+def _read_part_info(info_path, link):
+    """Read the sidecar file of a partial download.
+
+    Returns:
+        dict: Link, file name, offset, ETag and Last-Modified of the partial download or None if
+        there is no partial download of the link.
+    """
+    try:
+        with open(info_path, "r") as info_file:
+            part_info = json.load(info_file)
+    except (OSError, ValueError):
+        return None
+    return part_info if part_info.get("link") == link else None
+
+
+def _write_part_info(info_path, part_info):
+    tmp_path = f"{info_path}.tmp"
+    with open(tmp_path, "w") as info_file:
+        json.dump(part_info, info_file)
+    os.replace(tmp_path, info_path)
+
+
+def _range_headers(part_path, part_info):
+    """Get the request headers that continue a partial download.
+
+    Args:
+        part_path (Path): Path to the partial file.
+        part_info (dict): Sidecar info of the partial download or None.
+
+    Returns:
+        int: Offset to continue from (0 if there is nothing to continue).
+        dict: Range and If-Range headers.
+    """
+    if part_info is None or not os.path.exists(part_path):
+        return 0, {}
+    offset = os.path.getsize(part_path)
+    if offset == 0:
+        return 0, {}
+    headers = {"Range": f"bytes={offset}-"}
+    # Only continue if the file on the server is the same, otherwise the server sends the whole file.
+    validator = part_info.get("etag") or part_info.get("last_modified")
+    if validator:
+        headers["If-Range"] = validator
+    return offset, headers
+
+
+def _range_offset(status, headers, offset, link):
+    """Check where the body of a response to a Range request starts.
+
+    Returns:
+        int: `offset` if the server sent the rest of the file, 0 if it sent the whole file or None
+        if the response can not be used.
+    """
+    if status != 206:
+        return 0
+    content_range = headers.get("Content-Range", "")
+    if not content_range.startswith(f"bytes {offset}-"):
+        logging.debug(f"Unexpected Content-Range '{content_range}' for {link}.")
+        return None
+    logging.info(f"Continue downloading {link} from byte {offset}.")
+    return offset
+
+
+def _request_part_steps(link, part_path, part_info):
+    """Request a file, continuing a partial download with a Range request if there is one (steps of _run_steps).
+
+    Args:
+        link (str): Link to the file.
+        part_path (Path): Path to the partial file.
+        part_info (dict): Sidecar info of the partial download or None.
+
+    Returns:
+        PooledResponse: The response.
+        int: Offset in the file where the body of the response starts.
+    """
+    offset, headers = _range_headers(part_path, part_info)
+    if offset == 0:
+        return (yield (_open_response, link)), 0
+    try:
+        response = yield (_open_response, link, headers)
+    except HTTPError as he:
+        if he.code != 416:
+            raise
+        logging.debug(f"Can not continue {part_path} from byte {offset}.")
+        return (yield (_open_response, link)), 0
+    offset = _range_offset(response.status, response.info(), offset, link)
+    if offset is None:
+        yield (_close_response, response)
+        return (yield (_open_response, link)), 0
+    return response, offset
+
+
+class _DayMismatch(URLError):
+    """A file of a day_id is for another day than the one it was downloaded for.
+
+    Attributes:
+        str_day (str): The day in the name of the file.
+    """
+
+    def __init__(self, reason, str_day):
+        super().__init__(reason)
+        self.str_day = str_day
+
+
+def _start_part(link, headers, file_name, str_day, day_id, info_path, offset):
+    """Check the response of a file and write the sidecar of its partial download.
+
+    Args:
+        link (str): Link to the file.
+        headers (HTTPMessage): Response headers.
+        file_name (str): File name in the link.
+        str_day (str): String of the query day (for the failed log).
+        day_id (int): day_id in the link.
+        info_path (Path): Path to the sidecar file.
+        offset (int): Offset in the file where the body of the response starts.
+
+    Returns:
+        dict: Sidecar info of the download.
+
+    Raises:
+        FileNotFoundError: The response has no Content-Disposition (there is no data for the id).
+        _DayMismatch: The name of the file tells another day than `str_day`.
+    """
+    is_key_file = day_id is not None and file_name == FILE_NAME[args.keyfile]
+    contentdisposition = headers["Content-Disposition"]
+    if contentdisposition is None:
+        if is_key_file:
+            DAY_INDEX.put(day_id, '')
+        elif day_id is not None:
+            # The day of the id may be inferred, only the key file tells that the id has no data.
+            DAY_INDEX.forget(day_id)
+        raise FileNotFoundError(
+            f"Content disposition is None. Not found '{file_name}'.")
+    _, params = cgi.parse_header(contentdisposition)
+    filename = params["filename"]
+    # Every file named with a day checks the day of the id, which may be inferred (see resolve_range).
+    file_day = _get_str_day_from_filename(filename)
+    if is_key_file:
+        DAY_INDEX.put(day_id, file_day)
+    if day_id is not None and len(file_day) == 8 and file_day != str_day:
+        if not is_key_file:
+            DAY_INDEX.put(day_id, file_day)
+        raise _DayMismatch(f"'{filename}' of the day_id {day_id} is not for {str_day}.", file_day)
+    part_info = {
+        "link": link,
+        "filename": filename,
+        "offset": offset,
+        "etag": headers["ETag"],
+        "last_modified": headers["Last-Modified"],
+    }
+    _write_part_info(info_path, part_info)
+    return part_info
+
+
+def _check_zip(zip_path, extract_dir=None):
+    """Check the CRC-32 of every member of a zip file, reading the members block by block.
+
+    Args:
+        zip_path (Path): Path to the zip file.
+        extract_dir (Path): Directory to extract the CSV members into in the same pass (None for no extraction).
+
+    Members are extracted by their base name. When several CSV members have the same base name (in
+    different directories of the archive), they keep their relative path instead, so none of them
+    overwrites another.
+
+    Returns:
+        list: Names (relative paths) of the extracted files.
+
+    Raises:
+        zipfile.BadZipFile: The archive is truncated or a member is corrupt. Nothing is extracted.
+    """
+    extracted = []
+    try:
+        with zipfile.ZipFile(zip_path) as archive:
+            members = [member for member in archive.infolist() if not member.is_dir()]
+            base_names = Counter(os.path.basename(member.filename) for member in members
+                                 if member.filename.lower().endswith(".csv"))
+            for member in members:
+                with archive.open(member) as member_file:
+                    if extract_dir is not None and member.filename.lower().endswith(".csv"):
+                        name = os.path.basename(member.filename)
+                        if base_names[name] > 1:
+                            # Drop the parts that would leave the extract directory.
+                            name = os.path.join(*[part for part in PurePosixPath(member.filename).parts
+                                                  if part not in ("/", "..", ".")])
+                            logging.warning(
+                                f"Several members of {Path(zip_path).name} are named {os.path.basename(name)}, "
+                                f"extract {member.filename} to {name}.")
+                            os.makedirs((extract_dir / name).parent, exist_ok=True)
+                        extracted.append(name)
+                        with open(extract_dir / f"{name}.part", "wb") as extract_file:
+                            shutil.copyfileobj(
+                                member_file, extract_file, DOWNLOAD_CHUNK_SIZE)
+                    else:
+                        # The CRC-32 is checked when the end of the member is read.
+                        while member_file.read(DOWNLOAD_CHUNK_SIZE):
+                            pass
+    except (zipfile.BadZipFile, zlib.error, EOFError) as e:
+        for name in extracted:
+            try:
+                os.remove(extract_dir / f"{name}.part")
+            except FileNotFoundError:
+                pass
+        raise zipfile.BadZipFile(f"{zip_path}: {e}") from e
+    for name in extracted:
+        os.replace(extract_dir / f"{name}.part", extract_dir / name)
+    return extracted
+
+
+def _finish_part(part_path, info_path, save_path, part_info, size, digest, str_day, day_id):
+    """Check (with --verify or --extract), rename a complete partial download and record it in the manifest.
+
+    Raises:
+        zipfile.BadZipFile: The zip file is corrupt. The partial download is removed, so the next try
+            downloads the file again from the start.
+    """
+    if (args.verify or args.extract) and save_path.suffix.lower() == ".zip":
+        try:
+            extracted = _check_zip(
+                part_path, save_path.parent if args.extract else None)
+        except zipfile.BadZipFile:
+            os.remove(part_path)
+            os.remove(info_path)
+            raise
+        logging.debug(f"Checked {save_path.name}.")
+        for name in extracted:
+            logging.info(f"Extracted file: {save_path.parent / name}")
+    if args.dedup != "off":
+        BLOB_STORE.put(part_path, save_path, size, digest.hexdigest())
+    else:
+        os.replace(part_path, save_path)
+    os.remove(info_path)
+    MANIFEST.add(part_info["link"], day_id, str_day,
+                 save_path, size, digest.hexdigest())
+    name = os.path.basename(urlsplit(part_info["link"]).path)
+    if name in _structure_file_names():
+        SCHEMAS.add(name, day_id, save_path, part_info["etag"])
+
+
+def _structure_file_names():
+    """Names of the structure files in FILE_NAME (the key of the structure file of 'td' is 'tds')."""
+    return {name for key, name in FILE_NAME.items()
+            if key.endswith('s') and key[:-1] in FILE_NAME}
+
+
+def _known_structure_steps(link, file_name, day_id):
+    """Check (with --skip-structure) whether a structure file is served with the ETag of a registered version
+    (steps of _run_steps).
+
+    The file is only probed when a registered version of it has an ETag and the probes of the feed carry
+    one: without an ETag a probe can not tell the version, so the file is downloaded without a probe.
+
+    Args:
+        link (str): Link to the file.
+        file_name (str): File name in the link.
+        day_id (int): day_id in the link.
+
+    Returns:
+        bool: Is the version known (the file is not downloaded)?
+    """
+    feed = FEED.get()
+    if feed.structure_etags is False or not SCHEMAS.has_etags(file_name):
+        return False
+    _, headers = yield from _probe_steps(link)
+    if headers["ETag"] is None:
+        logging.info("The server sends no ETag with the structure files. Download them without a probe from now on.")
+        feed.structure_etags = False
+        return False
+    feed.structure_etags = True
+    checksum = SCHEMAS.known(file_name, day_id, headers["ETag"])
+    if checksum is None:
+        return False
+    logging.info(
+        f"Skipped file (known version {checksum[:16]} in the schema registry): {link}")
+    return True
+
+
+def _retrieve_steps(link, save_dir, file_name, str_day, day_id=None):
+    """Download a file with a single request (steps of _run_steps). The saved file is named by the Content-Disposition of the response.
+
+    The file is written to '<file_name>.part' with a '<file_name>.part.json' sidecar (offset, ETag and
+    Last-Modified). If the download is broken, the next try continues from the last byte with a Range
+    request. The part file is renamed when it is complete.
+
+    Args:
+        link (str): Link to the file.
+        save_dir (Path): Directory to save the file.
+        file_name (str): File name in the link.
+        str_day (str): String of the query day (for the failed log).
+        day_id (int): day_id in the link.
+
+    Returns:
+        str: Name of the saved file.
+
+    Raises:
+        FileNotFoundError: There is no data for the id.
+    """
+    part_path = save_dir / f"{file_name}.part"
+    info_path = save_dir / f"{file_name}.part.json"
+    remotefile, offset = yield from _request_part_steps(
+        link, part_path, _read_part_info(info_path, link))
+    try:
+        part_info = _start_part(link, remotefile.info(), file_name,
+                                str_day, day_id, info_path, offset)
+        filename = part_info["filename"]
+        digest = hashlib.sha256()
+        try:
+            with PROGRESS.transfer() as reporthook:
+                size = offset + (yield from _save_body_steps(remotefile, part_path, reporthook, offset, digest))
+        except ContentTooShortError:
+            part_info["offset"] = os.path.getsize(part_path)
+            _write_part_info(info_path, part_info)
+            raise
+    finally:
+        yield (_close_response, remotefile)
+    yield (_finish_part, part_path, info_path, save_dir / filename,
+           part_info, size, digest, str_day, day_id)
+    return filename
+
+###################### Blacklist scan section ##########################
+
+
+def _probe_not_downloadable(qid):
+    """Check whether `qid` is not downloadable (the key file has no Content-Disposition or is not found).
+
+    Returns:
+        bool: Is the id not downloadable?
+    """
+    try:
+        status, headers = _probe_headers(
+            LINK_PATTERN % (qid, FILE_NAME[args.keyfile]))
+    except HTTPError as he:
+        if he.code == 404:
+            return True
+        raise
+    content_disposition = headers["Content-Disposition"]
+    if content_disposition is None:
+        return status in (200, 206)
+    _, params = cgi.parse_header(content_disposition)
+    DAY_INDEX.put(qid, _get_str_day_from_filename(params["filename"]))
+    return False
+
+
+def _save_scan_checkpoint(checkpoint_path, checkpoint):
+    tmp_path = f"{checkpoint_path}.tmp"
+    with open(tmp_path, "w") as checkpoint_file:
+        json.dump(checkpoint, checkpoint_file)
+    os.replace(tmp_path, checkpoint_path)
+
+
+def scan_not_downloadable(start, end, checkpoint_path):
+    """Probe every day_id from `start` to `end` concurrently to find the ids that are not downloadable.
+
+    The progress is saved to `checkpoint_path` from time to time, so an interrupted scan of the same
+    range continues from where it stopped.
+
+    Args:
+        start (int): The first day_id to scan.
+        end (int): The last day_id to scan.
+        checkpoint_path (str): Path to the checkpoint file.
+
+    Returns:
+        list: The day_ids that are not downloadable or None if some ids could not be probed.
+    """
+    checkpoint = {"link_pattern": str(LINK_PATTERN),
+                  "start": start, "end": end, "done": "", "blacklist": ""}
+    if os.path.exists(checkpoint_path):
+        with open(checkpoint_path, "r") as checkpoint_file:
+            saved = json.load(checkpoint_file)
+        if (saved["link_pattern"], saved["start"], saved["end"]) == (str(LINK_PATTERN), start, end):
+            checkpoint = saved
+    done = set(_parse_id_ranges(checkpoint["done"]))
+    blacklist = set(_parse_id_ranges(checkpoint["blacklist"]))
+    todo = [qid for qid in range(start, end + 1) if qid not in done]
+    logging.info(
+        f"Scanning {len(todo)} day_id(s) in {start}-{end} ({len(done)} already scanned).")
+
+    last_save = time.monotonic()
+    failed = 0
+    pbar = None
+    if not args.quiet:
+        import progressbar
+        pbar = progressbar.ProgressBar(maxval=end - start + 1)
+        pbar.start()
+    executor = ThreadPoolExecutor(max_workers=max(args.workers, 1))
+    try:
+        # The probes run for the current feed.
+        futures = {executor.submit(contextvars.copy_context().run, _probe_not_downloadable, qid): qid
+                   for qid in todo}
+        for future in as_completed(futures):
+            qid = futures[future]
+            try:
+                not_downloadable = future.result()
+            except (HTTPError, URLError) as e:
+                logging.warning(f"Can not probe day_id {qid}: {e}")
+                failed += 1
+                continue
+            done.add(qid)
+            if not_downloadable:
+                blacklist.add(qid)
+            if pbar:
+                pbar.update(len(done))
+            if time.monotonic() - last_save > SCAN_CHECKPOINT_INTERVAL:
+                checkpoint["done"] = _format_id_ranges(done)
+                checkpoint["blacklist"] = _format_id_ranges(blacklist)
+                _save_scan_checkpoint(checkpoint_path, checkpoint)
+                last_save = time.monotonic()
+    finally:
+        # Stop the probes that have not started when the scan is interrupted.
+        executor.shutdown(cancel_futures=True)
+        checkpoint["done"] = _format_id_ranges(done)
+        checkpoint["blacklist"] = _format_id_ranges(blacklist)
+        _save_scan_checkpoint(checkpoint_path, checkpoint)
+    if pbar:
+        pbar.finish()
+    if failed > 0:
+        logging.error(
+            f"{failed} day_id(s) could not be probed. Run the scan again to continue it.")
+        return None
+    os.remove(checkpoint_path)
+    logging.info(f"BLACK_LIST: {_format_id_ranges(blacklist)}")
+    return sorted(blacklist)
+
+
+def _id_range(text):
+    """Parse a range of day_ids of the --scan-blacklist option like '3000-5000'.
+
+    Returns:
+        tuple: (start, end), both included.
+
+    Raises:
+        argparse.ArgumentTypeError: The range is not START-END or START is after END.
+    """
+    match = re.fullmatch(r'\s*(\d+)\s*-\s*(\d+)\s*', text)
+    if match is None:
+        raise argparse.ArgumentTypeError(f"'{text}' is not a range of day_ids START-END like 3000-5000")
+    start, end = int(match.group(1)), int(match.group(2))
+    if start > end:
+        raise argparse.ArgumentTypeError(f"the start of the range {text} is after its end")
+    return start, end
+
+
+def _scan_blacklist_option():
+    """Handle --scan-blacklist option. Scan a range of day_ids and save the ids that are not downloadable
+    to the NOT_DOWNLOADABLE section of the config file."""
+    if args.scan_blacklist:
+        start, end = args.scan_blacklist
+    else:
+        start, end = 0, args.pivotorder
+    checkpoint_path = os.path.splitext(args.config_path)[0] + ".scan.json"
+    blacklist = scan_not_downloadable(start, end, checkpoint_path)
+    if blacklist is None:
+        return
+    # Keep the ids outside the scanned range.
+    ids = [qid for qid in NOT_DOWNLOADABLE if qid < start or qid > end]
+    _save_not_downloadable(args.config_path, ids + blacklist)
+    logging.info(
+        f"Saved {len(blacklist)} not downloadable day_id(s) in {start}-{end} to {args.config_path}.")
+
+###################### Convert section #################################
+
+
+def _load_pyarrow():
+    """Import pyarrow (only needed by --convert) on first use.
+
+    Returns:
+        bool: Is pyarrow installed?
+    """
+    global pyarrow
+    if pyarrow is None:
+        try:
+            import pyarrow
+            import pyarrow.compute
+            import pyarrow.csv
+            import pyarrow.ipc
+            import pyarrow.parquet
+        except ImportError:
+            pyarrow = None
+            return False
+    return True
+
+
+def _parse_structure(path):
+    """Read the columns of a *_structure.dat file.
+
+    Each line describes a column: its name first, then a description and a data type like 'char(4)',
+    'int' or 'decimal(10,2)'. Lines without a known data type (headers, notes) are skipped.
+
+    Args:
+        path (Path): Path to the structure file.
+
+    Returns:
+        list: (column name, 'int' | 'float' | 'string') of each column.
+    """
+    columns = []
+    with open(path, "r", errors="replace") as structure_file:
+        for line in structure_file:
+            fields = line.split(maxsplit=1)
+            if len(fields) < 2:
+                continue
+            types = STRUCTURE_TYPE_PATTERN.findall(fields[1])
+            if not types:
+                continue
+            columns.append(
+                (fields[0], STRUCTURE_TYPES.get(types[-1].lower(), "string")))
+    return columns
+
+
+def _downloaded_path(metadata, key):
+    """Path to the downloaded file of a FILE_NAME key on a day (found in the manifest).
+
+    Returns:
+        Path: Path to the file or None if it is not downloaded.
+    """
+    entry = MANIFEST.entries.get(LINK_PATTERN % (metadata["id"], FILE_NAME[key]))
+    if entry is None:
+        return None
+    path = args.output / metadata["day"] / entry["filename"]
+    return path if path.exists() else None
+
+
+def _open_csv_sources(path):
+    """Yield the CSV streams of a downloaded file (the CSV members of a zip file or the file itself)."""
+    if path.suffix.lower() != ".zip":
+        with open(path, "rb") as csv_file:
+            yield csv_file
+        return
+    with zipfile.ZipFile(path) as archive:
+        for member in archive.infolist():
+            if not member.is_dir() and member.filename.lower().endswith((".csv", ".txt")):
+                with archive.open(member) as csv_file:
+                    yield csv_file
+
+
+class _PartitionWriter:
+    """Write record batches of a day into one Parquet or Arrow IPC file per contract."""
+
+    def __init__(self, directory, file_format):
+        self.directory = directory
+        self.file_format = file_format
+        self.writers = {}
+        self.rows = 0
+
+    def _writer(self, contract, schema):
+        writer = self.writers.get(contract)
+        if writer is None:
+            name = "null" if contract is None else re.sub(r'[^\w.-]', '_', str(contract).strip())
+            directory = self.directory / f"{CONTRACT_COLUMN.lower()}={name}"
+            os.makedirs(directory, exist_ok=True)
+            if self.file_format == "parquet":
+                writer = pyarrow.parquet.ParquetWriter(
+                    directory / "part-0.parquet", schema)
+            else:
+                writer = pyarrow.ipc.new_file(directory / "part-0.arrow", schema)
+            self.writers[contract] = writer
+        return writer
+
+    def write(self, batch):
+        table = pyarrow.Table.from_batches([batch])
+        self.rows += table.num_rows
+        if CONTRACT_COLUMN not in table.column_names:
+            self._writer(None, table.schema).write_table(table)
+            return
+        contracts = table[CONTRACT_COLUMN]
+        for contract in pyarrow.compute.unique(contracts).to_pylist():
+            if contract is None:
+                mask = pyarrow.compute.is_null(contracts)
+            else:
+                mask = pyarrow.compute.equal(contracts, contract)
+            self._writer(contract, table.schema).write_table(table.filter(mask))
+
+    def close(self):
+        for writer in self.writers.values():
+            writer.close()
+        self.writers.clear()
+
+
+def convert_file(path, columns, out_dir, file_format):
+    """Convert a downloaded CSV (or zip of CSV) file to typed columnar files partitioned by contract.
+
+    The CSV is read block by block, so the whole file is never held in memory. The files are written to
+    `out_dir` with a '.part' suffix and renamed when the conversion is complete.
+
+    Args:
+        path (Path): Path to the downloaded file.
+        columns (list): (column name, type) from _parse_structure or None to infer the types.
+        out_dir (Path): Directory of the day (e.g. '<output>/parquet/WEBPXTICK_DT/date=20230516').
+        file_format (str): 'parquet' or 'arrow'.
+
+    Returns:
+        int: Number of converted rows.
+    """
+    arrow_types = {"int": pyarrow.int64(), "float": pyarrow.float64(),
+                   "string": pyarrow.string()}
+    convert_options = pyarrow.csv.ConvertOptions(
+        column_types={name: arrow_types[kind] for name, kind in columns or []})
+    read_options = pyarrow.csv.ReadOptions(block_size=CONVERT_BLOCK_SIZE)
+    part_dir = out_dir.with_name(out_dir.name + ".part")
+    shutil.rmtree(part_dir, ignore_errors=True)
+    writer = _PartitionWriter(part_dir, file_format)
+    try:
+        for csv_file in _open_csv_sources(path):
+            reader = pyarrow.csv.open_csv(csv_file, read_options=read_options,
+                                          convert_options=convert_options)
+            for batch in reader:
+                writer.write(batch)
+    except BaseException:
+        writer.close()
+        shutil.rmtree(part_dir, ignore_errors=True)
+        raise
+    writer.close()
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.makedirs(part_dir, exist_ok=True)
+    os.replace(part_dir, out_dir)
+    return writer.rows
+
+
+def _convert_day(metadata):
+    """Convert the downloaded files of a day listed in --convert-files (with the columns of the '<key>s'
+    structure file of the day in the schema registry).
+
+    Returns:
+        bool: Are all the files converted successfully?
+    """
+    success = True
+    for key in args.convert_files:
+        path = _downloaded_path(metadata, key)
+        if path is None:
+            logging.debug(f"Nothing to convert for '{key}' in {metadata['day']}.")
+            continue
+        columns = None
+        if key + "s" in FILE_NAME:
+            structure_name = FILE_NAME[key + "s"]
+            columns = SCHEMAS.lookup(structure_name, metadata["id"])
+            structure_path = _downloaded_path(metadata, key + "s")
+            if columns is None and structure_path is not None:
+                # Downloaded before the schema registry.
+                SCHEMAS.add(structure_name, metadata["id"], structure_path)
+                columns = SCHEMAS.lookup(structure_name, metadata["id"])
+        if columns is None:
+            logging.warning(
+                f"No structure file of '{key}' in {metadata['day']}. The column types are inferred.")
+        stem = os.path.splitext(FILE_NAME[key])[0]
+        out_dir = args.output / args.convert / stem / f"date={metadata['day']}"
+        start = time.monotonic()
+        try:
+            rows = convert_file(path, columns, out_dir, args.convert)
+        except (pyarrow.ArrowException, zipfile.BadZipFile, OSError) as e:
+            logging.error(f"Can not convert {path}. {e}")
+            success = False
+            continue
+        logging.info(
+            f"Converted file: {path} -> {out_dir} ({rows} rows in {time.monotonic() - start:.1f} s)")
+    return success
+
+
+def _convert_days(jobs):
+    """Convert the downloaded files of the days in a list of (metadata, file name) jobs (with --convert)."""
+    if args.convert == "off":
+        return
+    days = {metadata["id"]: metadata for metadata, _ in jobs if metadata["id"] > 0}
+    for metadata in days.values():
+        _convert_day(metadata)
+
+###################### Async engine section ############################
+
+
+class AsyncResponse:
+    """A response from AsyncConnectionPool. It is closed with `await response.aclose()` (or `async with`),
+    which gives the connection and the concurrency slots back."""
+
+    MAX_DRAIN = 64 * 1024
+
+    def __init__(self, pool, key, connection, status, reason, headers, method, version, request_info=None):
+        self.pool = pool
+        self.key = key
+        self.request_info = request_info
+        self.bytes_read = 0
+        self.reader, self.writer = connection
+        self.status = self.code = status
+        self.reason = reason
+        self.headers = headers
+        self.will_close = (version == "HTTP/1.0"
+                           or headers.get("Connection", "").lower() == "close")
+        self.chunked = headers.get("Transfer-Encoding", "").lower() == "chunked"
+        self.chunk_left = 0
+        if method == "HEAD" or status in (204, 304) or 100 <= status < 200:
+            self.remaining = 0
+        elif self.chunked:
+            self.remaining = None
+        elif headers.get("Content-Length") is not None:
+            self.remaining = int(headers["Content-Length"])
+        else:
+            # The body ends when the server closes the connection.
+            self.remaining = None
+            self.will_close = True
+        self.done = self.remaining == 0
+        self.closed = False
+
+    def info(self):
+        return self.headers
+
+    async def _read_raw(self, amt):
+        data = await asyncio.wait_for(self.reader.read(amt), self.pool.timeout)
+        self.bytes_read += len(data)
+        if self.pool.rate_limiter is not None:
+            await self.pool.rate_limiter.wait_bytes_async(len(data))
+        if not data and (self.chunked or self.remaining is not None):
+            raise http.client.IncompleteRead(b"")
+        return data
+
+    async def _read_chunk(self, amt):
+        if self.chunk_left == 0:
+            line = await asyncio.wait_for(self.reader.readline(), self.pool.timeout)
+            size = int(line.split(b";")[0], 16)
+            if size == 0:
+                # Skip the trailers.
+                while (await asyncio.wait_for(self.reader.readline(), self.pool.timeout)) not in (b"\r\n", b"\n", b""):
+                    pass
+                self.done = True
+                return b""
+            self.chunk_left = size
+        data = await self._read_raw(min(amt, self.chunk_left))
+        self.chunk_left -= len(data)
+        if self.chunk_left == 0:
+            await asyncio.wait_for(self.reader.readexactly(2), self.pool.timeout)
+        return data
+
+    async def read(self, amt=None):
+        """Read up to `amt` bytes of the body (the whole rest of the body if `amt` is None)."""
+        if amt is None:
+            blocks = []
+            while True:
+                block = await self.read(DOWNLOAD_CHUNK_SIZE)
+                if not block:
+                    return b"".join(blocks)
+                blocks.append(block)
+        if self.done:
+            return b""
+        if self.chunked:
+            return await self._read_chunk(amt)
+        if self.remaining is None:
+            data = await self._read_raw(amt)
+            self.done = not data
+            return data
+        data = await self._read_raw(min(amt, self.remaining))
+        self.remaining -= len(data)
+        self.done = self.remaining == 0
+        return data
+
+    async def aclose(self):
+        if self.closed:
+            return
+        if not self.done and self.remaining is not None and self.remaining <= self.MAX_DRAIN:
+            try:
+                await self.read()
+            except (http.client.HTTPException, OSError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+                pass
+        self.closed = True
+        if self.pool.metrics is not None and self.request_info is not None:
+            self.pool.metrics.record_response(self)
+        if self.done and not self.will_close:
+            self.pool.release(self.key, (self.reader, self.writer))
+        else:
+            self.writer.close()
+        self.pool.release_slots(self.key)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+
+class AsyncConnectionPool:
+    """Keep-alive HTTP(S) connections for the async engine, in one event loop.
+
+    A semaphore limits the requests in flight across the whole run and another one limits them for
+    each host. A request holds its slots until its response is closed.
+    """
+
+    MAX_REDIRECTS = 5
+
+    def __init__(self, pool_size, timeout, total_limit, host_limit, rate_limiter=None, metrics=None):
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.host_limit = host_limit
+        self.rate_limiter = rate_limiter
+        self.metrics = metrics
+        self.ssl_context = ssl.create_default_context()
+        self.total_slots = asyncio.Semaphore(total_limit)
+        self.host_slots = {}
+        self.idle = {}
+
+    def release(self, key, connection):
+        """Give a connection back to the pool (or close it if the pool is full)."""
+        connections = self.idle.setdefault(key, [])
+        if len(connections) < self.pool_size:
+            connections.append(connection)
+        else:
+            connection[1].close()
+
+    def release_slots(self, key):
+        self.host_slots[key].release()
+        self.total_slots.release()
+
+    def close(self):
+        """Close all idle connections."""
+        for connections in self.idle.values():
+            for _, writer in connections:
+                writer.close()
+        self.idle.clear()
+
+    def view(self, metrics):
+        """Get a pool that shares the connections and the limits of this pool but records its requests
+        to other metrics (one view for each feed)."""
+        view = copy.copy(self)
+        view.metrics = metrics
+        return view
+
+    async def _connect(self, key):
+        connections = self.idle.get(key)
+        if connections:
+            return connections.pop(), True
+        scheme, host, port = key
+        try:
+            connection = await asyncio.wait_for(asyncio.open_connection(
+                host, port, ssl=self.ssl_context if scheme == "https" else None), self.timeout)
+        except (OSError, asyncio.TimeoutError) as e:
+            raise URLError(e) from e
+        return connection, False
+
+    async def _send(self, method, link, headers):
+        url = urlsplit(link)
+        port = url.port or (443 if url.scheme == "https" else 80)
+        key = (url.scheme, url.hostname, port)
+        path = url.path + (f"?{url.query}" if url.query else "")
+        host_header = url.hostname if url.port is None else f"{url.hostname}:{url.port}"
+        head = f"{method} {path} HTTP/1.1\r\nHost: {host_header}\r\n"
+        head += "".join(f"{name}: {value}\r\n" for name, value in headers.items())
+        head = (head + "\r\n").encode("latin-1")
+
+        await self.total_slots.acquire()
+        host_slots = self.host_slots.setdefault(
+            key, asyncio.Semaphore(self.host_limit))
+        await host_slots.acquire()
+        # The latency of the metrics does not count the wait for a slot.
+        start = time.monotonic()
+        try:
+            while True:
+                connection, reused = await self._connect(key)
+                reader, writer = connection
+                try:
+                    writer.write(head)
+                    await writer.drain()
+                    response_head = await asyncio.wait_for(
+                        reader.readuntil(b"\r\n\r\n"), self.timeout)
+                except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError) as e:
+                    writer.close()
+                    # The server may have closed an idle keep-alive connection, then try a new one.
+                    if not reused:
+                        raise URLError(e) from e
+                    continue
+                status_line, _, header_lines = response_head.partition(b"\r\n")
+                version, status, *reason = status_line.decode("latin-1").split(" ", 2)
+                response_headers = http.client.parse_headers(
+                    io.BytesIO(header_lines))
+                return AsyncResponse(self, key, connection, int(status), reason[0] if reason else "",
+                                     response_headers, method, version,
+                                     (link, method, _request_phase(method, headers), start, time.monotonic() - start))
+        except BaseException:
+            self.release_slots(key)
+            raise
+
+    async def request(self, link, method="GET", headers=None):
+        """Send a request and return the response. Redirects are followed.
+
+        Raises:
+            HTTPError: The server returned an error status.
+            URLError: The server could not be reached.
+        """
+        headers = {"User-Agent": USER_AGENT,
+                   "Accept-Encoding": "identity", **(headers or {})}
+        for _ in range(self.MAX_REDIRECTS + 1):
+            if self.rate_limiter is not None:
+                await self.rate_limiter.wait_async()
+            try:
+                response = await self._send(method, link, headers)
+            except URLError as e:
+                if self.metrics is not None:
+                    self.metrics.record_error(link, method, _request_phase(method, headers), e)
+                raise
+            if response.status in (301, 302, 303, 307, 308) and response.info()["Location"]:
+                await response.aclose()
+                link = urljoin(link, response.info()["Location"])
+                continue
+            if self.rate_limiter is not None:
+                _report_push_back(self.rate_limiter, response)
+            if response.status >= 400:
+                await response.aclose()
+                raise HTTPError(link, response.status,
+                                response.reason, response.info(), None)
+            return response
+        raise URLError(f"Too many redirects: {link}")
+
+
+async def _request_headers_async(link, method="GET", headers=None):
+    """Same as _request_headers but with the async engine."""
+    async with await ASYNC_POOL.request(link, method=method, headers=headers) as response:
+        return response.status, response.info()
+
+
+async def _open_response_async(link, headers=None):
+    """Same as _open_response but with the async engine."""
+    return await ASYNC_POOL.request(link, headers=headers)
+
+
+async def _close_response_async(response):
+    await response.aclose()
+
+
+async def _read_block_async(response):
+    return await response.read(DOWNLOAD_CHUNK_SIZE)
+
+
+async def _finish_part_async(*finish_args):
+    # Checking and extracting a zip file blocks, so it runs in a thread.
+    await asyncio.to_thread(_finish_part, *finish_args)
+
+
+# The async version of each function yielded by the steps of _run_steps.
+ASYNC_OPERATIONS = {
+    _request_headers: _request_headers_async,
+    _open_response: _open_response_async,
+    _close_response: _close_response_async,
+    _read_block: _read_block_async,
+    _finish_part: _finish_part_async,
+    time.sleep: asyncio.sleep,
+}
+
+
+async def _run_steps_async(steps):
+    """Same as _run_steps but with the async engine: the async version of each yielded function is awaited."""
+    try:
+        operation = next(steps)
+        while True:
+            try:
+                result = await ASYNC_OPERATIONS[operation[0]](*operation[1:])
+            except BaseException as e:
+                operation = steps.throw(e)
+            else:
+                operation = steps.send(result)
+    except StopIteration as stop:
+        return stop.value
+
+
+async def _download_job_async(metadata, filename):
+    """Same as download_jobs for one file but with the async engine. The backoff only suspends the task
+    of this file, so the other files keep downloading.
+
+    Returns:
+        bool: Is the file downloaded successfully?
+    """
+    start = time.monotonic()
+    retry = 0
+    PROGRESS.add()
+    while True:
+        # Each task has its own context, so the try is only seen by the requests of this file.
+        ATTEMPT.set(retry)
+        error = await _run_steps_async(_try_file_steps(filename, True, metadata))
+        if error is None or not _is_transient(error) or retry >= args.max_retry:
+            break
+        retry += 1
+        delay = _backoff_delay(retry, error)
+        logging.warning(
+            f"Retry to download file '{filename}' in {metadata['day']} in {delay:.1f} s (retry {retry}). {error}")
+        await asyncio.sleep(delay)
+    link = LINK_PATTERN % (metadata["id"], filename)
+    if error is not None:
+        _log_download_error(error, link, metadata["day"], filename)
+    METRICS.record_file(link, metadata["day"], time.monotonic() - start,
+                        retry, error is None)
+    PROGRESS.finish(error is None)
+    return error is None
+
+
+async def resolve_range_async(start_day, end_day):
+    """Same as resolve_range but with the async engine (the start and end days are searched at the same time)."""
+    resolved = await _run_steps_async(_resolve_steps(start_day, end_day, *await asyncio.gather(
+        _run_steps_async(_find_day_id_steps(start_day)), _run_steps_async(_find_day_id_steps(end_day)))))
+    if resolved is None:
+        return []
+    return await asyncio.to_thread(_resolved_range, start_day, end_day, *resolved)
+
+
+async def _range_jobs_async(start, end):
+    """List the jobs of a range download from START to END (YYYYMMDD)."""
+    start_day = datetime.strptime(start, "%Y%m%d")
+    end_day = datetime.strptime(end, "%Y%m%d")
+    return _range_jobs(await resolve_range_async(start_day, end_day))
+
+
+async def _run_async(yesterday):
+    """Resolve and download everything asked by --update, --day, --start/--end and --past for the current feed
+    in the event loop of _run_feeds_async.
+
+    Args:
+        yesterday (str): String format of yesterday.
+
+    Returns:
+        int: Number of failed downloads.
+    """
+    # --retry first, like the thread engine.
+    await asyncio.to_thread(_run_feed, yesterday)
+    planners = []
+    if args.update:
+        planners.append(_run_steps_async(_day_job_steps(yesterday)))
+    if '--day' in sys.argv or args.config is not None and args.day != "off":
+        if args.day.lower() == "yesterday":
+            args.day = yesterday
+        planners.append(_run_steps_async(_day_job_steps(args.day)))
+    if ('--start' in sys.argv or '--end' in sys.argv or '-s' in sys.argv or '-e' in sys.argv or args.config is not None) \
+            and args.start.lower() != "off" and args.end.lower() != "off":
+        start = yesterday if args.start.lower() == "yesterday" else args.start
+        end = yesterday if args.end.lower() == "yesterday" else args.end
+        planners.append(_range_jobs_async(start, end))
+    if args.past and args.past > 0:
+        start = (datetime.today() - timedelta(days=args.past + 1)).strftime("%Y%m%d")
+        planners.append(_range_jobs_async(start, yesterday))
+    jobs = [job for planned in await asyncio.gather(*planners) for job in planned]
+    logging.debug(f"Downloading {len(jobs)} file(s) with the async engine.")
+    statuses = await asyncio.gather(*(_download_job_async(metadata, filename)
+                                      for metadata, filename in jobs))
+    number_of_fail = statuses.count(False)
+    logging.info(
+        f"Batch download completed. {number_of_fail} fail ({len(statuses)} total).")
+    await asyncio.to_thread(_convert_days, jobs)
+    return number_of_fail
+
+
+async def _run_feeds_async(feeds, yesterday):
+    """Run _run_async for each feed in one event loop with one shared AsyncConnectionPool.
+
+    Args:
+        feeds (list): The feeds with the async engine.
+        yesterday (str): String format of yesterday.
+    """
+    settings = [feed.args for feed in feeds]
+    async_pool = AsyncConnectionPool(max(s.pool_size for s in settings), max(s.timeout for s in settings),
+                                     sum(max(s.workers, 1) for s in settings),
+                                     sum(s.host_workers or max(s.workers, 1) for s in settings),
+                                     feeds[0].rate_limiter)
+    try:
+        tasks = []
+        for feed in feeds:
+            feed.async_pool = async_pool.view(feed.metrics)
+            # A task runs in a copy of the context it is created in, so it runs for its feed.
+            tasks.append(feed.run(asyncio.ensure_future, _run_async(yesterday)))
+        await asyncio.gather(*tasks)
+    finally:
+        async_pool.close()
+
+###################### Main function ###################################
+
+
+def _log_download_error(error, link, str_day, file_name):
+    """Log a failed download to the log and the failed log.
+
+    Args:
+        error (Exception): The error raised by the download.
+        link (str): Link to the file.
+        str_day (str): String of the query day.
+        file_name (str): File name in the link.
+    """
+    failed_log = logging.getLogger("failed")
+    if isinstance(error, HTTPError):
+        logging.error(
+            f'HTTP response code: {error.code}, Errno: {error.errno}, {error.reason}')
+        failed_log.error(
+            f"{link}\t{str_day}\tHTTPError\tcode={error.code}\terrno={error.errno}")
+    elif isinstance(error, FileNotFoundError):
+        logging.error(error)
+        logging.info(f"File '{file_name}' not found.")
+        failed_log.error(f"{link}\t{str_day}\tFileNotFoundError")
+    elif isinstance(error, ContentTooShortError):
+        logging.error(f"{error.strerror}, {error.reason}")
+        failed_log.error(f"{link}\t{str_day}\tContentTooShortError")
+    elif isinstance(error, zipfile.BadZipFile):
+        logging.error(f"Corrupt zip file '{file_name}'. {error}")
+        failed_log.error(f"{link}\t{str_day}\tBadZipFile")
+    else:
+        logging.error(f'URLError. Errno: {error.errno}, {error.reason}')
+        failed_log.error(f"{link}\t{str_day}\tURLError")
+
+
+def _try_file(file_name, create_folder, metadata):
+    """Try once to download a file (see get_file) with blocking requests. Nothing is written to the failed log.
+
+    Returns:
+        Exception: The error of the download or None if the file is downloaded (or skipped).
+    """
+    return _run_steps(_try_file_steps(file_name, create_folder, metadata))
+
+
+def _try_file_steps(file_name, create_folder, metadata, moved=False):
+    """Try once to download a file (steps of _run_steps, see _try_file).
+
+    If the name of the file tells another day than metadata["day"], the day of the metadata (shared by the
+    files of the day) is corrected and the file is downloaded again into the folder of that day.
+
+    Returns:
+        Exception: The error of the download or None if the file is downloaded (or skipped).
+    """
+    day_id = metadata["id"]
+    str_day = metadata["day"]
+    if day_id <= 0:
+        return None
+    link = LINK_PATTERN % (day_id, file_name)
+    save_dir = args.output / \
+        f"{str_day}" if create_folder else Path(args.output).resolve()
+    if args.sync:
+        filename = MANIFEST.verified(link, save_dir)
+        if filename is not None:
+            logging.info(
+                f"Skipped file (already downloaded): {save_dir / filename}")
+            return None
+    try:
+        if args.skip_structure and file_name in _structure_file_names() \
+                and (yield from _known_structure_steps(link, file_name, day_id)):
+            return None
+        os.makedirs(save_dir, exist_ok=True)
+        filename = yield from _retrieve_steps(
+            link, save_dir, file_name, str_day, day_id)
+    except _DayMismatch as e:
+        if moved:
+            return e
+        logging.warning(f"{e.reason} Save the files of the day_id {day_id} in {e.str_day}.")
+        metadata["day"] = e.str_day
+        with contextlib.suppress(OSError):
+            # Only removed if nothing else was saved there.
+            os.rmdir(save_dir)
+        return (yield from _try_file_steps(file_name, create_folder, metadata, moved=True))
+    except (HTTPError, FileNotFoundError, ContentTooShortError, URLError, zipfile.BadZipFile) as e:
+        return e
+    logging.info(f"Downloaded file: {save_dir / filename}")
+    return None
+
+
+def get_file(file_name=None, create_folder=True, metadata=None):
+    """Download the `file_name` you want from the SGX site on the day in metadata.
+
+    `file_name` can be in "WEBPXTICK_DT.zip", "TickData_structure.dat", "TC.txt", "TC_structure.dat" (it base on which LINK_PATTERN you use).
+
+    Args:
+        file_name (str): The file name in the link that you want to download.
+        create_folder (bool): Make a new directory for the day.
+        metadata (dict): Dictionary includes data for the day (id and YYYYMMDD format).
+
+    Returns:
+        bool: The state that the file is download successful or not.
+    """
+    error = _try_file(file_name, create_folder, metadata)
+    if error is not None:
+        _log_download_error(error, LINK_PATTERN % (metadata["id"], file_name),
+                            metadata["day"], file_name)
+    return error is None
+
+
+def _is_transient(error):
+    """Check whether a failed download may succeed later.
+
+    Rate limiting and server errors (TRANSIENT_HTTP_CODES), connection errors, broken bodies and corrupt
+    zip files are transient. No data for the id (no Content-Disposition) and the other HTTP errors are not.
+    """
+    if isinstance(error, HTTPError):
+        return error.code in TRANSIENT_HTTP_CODES
+    if isinstance(error, FileNotFoundError):
+        return False
+    return isinstance(error, (URLError, zipfile.BadZipFile))
+
+
+def _backoff_delay(retry, error=None):
+    """Delay in seconds before the `retry`-th retry of a file: exponential from args.backoff up to
+    args.max_backoff, with jitter (50 to 100% of it) so that failed files do not come back together.
+    The Retry-After of a 429 or 503 error is honored when it is longer."""
+    delay = min(args.max_backoff, args.backoff * 2 ** (retry - 1))
+    return max(delay * random.uniform(0.5, 1.0), _retry_after(error) or 0)
+
+
+def _try_job(metadata, filename, retry):
+    """Run _try_file in a worker with the try number for the metrics.
+
+    Returns:
+        tuple: Start time of the try and the error of _try_file.
+    """
+    token = ATTEMPT.set(retry)
+    try:
+        return time.monotonic(), _try_file(filename, True, metadata)
+    finally:
+        ATTEMPT.reset(token)
+
+
+def _download_results(jobs):
+    """Download (metadata, file name) jobs with args.workers workers (of the executor of the feed) and yield
+    each file when it is done for good.
+
+    A file that fails with a transient error (see _is_transient) goes to a deferred queue and is tried
+    again after _backoff_delay (up to max_retry times) while the other files keep downloading. Permanent
+    errors and the last error of a file are written to the failed log.
+
+    The jobs are taken from `jobs` only when a worker is about to be free, so it can be a generator
+    over a large file.
+
+    Args:
+        jobs (iterable): (metadata, file name) of each file.
+
+    Yields:
+        tuple: (index of the job, metadata, file name, error or None) in the order the files are done.
+    """
+    # The files of a list are all counted in the progress at once, so its ETA covers the whole list.
+    counted = isinstance(jobs, (list, tuple))
+    if counted:
+        PROGRESS.add(len(jobs))
+    jobs = iter(jobs)
+    number_of_jobs = 0
+    # Jobs that are not done yet: index -> (metadata, file name, start time of the first try).
+    pending = {}
+    # Heap of (time to try again, job index, retry).
+    deferred = []
+    window = max(args.workers, 1) * 2
+    shared_executor = FEED.get().executor
+    executor = shared_executor or FairExecutor(args.workers)
+    try:
+        running = {}
+        more_jobs = True
+        while True:
+            while more_jobs and len(running) < window:
+                job = next(jobs, None)
+                if job is None:
+                    more_jobs = False
+                    break
+                index = number_of_jobs
+                number_of_jobs += 1
+                if not counted:
+                    PROGRESS.add()
+                pending[index] = (*job, None)
+                running[executor.submit(_try_job, *job, 0)] = (index, 0)
+            now = time.monotonic()
+            while deferred and deferred[0][0] <= now:
+                _, index, retry = heapq.heappop(deferred)
+                metadata, filename, _ = pending[index]
+                running[executor.submit(_try_job, metadata, filename, retry)] = (index, retry)
+            if not running and not deferred:
+                break
+            timeout = deferred[0][0] - now if deferred else None
+            if not running:
+                time.sleep(timeout)
+                continue
+            done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, retry = running.pop(future)
+                metadata, filename, first_start = pending[index]
+                start_time, error = future.result()
+                if first_start is None:
+                    first_start = start_time
+                    pending[index] = (metadata, filename, first_start)
+                if error is not None and _is_transient(error) and retry < args.max_retry:
+                    delay = _backoff_delay(retry + 1, error)
+                    logging.warning(
+                        f"Retry to download file '{filename}' in {metadata['day']} in {delay:.1f} s (retry {retry + 1}). {error}")
+                    heapq.heappush(
+                        deferred, (time.monotonic() + delay, index, retry + 1))
+                    continue
+                del pending[index]
+                link = LINK_PATTERN % (metadata["id"], filename)
+                if error is not None:
+                    _log_download_error(error, link, metadata["day"], filename)
+                METRICS.record_file(link, metadata["day"], time.monotonic() - first_start,
+                                    retry, error is None)
+                PROGRESS.finish(error is None)
+                yield index, metadata, filename, error
+    finally:
+        if executor is not shared_executor:
+            executor.close()
+
+
+def download_jobs(jobs, on_done=None):
+    """Download (metadata, file name) jobs and wait for all of them (see _download_results).
+
+    Args:
+        jobs (iterable): (metadata, file name) of each file.
+        on_done (callable): Called with (metadata, file name, success) when a file is done for good
+            (in the calling thread).
+
+    Returns:
+        list: Is each file downloaded successfully? (in the order of the jobs)
+    """
+    statuses = {}
+    for index, metadata, filename, error in _download_results(jobs):
+        statuses[index] = error is None
+        if on_done is not None:
+            on_done(metadata, filename, error is None)
+    return [statuses[index] for index in range(len(statuses))]
+
+
+def _range_jobs(days):
+    """List the (metadata, file name) jobs of a range download.
+
+    Args:
+        days (list): (day_id, day string) of each day of the range (see resolve_range).
+
+    Returns:
+        list: (metadata, file name) of each file to download.
+    """
+    jobs = []
+    for day_id, str_day in days:
+        metadata = {"id": day_id, "day": str_day}
+        for key in args.file:
+            jobs.append((metadata, FILE_NAME[key]))
+    return jobs
+
+
+def _day_jobs(day):
+    """List the jobs that download the files of a day (YYYYMMDD), nothing if the day has no data."""
+    return _run_steps(_day_job_steps(day))
+
+
+def _day_job_steps(day):
+    """Steps of _run_steps that list the jobs of a day (see _day_jobs)."""
+    str_day, day_id = yield from _find_day_id_steps(datetime.strptime(day, "%Y%m%d"))
+    if str_day == '':
+        logging.error(f"Not found the data of {day}")
+        return []
+    metadata = {"id": day_id, "day": str_day}
+    return [(metadata, FILE_NAME[file]) for file in args.file]
+
+
+def download_range():
+    """Download all data from start day to end day specify in config.
+
+    Returns:
+        int: Number of files that failed to download.
+    """
+    start_day = datetime.strptime(args.start, "%Y%m%d")
+    end_day = datetime.strptime(args.end, "%Y%m%d")
+
+    jobs = _range_jobs(resolve_range(start_day, end_day))
+
+    logging.debug(
+        f"Downloading {len(jobs)} file(s) with {max(args.workers, 1)} worker(s).")
+    statuses = download_jobs(jobs)
+    number_of_fail = statuses.count(False)
+    total_download = len(statuses)
+    logging.info(
+        f"Batch download completed. {number_of_fail} fail ({total_download} total).")
+    _convert_days(jobs)
+    return number_of_fail
+
+
+def _report_metrics():
+    """Log the summary of the metrics of the current feed."""
+    for line in METRICS.summary():
+        logging.info(f"Metrics: {line}")
+
+
+def _write_metrics_file(write, metrics, path, number_of_feeds):
+    """Write metrics with `write` (Metrics.write_jsonl or Metrics.write_prometheus). Helper function for _write_metrics."""
+    try:
+        write(metrics, path)
+        logging.debug(f"Saved the metrics of {number_of_feeds} feed(s) to {path}.")
+    except OSError as e:
+        logging.error(f"Can not write the metrics to {path}. {e}")
+
+
+def _write_metrics(feeds):
+    """Write the metrics files (--metrics and --prometheus) of the finished feeds.
+
+    The feeds that have the same file (e.g. several config files with --metrics on the command line)
+    write it once with their merged records instead of overwriting each other.
+
+    Args:
+        feeds (list): The started feeds.
+    """
+    for option, write in (("metrics", Metrics.write_jsonl), ("prometheus", Metrics.write_prometheus)):
+        groups = {}
+        for feed in feeds:
+            path = getattr(feed.args, option)
+            if path:
+                groups.setdefault(os.path.abspath(path), []).append(feed)
+        for path, group in groups.items():
+            metrics = Metrics.merged([feed.metrics for feed in group])
+            group[0].run(_write_metrics_file, write, metrics, path, len(group))
+
+
+def _start_feed(init_logging=True):
+    """Prepare the output directory, the logs, the day index and the state of the current feed.
+
+    Args:
+        init_logging (bool): Add the log file and console handlers of the feed (see _init_logger). The
+            failed log is always written.
+    """
+    feed = FEED.get()
+    feed.metrics = Metrics()
+    if not os.path.exists(args.output):
+        os.mkdir(args.output)
+
+    args.output = Path(args.output).resolve()
+    feed.manifest = Manifest(args.output / MANIFEST_NAME)
+    feed.schemas = SchemaRegistry(args.output / SCHEMA_DIR_NAME)
+    feed.blob_store = BlobStore(args.output / BLOB_DIR_NAME, args.dedup)
+    if not os.path.exists(args.error):
+        with open(args.error, "w+") as error_file:
+            error_file.write(
+                "Each line contain the info of the file that failed to download with format (delimiter=tab): Link, QueryDay, ErrorType, AdditionalInfo(optional).\n")
+
+    _init_failed_log()
+    if init_logging:
+        _init_logger()
+    logging.info(
+        "-------------------------------------------------------------------------")
+    logging.info(f"Starting downloading job {sys.argv} for {feed}.")
+    if args.convert != "off" and not _load_pyarrow():
+        logging.error(
+            "--convert requires pyarrow (pip install pyarrow). The downloaded files will not be converted.")
+        args.convert = "off"
+    feed.day_index = DayIndex(args.index, feed.link_pattern,
+                              unique_days=re.search(r'%[Yy]', args.dayformat) is not None)
+    feed.calendar = TradingCalendar(datetime.strptime(args.pivotdate, "%Y%m%d"), args.pivotorder, args.holidays,
+                                    no_data=[*NOT_DOWNLOADABLE, *(qid for qid in DAY_INDEX.missing if qid < DAY_INDEX.max_id)])
+    CALENDAR.learn_index(DAY_INDEX)
+
+
+def _run_feed(yesterday):
+    """Run the jobs of the current feed with the thread engine (and --scan-blacklist, --retry with any engine).
+
+    Args:
+        yesterday (str): String format of yesterday.
+    """
+    # For --scan-blacklist option (no download)
+    if args.scan_blacklist is not None:
+        _scan_blacklist_option()
+        return
+    # For --dedup-report option (no download)
+    if args.dedup_report:
+        for line in BLOB_STORE.report(MANIFEST):
+            logging.info(f"Dedup report: {line}")
+        return
+    # For --retry option
+    if "--retry" in sys.argv or "-r" in sys.argv:
+        _retry_option()
+    if args.engine == "async":
+        return
+    # For --update option
+    if args.update:
+        _update_option(yesterday)
+    # For --day option
+    if '--day' in sys.argv or args.config is not None and args.day != "off":
+        _day_option(yesterday)
+    # For --start --end option
+    if '--start' in sys.argv or '--end' in sys.argv or '-s' in sys.argv or '-e' in sys.argv or args.config is not None:
+        _range_option(yesterday)
+    # For --past option
+    if args.past and args.past > 0:
+        _past_option(yesterday)
+
+
+def _finish_feed():
+    """Save the day index and log the metrics of the current feed."""
+    DAY_INDEX.save()
+    _report_metrics()
+    if BLOB_STORE.deduplicated:
+        logging.info(
+            f"Dedup: {BLOB_STORE.deduplicated} file(s) linked to a stored blob, saved {BLOB_STORE.saved / 1e6:.2f} MB.")
+    logging.info(f"End of download job for {FEED.get()}.")
+
+
+def _open_pools(feeds):
+    """Create the workers (the sum of the workers of the feeds), the keep-alive connections and the rate
+    limiter (the lowest max_rps) shared by the feeds. The feeds must be started (see _start_feed)."""
+    settings = [feed.args for feed in feeds]
+    rate_limiter = RateLimiter(min((s.max_rps for s in settings if s.max_rps > 0), default=0),
+                               min((s.max_bps for s in settings if s.max_bps > 0), default=0),
+                               [window for s in settings for window in s.schedule])
+    http_pool = ConnectionPool(max(s.pool_size for s in settings), max(s.timeout for s in settings),
+                               rate_limiter)
+    executor = FairExecutor(sum(max(s.workers, 1) for s in settings))
+    progress = Progress(min(s.progress_interval for s in settings),
+                        enabled=not all(s.quiet for s in settings))
+    for feed in feeds:
+        feed.rate_limiter, feed.executor = rate_limiter, executor
+        feed.http_pool = http_pool.view(feed.metrics)
+        feed.progress = progress
+
+
+def _close_pools(feeds):
+    """Close the pools opened by _open_pools (if they are open)."""
+    if feeds[0].executor is None:
+        return
+    feeds[0].executor.close()
+    feeds[0].http_pool.close()
+    feeds[0].progress.close()
+
+
+def run(feeds):
+    """Run the jobs of the feeds (one for each config) in one process.
+
+    The feeds run at the same time: the workers (the sum of the workers of the feeds), the
+    keep-alive connections and the request rate (the lowest max_rps) are shared, and the workers
+    take the files of the feeds in turn (see FairExecutor), so the run takes about as long as the
+    slowest feed. The feeds with the async engine share one event loop.
+
+    Args:
+        feeds (list): The feeds to run.
+    """
+    yesterday = (datetime.utcnow() - timedelta(days=1)).strftime("%Y%m%d")
+    started = []
+    try:
+        for feed in feeds:
+            feed.run(_start_feed)
+            started.append(feed)
+        _open_pools(feeds)
+        async_feeds = [feed for feed in feeds if feed.args.engine == "async"
+                       and feed.args.scan_blacklist is None and not feed.args.dedup_report]
+        drivers = [(feed.run, _run_feed, yesterday) for feed in feeds if feed not in async_feeds]
+        if async_feeds:
+            # --update, --day, --start --end and --past options of all the async feeds in one event loop
+            drivers.append((asyncio.run, _run_feeds_async(async_feeds, yesterday)))
+        if len(drivers) == 1:
+            function, *function_args = drivers[0]
+            function(*function_args)
+        else:
+            with ThreadPoolExecutor(max_workers=len(drivers)) as driver_pool:
+                futures = [driver_pool.submit(*driver) for driver in drivers]
+            for future in futures:
+                future.result()
+    finally:
+        _close_pools(feeds)
+        for feed in started:
+            feed.run(_finish_feed)
+        _write_metrics(started)
+
+
+def _build_parser(default_config, argv=None):
+    """Build the parser of the command line options. The defaults of the options are the settings in `default_config`.
+
+    Args:
+        default_config (ConfigParser): The default config.
+        argv (list): The command line to parse (default is sys.argv), some options are required by others.
+
+    Returns:
+        ArgumentParser: The parser.
+    """
+    parser = argparse.ArgumentParser(
+        description="SGX derivatives data downloader")
+    parser.add_argument(
+        '-c',
+        "--config",
+        type=str,
+        help="Specify the path to the config file. With several config files, their jobs run at the same time in one process and share the workers, the connections and the request rate.",
+        nargs='+',
+        default=None
+    )
+    parser.add_argument(
+        '-o',
+        "--output",
+        type=str,
+        help="Specify the directory to save data.",
+        default=default_config.get("BASE", "output")
+    )
+    parser.add_argument(
+        '-f',
+        "--file",
+        type=str,
+        help="List of files you want to download. It can be a set of the files listed in the FILE_NAME section in the config file. Example '--file td tds tc' for download Tick Data, Tick Data structure, and Trade Cancellation and not download Trade Cancellation structure (tcs).",
+        nargs='+',
+        default=default_config.get("BASE", "downloadfiles").split(',')
+    )
+    parser.add_argument(
+        '-l',
+        "--logfile",
+        type=str,
+        help="Log file path, default is sgx-downloader.log.",
+        default=default_config.get("BASE", "logfile")
+    )
+    parser.add_argument(
+        '-E',
+        "--error",
+        type=str,
+        help="Path to the file that stores the list of failed downloads.",
+        default=default_config.get("BASE", "errorfile")
+    )
+    parser.add_argument(
+        '-L',
+        "--loglevel",
+        type=str,
+        help="Log level for logging file.",
+        default=default_config.get("BASE", "loglevel")
+    )
+    parser.add_argument(
+        '-n',
+        "--past",
+        type=int,
+        help="Download data from the past N days (not N-latest records). --past 7 only return data maximum of 5 days",
+    )
+    parser.add_argument(
+        '-m',
+        "--max_retry",
+        type=int,
+        help="The maximum number of times try to redownload a file when it fails (max_retry >= 0). Set max_retry=0 for no automatic re-download.",
+        default=default_config.get("BASE", "max_retry")
+    )
+    parser.add_argument(
+        "--backoff",
+        type=float,
+        help="Delay in seconds before the first retry of a file that failed with a transient error (rate limiting, server or connection error). The delay doubles with each retry.",
+        default=default_config.getfloat("BASE", "backoff", fallback=1)
+    )
+    parser.add_argument(
+        "--max-backoff",
+        type=float,
+        help="The maximum delay in seconds between two tries of a file.",
+        default=default_config.getfloat("BASE", "max_backoff", fallback=60)
+    )
+    parser.add_argument(
+        '-w',
+        "--workers",
+        type=int,
+        help="Number of files downloaded concurrently in a range download job (workers=1 for sequential download).",
+        default=default_config.getint("BASE", "workers", fallback=1)
+    )
+    parser.add_argument(
+        "--max-rps",
+        type=float,
+        help="The maximum number of requests per second sent to SGX by all workers (0 for no limit).",
+        default=default_config.getfloat("BASE", "max_rps", fallback=0)
+    )
+    parser.add_argument(
+        "--max-bps",
+        type=float,
+        help="The maximum number of bytes per second received from SGX by all workers (0 for no limit).",
+        default=default_config.getfloat("BASE", "max_bps", fallback=0)
+    )
+    parser.add_argument(
+        "--schedule",
+        type=_schedule_window,
+        metavar="HHMM-HHMM=RPS[,BPS]",
+        help="Use other --max-rps and --max-bps limits during some hours of the day (local time, 0 for no limit), e.g. '0830-1700=2,500000'. Same as the SCHEDULE section of the config.",
+        nargs='+',
+        default=[_parse_window(window, limits) for window, limits in default_config.items("SCHEDULE")]
+        if default_config.has_section("SCHEDULE") else []
+    )
+    parser.add_argument(
+        "--engine",
+        type=str,
+        choices=["thread", "async"],
+        help="Download engine. 'thread' uses blocking requests (in a thread pool when workers > 1), 'async' resolves and downloads everything in one asyncio event loop with up to WORKERS requests in flight.",
+        default=default_config.get("BASE", "engine", fallback="thread")
+    )
+    parser.add_argument(
+        "--host-workers",
+        type=int,
+        help="The maximum number of requests in flight to one host with the async engine (0 for the same as workers).",
+        default=default_config.getint("BASE", "host_workers", fallback=0)
+    )
+    parser.add_argument(
+        "--metrics",
+        type=str,
+        help="Save the metrics of every request and file (phase, status, latency, bytes, retries) to a JSON lines file.",
+        default=default_config.get("BASE", "metricsfile", fallback="")
+    )
+    parser.add_argument(
+        "--prometheus",
+        type=str,
+        help="Save the totals of the run to a file in the Prometheus text format (for the textfile collector of the node exporter).",
+        default=default_config.get("BASE", "prometheusfile", fallback="")
+    )
+    parser.add_argument(
+        "--pool-size",
+        type=int,
+        help="The maximum number of idle keep-alive connections kept for each host.",
+        default=default_config.getint("BASE", "pool_size", fallback=8)
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        help="Timeout in seconds of connecting to and reading from SGX.",
+        default=default_config.getfloat("BASE", "timeout", fallback=60)
+    )
+    parser.add_argument(
+        '-r',
+        "--retry",
+        type=str,
+        help="Redownload files listed in ERROR. This option requires a path to the ERROR file or it will take the ERROR file of the config. A path can not be given with several config files.",
+        const="",
+        default=default_config.get("BASE", "errorfile"),
+        nargs='?'
+    )
+    parser.add_argument(
+        "--scan-blacklist",
+        type=_id_range,
+        metavar="START-END",
+        help="Scan day_ids from START to END (default is 0 to pivotorder) for the ids that are not downloadable and save them to the NOT_DOWNLOADABLE section of the config file. No file is downloaded.",
+        const=(),
+        nargs='?'
+    )
+    parser.add_argument(
+        '-q',
+        "--quiet",
+        action='store_true',
+        help="Turn off the verbose mode (less annoying text, the lower level will be only saved into the log file) and the progress of the downloads."
+    )
+    parser.add_argument(
+        "--progress-interval",
+        type=float,
+        help="Seconds between two JSON status lines of the downloads (files, bytes, MB/s, ETA) written to stderr when it is not a terminal. On a terminal the status line is redrawn in place.",
+        default=default_config.getfloat("BASE", "progressinterval", fallback=10)
+    )
+    parser.add_argument(
+        "--sync",
+        action="store_true",
+        help="Skip the files that are already downloaded and complete (checked with the manifest in the output directory) without sending any request.",
+        default=default_config.getboolean("BASE", "sync", fallback=False)
+    )
+    parser.add_argument(
+        "--infer-range",
+        action=argparse.BooleanOptionalAction,
+        help="Infer the days of a range download from the business days where the number of day_ids matches (the default, see inferrange in the config). The day in the name of each downloaded file is checked and a file of another day is saved in the folder of its day. With --no-infer-range the day of every day_id is read from SGX (one probe per day_id).",
+        default=None
+    )
+    parser.add_argument(
+        "--verify",
+        action="store_true",
+        help="Check the CRC-32 of every member of a downloaded zip file. A corrupt zip file is removed and saved to the ERROR file as BadZipFile.",
+        default=default_config.getboolean("BASE", "verify", fallback=False)
+    )
+    parser.add_argument(
+        "--extract",
+        action="store_true",
+        help="Extract the CSV members of a downloaded zip file into its day folder (the zip file is also checked as with --verify).",
+        default=default_config.getboolean("BASE", "extract", fallback=False)
+    )
+    parser.add_argument(
+        "--convert",
+        type=str,
+        choices=["off", "parquet", "arrow"],
+        help="Convert the downloaded CSV files of each day to Parquet or Arrow IPC files in OUTPUT/<format>/<file>/date=<day>/comm=<contract>/ with the types in their structure files (requires pyarrow).",
+        default=default_config.get("BASE", "convert", fallback="off")
+    )
+    parser.add_argument(
+        "--convert-files",
+        type=str,
+        help="Files to convert with --convert (keys of the FILE_NAME section, the structure file of a key is '<key>s').",
+        nargs='+',
+        default=default_config.get("BASE", "convertfiles", fallback="td").split(',')
+    )
+    parser.add_argument(
+        "--skip-structure",
+        action="store_true",
+        help="Only probe the headers of a structure file and do not download it when its ETag is the ETag of a version in the schema registry (OUTPUT/schemas).",
+        default=default_config.getboolean("BASE", "skipstructure", fallback=False)
+    )
+    parser.add_argument(
+        "--dedup",
+        type=str,
+        choices=["off", "hardlink", "reflink"],
+        help="Store each distinct downloaded file once in OUTPUT/blobs (by its SHA-256 checksum) and put a hard link or a reflink (copy on write, Btrfs and XFS) to it in the day folders.",
+        default=default_config.get("BASE", "dedup", fallback="off")
+    )
+    parser.add_argument(
+        "--dedup-report",
+        action="store_true",
+        help="Log the space used by the downloaded files in OUTPUT and the space saved by --dedup. No file is downloaded."
+    )
+    parser.add_argument(
+        '-u',
+        "--update",
+        action="store_true",
+        help="Download the latest data (data from yesterday).",
+    )
+    parser.add_argument(
+        "--day",
+        type=str,
+        help="Download data for a specific day.",
+        default=default_config.get("DAYS", "day"),
+        const="yesterday",
+        nargs='?'
+    )
+    parser.add_argument(
+        '-s',
+        "--start",
+        type=str,
+        help="Start date of a range download job.",
+        default=default_config.get("DAYS", "start"),
+        required='--end' in (sys.argv if argv is None else argv)
+    )
+    parser.add_argument(
+        '-e',
+        "--end",
+        type=str,
+        help="End date of a range download job.",
+        default=default_config.get("DAYS", "end")
+    )
+    return parser
+
+
+###################### Library section #################################
+
+
+def _as_datetime(day):
+    """Convert a day (YYYYMMDD string, date or datetime) to a datetime at midnight."""
+    if isinstance(day, str):
+        return datetime.strptime(day, "%Y%m%d")
+    return datetime(day.year, day.month, day.day)
+
+
+class Downloader:
+    """Download the files of a feed from another Python program, without a subprocess.
+
+    Importing the module and creating a Downloader do not touch the network or the output directory:
+    the day index, the logs, the workers and the connections are set up on the first call, and
+    numpy, pyarrow and progressbar are only imported when they are used. The files are downloaded
+    with the thread engine.
+
+    Example:
+        with Downloader("derivatives_daily_config.cfg", workers=4, quiet=True) as downloader:
+            for result in downloader.fetch_range("20230501", "20230519"):
+                print(result["path"] if result["ok"] else result["error"])
+
+    Args:
+        config (str or ConfigParser): Path to a config file or a loaded config (None for the default
+            config, which is not saved).
+        init_logging (bool): Add the log file and console handlers of the config like the command line
+            does. By default the records only go to the handlers of the program. The failed downloads
+            are always written to the failed log of the config, so they can be retried with --retry.
+        **options: Settings that override the config, named like the command line options
+            (e.g. workers=4, output="data", file=["td", "tds"]).
+
+    Raises:
+        TypeError: An option is not a command line option.
+    """
+
+    def __init__(self, config=None, init_logging=False, **options):
+        default_config = _create_default_config(configparser.ConfigParser(), None)
+        defaults = _build_parser(default_config, []).parse_args([])
+        unknown = sorted(set(options) - set(vars(defaults)))
+        if unknown:
+            raise TypeError(f"Unknown option(s): {', '.join(unknown)}")
+        config_path = None
+        if config is None:
+            config = default_config
+        elif not isinstance(config, configparser.ConfigParser):
+            config_path, config = os.fspath(config), None
+        self.feed = Feed(defaults, config_path)
+        config = self.feed.run(_load_feed, default_config, config)
+        for name, value in options.items():
+            setattr(self.feed.args, name, value)
+        if "index" not in options:
+            self.feed.args.index = _get_index_path(config, config_path, self.feed.args.output)
+        self.init_logging = init_logging
+        self.started = False
+
+    def _start(self):
+        if not self.started:
+            self.feed.run(_start_feed, self.init_logging)
+            _open_pools([self.feed])
+            self.started = True
+
+    def resolve(self, start, end=None):
+        """Find the day_id of each day with data from start to end.
+
+        Args:
+            start (str or date): The first day (YYYYMMDD, date or datetime).
+            end (str or date): The last day (default is the first day).
+
+        Returns:
+            list: (day_id, day string) of each day with data, sorted by day_id.
+        """
+        self._start()
+        start_day = _as_datetime(start)
+        end_day = start_day if end is None else _as_datetime(end)
+        return self.feed.run(resolve_range, start_day, end_day)
+
+    def fetch_day(self, day):
+        """Download the files of a day (see iter_results). Nothing is yielded if the day has no data."""
+        self._start()
+        jobs = self.feed.run(_day_jobs, _as_datetime(day).strftime("%Y%m%d"))
+        yield from self.iter_results(jobs)
+        self.feed.run(_convert_days, jobs)
+
+    def fetch_range(self, start, end):
+        """Download the files of the days from start to end (see resolve and iter_results)."""
+        jobs = self.feed.run(_range_jobs, self.resolve(start, end))
+        yield from self.iter_results(jobs)
+        self.feed.run(_convert_days, jobs)
+
+    def iter_results(self, jobs):
+        """Download (metadata, file name) jobs and yield the result of each file as soon as it is done.
+
+        Args:
+            jobs (iterable): (metadata, file name) of each file, metadata is {"id": day_id, "day": day string}.
+
+        Yields:
+            dict: "id", "day", "file", "link", "ok", "error" (the exception or None) and "path" (the
+            downloaded file or None) of each file, in the order the files are done.
+        """
+        self._start()
+        results = self.feed.run(_download_results, jobs)
+        while True:
+            result = self.feed.run(next, results, None)
+            if result is None:
+                return
+            _, metadata, filename, error = result
+            link = self.feed.link_pattern % (metadata["id"], filename)
+            entry = self.feed.manifest.entries.get(link)
+            path = None
+            if error is None and entry is not None:
+                path = self.feed.args.output / metadata["day"] / entry["filename"]
+            yield {"id": metadata["id"], "day": metadata["day"], "file": filename, "link": link,
+                   "ok": error is None, "error": error, "path": path}
+
+    def status(self):
+        """Progress of the downloads (see Progress.status), None before the first call."""
+        if self.feed.progress is None:
+            return None
+        return self.feed.progress.status()
+
+    def close(self):
+        """Save the day index and the metrics and close the workers and the connections."""
+        if not self.started:
+            return
+        self.started = False
+        _close_pools([self.feed])
+        self.feed.run(_finish_feed)
+        _write_metrics([self.feed])
+        self.feed.run(_close_logger)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def main():
+    """Run the command line."""
+    default_config = _get_default_config()
+    parser = _build_parser(default_config)
+    cli_args = parser.parse_args()
+
+    if len(sys.argv) == 1:
+        parser.print_help()
+        exit(0)
+    if cli_args.config and len(cli_args.config) > 1 and cli_args.retry \
+            and any(arg in ("-r", "--retry") or arg.startswith("--retry=") for arg in sys.argv[1:]):
+        # Every feed would rename and read the same file and build the links of the others' rows.
+        parser.error("--retry PATH can not be used with several config files, "
+                     "use --retry without a path to retry the failed log of each config.")
+
+    feeds = [Feed(cli_args, config_path) for config_path in cli_args.config or [None]]
+    for feed in feeds:
+        feed.run(_load_feed, default_config)
+    run(feeds)
+
+
+if __name__ == "__main__":
+    main()
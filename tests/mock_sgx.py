@@ -0,0 +1,144 @@
+"""Run the downloader against the mock SGX server of sgx-benchmark.py."""
+
+import configparser
+import importlib.util
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+import zipfile
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import sgx_downloader
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# The name of the script is not a valid module name, so it is loaded from its path.
+_spec = importlib.util.spec_from_file_location("sgx_benchmark", ROOT / "sgx-benchmark.py")
+benchmark = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(benchmark)
+
+# Tick data of two contracts and its structure file.
+TICK_CSV = (b"Comm,Contract_Type,Mth_Code,Year,Strike,Trade_Date,Log_Time,Price,Msg_Seq_Num,Volume\n"
+            + b"NK,F,M,2026,,20260610,0900,32000.5,1,10\n" * 300
+            + b"CN,F,N,2026,,20260610,0901,13200,2,4\n" * 200)
+TICK_STRUCTURE = b"""Column Name    Description        Data Type
+Comm           Commodity code     char(4)
+Contract_Type  Contract type      char(1)
+Mth_Code       Month code         char(1)
+Year           Contract year      int
+Strike         Strike price       decimal(10,2)
+Trade_Date     Trade date         char(8)
+Log_Time       Log time (HHMM)    char(4)
+Price          Price              decimal(12,4)
+Msg_Seq_Num    Message number     int
+Volume         Traded volume      int
+"""
+
+
+def zip_bytes(members):
+    """Build a zip file from (name, content) members."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, content in members:
+            archive.writestr(name, content)
+    return buffer.getvalue()
+
+
+class MockSgxTestCase(unittest.TestCase):
+    """Start a mock SGX server for each test and write configs of the downloader that point to it.
+
+    The mock feed has HISTORY day_ids up to PIVOT_ID, the id of the last business day before today.
+    """
+
+    PIVOT_ID = 5420
+    HISTORY = 300
+    GAPS = frozenset()
+    HOLIDAYS = frozenset()
+    FILE_SIZE = 64 * 1024
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.workdir = Path(self.directory.name)
+        # The home directory of the command line, where it saves its default config.
+        (self.workdir / ".config").mkdir()
+        pivot_date = datetime.combine(datetime.today().date(), datetime.min.time()) - timedelta(days=1)
+        while pivot_date.weekday() >= 5:
+            pivot_date -= timedelta(days=1)
+        self.feed = benchmark.MockFeed(pivot_date, self.PIVOT_ID, self.HISTORY, self.GAPS, self.HOLIDAYS)
+        self.server = benchmark.start_mock_server(self.feed, self.FILE_SIZE, 0, 0, 0, 0)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.stats = self.server.stats
+
+    def day_id(self, offset):
+        """The id of the `offset`-th day with data before the pivot."""
+        return self.feed.business_id(offset)
+
+    def day(self, offset):
+        """The day string (YYYYMMDD) of the `offset`-th day with data before the pivot."""
+        return f"{self.feed.days[self.day_id(offset)]:%Y%m%d}"
+
+    def link(self, qid, key):
+        """The link of a file of the mock feed."""
+        return f"http://127.0.0.1:{self.server.server_address[1]}/1.0.0/{benchmark.FEED}/{qid}/{benchmark.FILE_NAME[key]}"
+
+    def write_config(self, name="test.cfg", day="off", start="off", end="off", **base):
+        """Write a config of the downloader in the working directory.
+
+        Args:
+            name (str): File name of the config.
+            day (str): The day of the DAYS section.
+            start (str): The start of the DAYS section.
+            end (str): The end of the DAYS section.
+            **base: Settings of the BASE section that override the defaults of the test config.
+
+        Returns:
+            Path: Path to the config.
+        """
+        config = sgx_downloader._create_default_config(configparser.ConfigParser(), None)
+        settings = {
+            "LINK_PATTERN": f"http://127.0.0.1:{self.server.server_address[1]}/1.0.0/{benchmark.FEED}/%%d/%%s",
+            "pivotdate": f"{self.feed.pivot_date:%Y%m%d}",
+            "pivotorder": str(self.PIVOT_ID),
+            "output": str(self.workdir / "data"),
+            "logfile": str(self.workdir / "test.log"),
+            "errorfile": str(self.workdir / "failed.txt"),
+            "indexfile": str(self.workdir / "index.json"),
+            "quiet": "true",
+            "backoff": "0.05",
+            "progressinterval": "0.05",
+        }
+        settings.update({key: str(value) for key, value in base.items()})
+        for key, value in settings.items():
+            config.set("BASE", key, value)
+        for key, file_name in benchmark.FILE_NAME.items():
+            config.set("FILE_NAME", key, file_name)
+        for key, value in (("day", day), ("start", start), ("end", end)):
+            config.set("DAYS", key, value)
+        config.set("HOLIDAYS", "days", ",".join(f"{holiday:%Y%m%d}" for holiday in sorted(self.HOLIDAYS)))
+        config.set("NOT_DOWNLOADABLE", "day_ids", sgx_downloader._format_id_ranges(self.GAPS))
+        path = self.workdir / name
+        with open(path, "w") as config_file:
+            config.write(config_file)
+        return path
+
+    def downloader(self, config=None, **options):
+        """A Downloader of a config (the test config by default), closed at the end of the test."""
+        downloader = sgx_downloader.Downloader(config or self.write_config(), **options)
+        self.addCleanup(downloader.close)
+        return downloader
+
+    def run_cli(self, *argv):
+        """Run sgx-downloader.py in the working directory (its home directory too, for the default config).
+
+        Returns:
+            CompletedProcess: The result, with the output in `stdout`.
+        """
+        env = dict(os.environ, HOME=str(self.workdir))
+        return subprocess.run([sys.executable, str(ROOT / "sgx-downloader.py"), *map(str, argv)], cwd=self.workdir,
+                              env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, timeout=120)
@@ -0,0 +1,66 @@
+"""Tests of the Downloader (the library API) against the mock SGX server."""
+
+import unittest
+
+import sgx_downloader
+from tests.mock_sgx import MockSgxTestCase, benchmark
+
+
+class DownloaderTest(MockSgxTestCase):
+
+    def test_lazy_start(self):
+        downloader = self.downloader(file=["tc"])
+        self.assertIsNone(downloader.status())
+        self.assertFalse((self.workdir / "data").exists())
+        self.assertEqual(self.stats.snapshot()["requests"], 0)
+        # Closing a Downloader that did not start does nothing.
+        downloader.close()
+        self.assertFalse((self.workdir / "data").exists())
+
+    def test_unknown_option(self):
+        with self.assertRaises(TypeError):
+            sgx_downloader.Downloader(self.write_config(), worker=4)
+
+    def test_fetch_day(self):
+        downloader = self.downloader(file=["tc", "tcs"])
+        self.assertEqual(downloader.resolve(self.day(3)), [(self.day_id(3), self.day(3))])
+        results = sorted(downloader.fetch_day(self.day(3)), key=lambda result: result["file"])
+        self.assertEqual([result["file"] for result in results], [benchmark.FILE_NAME["tc"], benchmark.FILE_NAME["tcs"]])
+        for result in results:
+            self.assertTrue(result["ok"], result["error"])
+            self.assertEqual((result["id"], result["day"]), (self.day_id(3), self.day(3)))
+            self.assertEqual(result["link"], self.link(self.day_id(3), "tc" if result["file"] == "TC.txt" else "tcs"))
+            self.assertEqual(result["path"].parent, self.workdir / "data" / self.day(3))
+            self.assertEqual(result["path"].stat().st_size, self.FILE_SIZE)
+        status = downloader.status()
+        self.assertEqual((status["files"], status["done"], status["failed"]), (2, 2, 0))
+        self.assertEqual(status["bytes"], 2 * self.FILE_SIZE)
+
+        downloader.close()
+        # The day index is saved when the Downloader is closed.
+        self.assertIn(str(self.day_id(3)), (self.workdir / "index.json").read_text())
+
+    def test_failed_files_are_written_to_the_failed_log(self):
+        self.server.scripted.append((404, {}))
+        link = self.link(self.day_id(5), "tc")
+        with sgx_downloader.Downloader(self.write_config(), file=["tc"]) as downloader:
+            jobs = [({"id": self.day_id(5), "day": self.day(5)}, benchmark.FILE_NAME["tc"])]
+            results = list(downloader.iter_results(jobs))
+        self.assertEqual(len(results), 1)
+        self.assertFalse(results[0]["ok"])
+        self.assertEqual(results[0]["error"].code, 404)
+        self.assertIsNone(results[0]["path"])
+        # Without init_logging the failed file is still written to the failed log.
+        self.assertIn(f"{link}\t{self.day(5)}\tHTTPError", (self.workdir / "failed.txt").read_text())
+        # The handler of the failed log is closed with the Downloader.
+        self.assertEqual(sgx_downloader.logging.getLogger("failed").handlers, [])
+
+        # The failed file is downloaded again from the failed log.
+        result = self.run_cli("-c", "test.cfg", "--retry")
+        self.assertEqual(result.returncode, 0, result.stdout)
+        self.assertNotIn(link, (self.workdir / "failed.txt").read_text())
+        self.assertTrue((self.workdir / "data" / self.day(5) / f"TC_{self.day(5)}.txt").exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+"""Tests of --scan-blacklist and the NOT_DOWNLOADABLE section of the config."""
+
+import configparser
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+
+import sgx_downloader
+from tests.mock_sgx import MockSgxTestCase
+
+
+class ScanBlacklistOptionTest(unittest.TestCase):
+
+    def _parse(self, *argv):
+        default_config = sgx_downloader._create_default_config(configparser.ConfigParser(), None)
+        return sgx_downloader._build_parser(default_config, []).parse_args(list(argv))
+
+    def test_range(self):
+        self.assertEqual(self._parse("--scan-blacklist", "3000-5000").scan_blacklist, (3000, 5000))
+        self.assertEqual(self._parse("--scan-blacklist", "5000-5000").scan_blacklist, (5000, 5000))
+
+    def test_without_range(self):
+        self.assertEqual(self._parse("--scan-blacklist").scan_blacklist, ())
+        self.assertIsNone(self._parse().scan_blacklist)
+
+    def test_invalid_ranges(self):
+        for value in ("5000", "5000-", "-5000", "a-b", "3000-4000-5000", "5000-3000"):
+            stderr = io.StringIO()
+            with self.subTest(value=value), contextlib.redirect_stderr(stderr), self.assertRaises(SystemExit):
+                self._parse(f"--scan-blacklist={value}")
+            self.assertIn("--scan-blacklist", stderr.getvalue())
+
+
+class SaveNotDownloadableTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "test.cfg")
+
+    def _save(self, text, ids):
+        with open(self.path, "w", newline='') as config_file:
+            config_file.write(text)
+        sgx_downloader._save_not_downloadable(self.path, ids)
+        with open(self.path, newline='') as config_file:
+            return config_file.read()
+
+    def test_comment_with_brackets(self):
+        text = ("[BASE]\nworkers = 4\n\n"
+                "[NOT_DOWNLOADABLE]\n# ids [2725-2754] have no data\nday_ids = 2725-2754\n\n"
+                "[HOLIDAYS]\ndays = 20230101\n")
+        self.assertEqual(self._save(text, [1, 2, 3, 2725]), text.replace("day_ids = 2725-2754", "day_ids = 1-3,2725"))
+
+    def test_continuation_lines(self):
+        text = "[NOT_DOWNLOADABLE]\nday_ids = 1-3,\n    5-7\n\n[HOLIDAYS]\ndays =\n"
+        self.assertEqual(self._save(text, [9]), "[NOT_DOWNLOADABLE]\nday_ids = 9\n\n[HOLIDAYS]\ndays =\n")
+
+    def test_crlf(self):
+        text = "[NOT_DOWNLOADABLE]\r\n; old\r\nday_ids = 1\r\n[DAYS]\r\nday = off\r\n"
+        self.assertEqual(self._save(text, [2]), text.replace("day_ids = 1", "day_ids = 2"))
+
+    def test_new_line_and_section(self):
+        self.assertEqual(self._save("[NOT_DOWNLOADABLE]\n# [ids]\n[DAYS]\n", [4]),
+                         "[NOT_DOWNLOADABLE]\n# [ids]\nday_ids = 4\n[DAYS]\n")
+        self.assertEqual(self._save("[BASE]\nworkers = 4\n", [4]),
+                         "[BASE]\nworkers = 4\n\n[NOT_DOWNLOADABLE]\nday_ids = 4\n")
+
+
+class ScanBlacklistTest(MockSgxTestCase):
+
+    GAPS = frozenset({5405, 5406, 5407, 5415})
+
+    def test_scan(self):
+        config = self.write_config()
+        result = self.run_cli("-c", config, "--scan-blacklist", "5400-5420")
+        self.assertEqual(result.returncode, 0, result.stdout)
+        saved = configparser.ConfigParser()
+        saved.read(config)
+        self.assertEqual(saved.get("NOT_DOWNLOADABLE", "day_ids"), "5405-5407,5415")
+        self.assertEqual(self.stats.gets, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
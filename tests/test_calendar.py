@@ -0,0 +1,251 @@
+"""Tests of TradingCalendar and of the day_id resolution of _search_steps and _range_steps."""
+
+import argparse
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+import numpy as np
+
+import sgx_downloader
+from sgx_downloader import DayIndex, IdRangeSet, TradingCalendar
+
+# A Monday.
+FIRST_DAY = datetime(2026, 6, 1)
+FIRST_ID = 5300
+
+
+def _web(last_day, holidays=(), holes=()):
+    """Build the days of a feed: one id per business day from FIRST_DAY, the holes are ids without data.
+
+    Returns:
+        dict: day_id -> day (None for the holes).
+    """
+    days = {}
+    qid, day = FIRST_ID, FIRST_DAY
+    while day <= last_day:
+        if qid in holes:
+            days[qid] = None
+        elif day.weekday() < 5 and day not in holidays:
+            days[qid] = day
+            day += timedelta(days=1)
+        else:
+            day += timedelta(days=1)
+            continue
+        qid += 1
+    return days
+
+
+def _id_of(web, day):
+    return next(qid for qid, web_day in web.items() if web_day == day)
+
+
+class TradingCalendarTest(unittest.TestCase):
+
+    def test_estimate_is_exact_when_everything_is_known(self):
+        holidays = [datetime(2026, 6, 10)]
+        holes = [5305]
+        web = _web(datetime(2026, 7, 31), holidays, holes)
+        pivot_day = datetime(2026, 7, 31)
+        calendar = TradingCalendar(pivot_day, _id_of(web, pivot_day), holidays, holes)
+        days = [day for day in web.values() if day is not None]
+        self.assertEqual(list(calendar.estimate(days)), [_id_of(web, day) for day in days])
+
+    def test_day_without_data_gets_a_business_day_next_to_it(self):
+        weekend = [datetime(2026, 6, 6), datetime(2026, 6, 7)]
+        # After the known day, Saturday and Sunday get the id of Monday.
+        calendar = TradingCalendar(datetime(2026, 6, 5), 5304)
+        self.assertEqual(list(calendar.estimate(weekend)), [5305, 5305])
+        # Before the known day, they get the id of Friday.
+        calendar = TradingCalendar(datetime(2026, 6, 12), 5309)
+        self.assertEqual(list(calendar.estimate(weekend)), [5304, 5304])
+
+    def test_holidays_are_learned_from_known_ids(self):
+        calendar = TradingCalendar(datetime(2026, 6, 30), 5421)
+        calendar.learn([(5400, datetime(2026, 6, 1)), (5401, datetime(2026, 6, 3))])
+        self.assertIn(np.datetime64("2026-06-02"), calendar.holidays)
+        # An id without data between the two ids does not change that.
+        calendar = TradingCalendar(datetime(2026, 6, 30), 5421, no_data=[5401])
+        calendar.learn([(5400, datetime(2026, 6, 1)), (5402, datetime(2026, 6, 3))])
+        self.assertIn(np.datetime64("2026-06-02"), calendar.holidays)
+        # An id which is not known to have no data may be the day between.
+        calendar = TradingCalendar(datetime(2026, 6, 30), 5421)
+        calendar.learn([(5400, datetime(2026, 6, 1)), (5402, datetime(2026, 6, 3))])
+        self.assertNotIn(np.datetime64("2026-06-02"), calendar.holidays)
+
+    def test_learned_holidays_are_added_to_the_config(self):
+        calendar = TradingCalendar(datetime(2026, 6, 30), 5421, holidays=[datetime(2026, 6, 10)])
+        calendar.learn([(5400, datetime(2026, 6, 1)), (5401, datetime(2026, 6, 3))])
+        self.assertEqual(calendar.holidays, {np.datetime64("2026-06-02"), np.datetime64("2026-06-10")})
+
+    def test_config_holiday_with_data_is_dropped(self):
+        calendar = TradingCalendar(datetime(2026, 6, 30), 5421,
+                                   holidays=[datetime(2026, 6, 3), datetime(2026, 6, 10)])
+        with self.assertLogs(level="WARNING"):
+            calendar.learn([(5400, datetime(2026, 6, 2)), (5401, datetime(2026, 6, 3))])
+        self.assertEqual(calendar.holidays, {np.datetime64("2026-06-10")})
+        self.assertEqual(list(calendar.estimate([datetime(2026, 6, 4)])), [5402])
+        # It stays dropped when other days are learned.
+        calendar.learn([(5410, datetime(2026, 6, 16))])
+        self.assertNotIn(np.datetime64("2026-06-03"), calendar.holidays)
+
+    def test_business_days(self):
+        calendar = TradingCalendar(datetime(2026, 6, 30), 5421, holidays=[datetime(2026, 6, 10)])
+        self.assertEqual(calendar.business_days(datetime(2026, 6, 5), datetime(2026, 6, 12)),
+                         [datetime(2026, 6, 8), datetime(2026, 6, 9), datetime(2026, 6, 11)])
+
+
+class _FeedTestCase(unittest.TestCase):
+    """Set the globals of a feed for the tests of the day_id resolution."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def _set_feed(self, pivot_day, pivot_id, listed_holidays=(), listed_holes=()):
+        index = DayIndex(os.path.join(self.directory.name, "index.json"), "http://x/%d/%s")
+        feed = {
+            "args": argparse.Namespace(dayformat="%Y%m%d"),
+            "NOT_DOWNLOADABLE": IdRangeSet((qid, qid) for qid in listed_holes),
+            "DAY_INDEX": index,
+            "CALENDAR": TradingCalendar(pivot_day, pivot_id, listed_holidays, listed_holes),
+        }
+        for name, value in feed.items():
+            patcher = mock.patch.object(sgx_downloader, name, value, create=True)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        return index
+
+
+class SearchStepsTest(_FeedTestCase):
+    """Search a day with _search_steps against a simulated web."""
+
+    def _search(self, web, day, estimate_id):
+        probed = []
+        steps = sgx_downloader._search_steps(day, estimate_id)
+        try:
+            qid = next(steps)
+            while True:
+                probed.append(qid)
+                qid = steps.send(web.get(qid))
+        except StopIteration as stop:
+            return stop.value, probed
+
+    def test_exact_estimate(self):
+        web = _web(datetime(2026, 7, 31))
+        self._set_feed(datetime(2026, 7, 31), _id_of(web, datetime(2026, 7, 31)))
+        day = datetime(2026, 6, 17)
+        (str_day, day_id), probed = self._search(web, day, _id_of(web, day))
+        self.assertEqual((str_day, day_id), ("20260617", _id_of(web, day)))
+        self.assertEqual(probed, [day_id])
+
+    def test_estimate_after_the_latest_id(self):
+        # Unknown holidays push the estimate of the latest day past the latest published id.
+        web = _web(datetime(2026, 7, 31), holidays=[datetime(2026, 6, 10), datetime(2026, 7, 3)])
+        latest_id = max(web)
+        self._set_feed(datetime(2026, 7, 31), latest_id)
+        (str_day, day_id), probed = self._search(web, datetime(2026, 7, 31), latest_id + 10)
+        self.assertEqual((str_day, day_id), ("20260731", latest_id))
+
+    def test_estimate_far_after_the_latest_id(self):
+        # A stale pivot: more ids without data after the estimate than SEARCH_MAX_HOLE.
+        web = _web(datetime(2026, 7, 31))
+        latest_id = max(web)
+        self._set_feed(datetime(2026, 7, 31), latest_id)
+        for overshoot in (30, 1000):
+            day = web[latest_id - 4]
+            (str_day, day_id), probed = self._search(web, day, latest_id - 4 + overshoot)
+            self.assertEqual((str_day, day_id), (day.strftime("%Y%m%d"), latest_id - 4))
+            self.assertLess(len(probed), 2 * sgx_downloader.SEARCH_MAX_HOLE + 2 * overshoot.bit_length())
+
+    def test_day_without_data(self):
+        web = _web(datetime(2026, 7, 31), holidays=[datetime(2026, 6, 10)])
+        self._set_feed(datetime(2026, 7, 31), max(web))
+        (str_day, day_id), probed = self._search(web, datetime(2026, 6, 10), 5320)
+        self.assertEqual((str_day, day_id), ('', _id_of(web, datetime(2026, 6, 11))))
+
+
+class RangeStepsTest(_FeedTestCase):
+    """Resolve the ids between FIRST_ID and the id after LAST_DAY against a simulated web."""
+
+    LAST_DAY = datetime(2026, 7, 10)
+
+    def _resolve(self, infer, holidays=(), holes=(), listed_holidays=(), listed_holes=(), indexed=()):
+        """Run _range_steps for the days after FIRST_DAY up to LAST_DAY.
+
+        Returns:
+            dict: The web (day_id -> day).
+            list: (id, day) found by _range_steps.
+            set: The inferred ids.
+            list: The probed ids.
+        """
+        web = _web(self.LAST_DAY + timedelta(days=7), holidays, holes)
+        hi_id = min(qid for qid, day in web.items() if day is not None and day > self.LAST_DAY)
+        index = self._set_feed(self.LAST_DAY, hi_id, listed_holidays, listed_holes)
+        for qid in indexed:
+            index.put(qid, web[qid].strftime("%Y%m%d") if web[qid] else '')
+
+        probed = []
+        steps = sgx_downloader._range_steps(FIRST_ID, FIRST_DAY, hi_id, web[hi_id], infer=infer)
+        try:
+            qid = next(steps)
+            while True:
+                probed.append(qid)
+                qid = steps.send(web[qid].strftime("%Y%m%d") if web[qid] else '')
+        except StopIteration as stop:
+            days, inferred = stop.value
+        return web, days, inferred, probed
+
+    def _expected(self, web):
+        return [(qid, day) for qid, day in sorted(web.items())
+                if day is not None and FIRST_DAY < day <= self.LAST_DAY]
+
+    def test_inferred_without_holes_or_unknown_holidays(self):
+        holidays = [datetime(2026, 6, 10)]
+        holes = [5310, 5311]
+        web, days, inferred, probed = self._resolve(
+            True, holidays, holes, listed_holidays=holidays, listed_holes=holes)
+        self.assertEqual(days, self._expected(web))
+        self.assertEqual(probed, [])
+        self.assertEqual(inferred, {qid for qid, _ in days})
+
+    def test_unknown_holiday_is_probed(self):
+        web, days, inferred, probed = self._resolve(True, holidays=[datetime(2026, 6, 17)])
+        self.assertEqual(days, self._expected(web))
+        self.assertTrue(probed)
+        self.assertLess(len(probed), len(days) // 2)
+
+    def test_unlisted_hole_is_probed(self):
+        web, days, inferred, probed = self._resolve(True, holes=[5320])
+        self.assertEqual(days, self._expected(web))
+        self.assertIn(5320, probed)
+
+    def test_hole_and_unknown_holiday_cancel_out_when_inferred(self):
+        # The hole comes before the holiday: the ids between them are shifted by one day.
+        holidays = [datetime(2026, 6, 24)]
+        web, days, inferred, probed = self._resolve(True, holidays=holidays, holes=[5310])
+        wrong = {qid for qid, day in days if web.get(qid) != day}
+        self.assertTrue(wrong)
+        # Only inferred days can be wrong, a probed day is read from the web.
+        self.assertLessEqual(wrong, inferred)
+
+    def test_hole_and_unknown_holiday_without_inference(self):
+        holidays = [datetime(2026, 6, 24)]
+        web, days, inferred, probed = self._resolve(False, holidays=holidays, holes=[5310])
+        self.assertEqual(days, self._expected(web))
+        self.assertEqual(inferred, set())
+        self.assertIn(5310, probed)
+
+    def test_indexed_and_listed_ids_are_not_probed(self):
+        web, days, inferred, probed = self._resolve(
+            False, holes=[5310, 5320], listed_holes=[5320], indexed=range(5301, 5306))
+        self.assertEqual(days, self._expected(web))
+        self.assertFalse(set(probed) & set(range(5301, 5306)))
+        self.assertNotIn(5320, probed)
+        self.assertIn(5310, probed)
+
+
+if __name__ == "__main__":
+    unittest.main()
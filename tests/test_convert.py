@@ -0,0 +1,111 @@
+"""Tests of the conversion of the downloaded CSV files to Parquet and Arrow (--convert)."""
+
+import tempfile
+import unittest
+from pathlib import Path
+
+import sgx_downloader
+from tests.mock_sgx import TICK_CSV, TICK_STRUCTURE, MockSgxTestCase, zip_bytes
+
+HAS_PYARROW = sgx_downloader._load_pyarrow()
+
+
+class ParseStructureTest(unittest.TestCase):
+
+    def test_columns(self):
+        with tempfile.NamedTemporaryFile("wb", suffix=".dat", delete=False) as structure_file:
+            structure_file.write(TICK_STRUCTURE)
+        self.addCleanup(Path(structure_file.name).unlink)
+        self.assertEqual(sgx_downloader._parse_structure(structure_file.name), [
+            ("Comm", "string"), ("Contract_Type", "string"), ("Mth_Code", "string"), ("Year", "int"),
+            ("Strike", "float"), ("Trade_Date", "string"), ("Log_Time", "string"), ("Price", "float"),
+            ("Msg_Seq_Num", "int"), ("Volume", "int")])
+
+
+@unittest.skipUnless(HAS_PYARROW, "pyarrow is not installed")
+class ConvertFileTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        self.out_dir = self.directory / "parquet" / "WEBPXTICK_DT" / "date=20260610"
+        with tempfile.NamedTemporaryFile("wb", suffix=".dat", dir=self.directory, delete=False) as structure_file:
+            structure_file.write(TICK_STRUCTURE)
+        self.columns = sgx_downloader._parse_structure(structure_file.name)
+
+    def _convert(self, data, name="WEBPXTICK_DT-20260610.zip", file_format="parquet", columns=True):
+        path = self.directory / name
+        path.write_bytes(data)
+        return sgx_downloader.convert_file(path, self.columns if columns else None, self.out_dir, file_format)
+
+    def _read(self, contract, file_format="parquet"):
+        pyarrow = sgx_downloader.pyarrow
+        if file_format == "parquet":
+            return pyarrow.parquet.read_table(self.out_dir / f"comm={contract}" / "part-0.parquet")
+        with pyarrow.ipc.open_file(self.out_dir / f"comm={contract}" / "part-0.arrow") as reader:
+            return reader.read_all()
+
+    def test_partitions_and_types(self):
+        rows = self._convert(zip_bytes([("WEBPXTICK_DT.csv", TICK_CSV)]))
+        self.assertEqual(rows, 500)
+        self.assertEqual(sorted(path.name for path in self.out_dir.iterdir()), ["comm=CN", "comm=NK"])
+        table = self._read("NK")
+        self.assertEqual(table.num_rows, 300)
+        self.assertEqual(set(table["Comm"].to_pylist()), {"NK"})
+        pyarrow = sgx_downloader.pyarrow
+        self.assertEqual(table.schema.field("Log_Time").type, pyarrow.string())
+        self.assertEqual(table.schema.field("Price").type, pyarrow.float64())
+        self.assertEqual(table.schema.field("Volume").type, pyarrow.int64())
+        self.assertEqual(table["Log_Time"][0].as_py(), "0900")
+        self.assertIsNone(table["Strike"][0].as_py())
+
+    def test_arrow_and_plain_csv(self):
+        rows = self._convert(TICK_CSV, name="TC_20260610.txt", file_format="arrow")
+        self.assertEqual(rows, 500)
+        self.assertEqual(self._read("CN", "arrow").num_rows, 200)
+
+    def test_inferred_types(self):
+        self._convert(TICK_CSV, name="TC_20260610.txt", columns=False)
+        # Without the structure file the leading zero of the time is lost.
+        self.assertEqual(self._read("NK")["Log_Time"][0].as_py(), 900)
+
+    def test_small_blocks(self):
+        old_size = sgx_downloader.CONVERT_BLOCK_SIZE
+        sgx_downloader.CONVERT_BLOCK_SIZE = 1024
+        self.addCleanup(setattr, sgx_downloader, "CONVERT_BLOCK_SIZE", old_size)
+        self.assertEqual(self._convert(TICK_CSV, name="TC_20260610.txt"), 500)
+        self.assertEqual(self._read("NK").num_rows + self._read("CN").num_rows, 500)
+
+    def test_failure_keeps_the_previous_conversion(self):
+        self._convert(TICK_CSV, name="TC_20260610.txt")
+        with self.assertRaises(sgx_downloader.pyarrow.ArrowException):
+            self._convert(TICK_CSV + b"NK,F,M,not a year,,20260610,0900,1,1,1\n", name="TC_20260610.txt")
+        self.assertEqual(self._read("NK").num_rows, 300)
+        self.assertEqual(sorted(path.name for path in self.out_dir.parent.iterdir()), ["date=20260610"])
+
+
+@unittest.skipUnless(HAS_PYARROW, "pyarrow is not installed")
+class ConvertDownloadTest(MockSgxTestCase):
+
+    def test_convert_a_downloaded_day(self):
+        self.server.bodies["WEBPXTICK_DT.zip"] = zip_bytes([("WEBPXTICK_DT.csv", TICK_CSV)])
+        self.server.bodies["TickData_structure.dat"] = TICK_STRUCTURE
+        downloader = self.downloader(file=["td", "tds"], convert="parquet")
+        results = list(downloader.fetch_day(self.day(3)))
+        self.assertTrue(all(result["ok"] for result in results), results)
+        out_dir = self.workdir / "data" / "parquet" / "WEBPXTICK_DT" / f"date={self.day(3)}"
+        table = sgx_downloader.pyarrow.parquet.read_table(out_dir / "comm=NK" / "part-0.parquet")
+        self.assertEqual(table["Log_Time"][0].as_py(), "0900")
+
+    def test_convert_from_the_command_line(self):
+        self.server.bodies["TC.txt"] = TICK_CSV
+        config = self.write_config(day=self.day(3), downloadfiles="tc", convertfiles="tc")
+        result = self.run_cli("-c", config, "--convert", "arrow")
+        self.assertEqual(result.returncode, 0, result.stdout)
+        out_dir = self.workdir / "data" / "arrow" / "TC" / f"date={self.day(3)}"
+        self.assertEqual(sorted(path.name for path in out_dir.iterdir()), ["comm=CN", "comm=NK"])
+
+
+if __name__ == "__main__":
+    unittest.main()
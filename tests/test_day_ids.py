@@ -0,0 +1,226 @@
+"""Tests of IdRangeSet (NOT_DOWNLOADABLE) and DayIndex."""
+
+import json
+import os
+import random
+import tempfile
+import threading
+import unittest
+
+import sgx_downloader
+from sgx_downloader import DayIndex, IdRangeSet
+
+
+class IdRangeSetTest(unittest.TestCase):
+
+    def setUp(self):
+        self.ids = IdRangeSet.from_text("10-14,15,20,30-32,31-35,40")
+
+    def test_ranges_are_merged(self):
+        self.assertEqual(str(self.ids), "10-15,20,30-35,40")
+        self.assertEqual(len(self.ids), 14)
+        self.assertEqual(list(self.ids), [10, 11, 12, 13, 14, 15, 20, 30, 31, 32, 33, 34, 35, 40])
+
+    def test_contains(self):
+        for qid in range(0, 50):
+            self.assertEqual(qid in self.ids, qid in set(self.ids), qid)
+
+    def test_next_downloadable(self):
+        self.assertEqual(self.ids.next_downloadable(9), 9)
+        self.assertEqual(self.ids.next_downloadable(10), 16)
+        self.assertEqual(self.ids.next_downloadable(35), 36)
+        self.assertEqual(self.ids.next_downloadable(40), 41)
+        self.assertEqual(self.ids.next_downloadable(15, -1), 9)
+        self.assertEqual(self.ids.next_downloadable(20, -1), 19)
+        self.assertEqual(self.ids.next_downloadable(34, -1), 29)
+
+    def test_next_downloadable_before_zero(self):
+        ids = IdRangeSet([(0, 5)])
+        self.assertLess(ids.next_downloadable(3, -1), 0)
+
+    def test_count(self):
+        listed = set(self.ids)
+        for start in range(5, 45):
+            for end in range(start - 1, 45):
+                expected = sum(1 for qid in range(start, end + 1) if qid in listed)
+                self.assertEqual(self.ids.count(start, end), expected, (start, end))
+                self.assertEqual(self.ids.count_downloadable(start, end),
+                                 max(0, end - start + 1) - expected, (start, end))
+
+    def test_empty(self):
+        ids = IdRangeSet()
+        self.assertEqual(len(ids), 0)
+        self.assertEqual(str(ids), "")
+        self.assertEqual(ids.next_downloadable(7), 7)
+        self.assertEqual(ids.count(0, 100), 0)
+
+
+class IdRangesTextTest(unittest.TestCase):
+
+    def test_format(self):
+        self.assertEqual(sgx_downloader._format_id_ranges([7, 3, 4, 5, 9, 10, 4]), "3-5,7,9-10")
+        self.assertEqual(sgx_downloader._format_id_ranges([]), "")
+
+    def test_parse_skips_blanks(self):
+        self.assertEqual(sgx_downloader._parse_id_ranges(" 2725-2727, 2771,,2772 "), [2725, 2726, 2727, 2771, 2772])
+
+    def test_round_trip(self):
+        rng = random.Random(8)
+        for _ in range(200):
+            ids = {rng.randrange(0, 300) for _ in range(rng.randrange(0, 60))}
+            text = sgx_downloader._format_id_ranges(ids)
+            self.assertEqual(set(sgx_downloader._parse_id_ranges(text)), ids)
+            self.assertEqual(sgx_downloader._format_id_ranges(sgx_downloader._parse_id_ranges(text)), text)
+            self.assertEqual(str(IdRangeSet.from_text(text)), text)
+            self.assertEqual(set(IdRangeSet.from_text(text)), ids)
+
+
+class DayIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "index.json")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def _write(self, text):
+        with open(self.path, "w") as index_file:
+            index_file.write(text)
+
+    def test_put_get_and_reload(self):
+        index = DayIndex(self.path, "http://a/%d/%s")
+        self.assertIsNone(index.get(100))
+        index.put(100, "20260601")
+        index.put(101, "")
+        index.put(102, "20260602")
+        index.save()
+
+        index = DayIndex(self.path, "http://a/%d/%s")
+        self.assertEqual(index.get(100), "20260601")
+        self.assertEqual(index.get(101), "")
+        self.assertEqual(index.find("20260602", 0), 102)
+        self.assertIsNone(index.find("20260603", 0))
+
+    def test_missing_after_latest_day_is_not_known(self):
+        index = DayIndex(self.path, "http://a/%d/%s")
+        index.put(100, "20260601")
+        index.put(105, "")
+        # The id after the latest known day may get its data later.
+        self.assertIsNone(index.get(105))
+        index.put(106, "20260602")
+        self.assertEqual(index.get(105), "")
+
+    def test_put_another_day_moves_the_id(self):
+        index = DayIndex(self.path, "http://a/%d/%s")
+        index.put(100, "20260601")
+        with self.assertLogs(level="WARNING"):
+            index.put(100, "20260602")
+        self.assertEqual(index.get(100), "20260602")
+        self.assertIsNone(index.find("20260601", 100))
+        self.assertEqual(index.find("20260602", 100), 100)
+
+    def test_put_no_data_and_forget_remove_the_day(self):
+        index = DayIndex(self.path, "http://a/%d/%s")
+        index.put(100, "20260601")
+        index.put(101, "20260602")
+        index.put(102, "20260603")
+        with self.assertLogs(level="WARNING"):
+            index.put(101, "")
+        self.assertEqual(index.get(101), "")
+        self.assertIsNone(index.find("20260602", 101))
+        index.forget(100)
+        self.assertIsNone(index.get(100))
+        self.assertIsNone(index.find("20260601", 100))
+        self.assertNotIn(100, index.missing)
+
+    def test_find_day_without_year(self):
+        index = DayIndex(self.path, "http://a/%d/%s", unique_days=False)
+        index.put(1000, "0601")
+        index.put(1250, "0601")
+        self.assertEqual(index.find("0601", 1010), 1000)
+        self.assertEqual(index.find("0601", 1240), 1250)
+        self.assertIsNone(index.find("0601", 1500))
+
+    def test_feeds_share_a_file(self):
+        first = DayIndex(self.path, "http://a/%d/%s")
+        first.put(1, "20260601")
+        first.save()
+        second = DayIndex(self.path, "http://b/%d/%s")
+        second.put(2, "20260602")
+        second.save()
+        with open(self.path) as index_file:
+            data = json.load(index_file)
+        self.assertEqual(data["http://a/%d/%s"]["days"], {"1": "20260601"})
+        self.assertEqual(data["http://b/%d/%s"]["days"], {"2": "20260602"})
+
+    def test_unreadable_file(self):
+        self._write("{not json")
+        with self.assertLogs(level="WARNING"):
+            index = DayIndex(self.path, "http://a/%d/%s")
+        self.assertIsNone(index.get(1))
+
+    def test_truncated_file(self):
+        # A file cut in the middle of a write.
+        self._write('{"http://a/%d/%s": {"days": {"1": "20260601", "2": "2026')
+        with self.assertLogs(level="WARNING"):
+            index = DayIndex(self.path, "http://a/%d/%s")
+        self.assertIsNone(index.get(1))
+        index.put(3, "20260603")
+        index.save()
+        self.assertEqual(DayIndex(self.path, "http://a/%d/%s").get(3), "20260603")
+
+    def test_partial_feed(self):
+        # Feeds without the list of missing ids, without days or with something else than an object.
+        self._write(json.dumps({
+            "http://a/%d/%s": {"days": {"1": "20260601"}},
+            "http://b/%d/%s": {"missing": [4]},
+            "http://c/%d/%s": [1, 2],
+            "http://d/%d/%s": {"days": {"x": "20260601"}},
+        }))
+        index = DayIndex(self.path, "http://a/%d/%s")
+        self.assertEqual(index.get(1), "20260601")
+        index = DayIndex(self.path, "http://b/%d/%s")
+        index.put(5, "20260605")
+        self.assertEqual(index.get(4), "")
+        for link_pattern in ("http://c/%d/%s", "http://d/%d/%s"):
+            with self.assertLogs(level="WARNING"):
+                index = DayIndex(self.path, link_pattern)
+            self.assertIsNone(index.get(1))
+
+    def test_concurrent_puts_and_saves(self):
+        index = DayIndex(self.path, "http://a/%d/%s")
+
+        def work(first):
+            for qid in range(first, first + 50):
+                index.put(qid, f"{qid:08d}")
+                index.save()
+
+        threads = [threading.Thread(target=work, args=(first,)) for first in range(0, 400, 50)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        index = DayIndex(self.path, "http://a/%d/%s")
+        self.assertEqual([index.get(qid) for qid in range(400)], [f"{qid:08d}" for qid in range(400)])
+
+    def test_concurrent_saves_of_feeds_sharing_a_file(self):
+        indexes = [DayIndex(self.path, f"http://{name}/%d/%s") for name in "abcd"]
+
+        def work(index):
+            for qid in range(100):
+                index.put(qid, f"{qid:08d}")
+                index.save()
+
+        threads = [threading.Thread(target=work, args=(index,)) for index in indexes]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for name in "abcd":
+            index = DayIndex(self.path, f"http://{name}/%d/%s")
+            self.assertEqual([index.get(qid) for qid in range(100)], [f"{qid:08d}" for qid in range(100)])
+
+
+if __name__ == "__main__":
+    unittest.main()
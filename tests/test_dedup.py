@@ -0,0 +1,66 @@
+"""Tests of the content-addressed store of the downloaded files (--dedup and --dedup-report)."""
+
+import hashlib
+import os
+import unittest
+
+import sgx_downloader
+from tests.mock_sgx import MockSgxTestCase
+
+
+class BlobStoreTest(MockSgxTestCase):
+    """The mock server sends the same content for every file, so all the files of a run are duplicates."""
+
+    def _blobs(self):
+        return sorted(path for path in (self.workdir / "data" / sgx_downloader.BLOB_DIR_NAME).rglob("*") if path.is_file())
+
+    def _files(self):
+        return sorted((self.workdir / "data").glob("2*/TC_*.txt"))
+
+    def test_hardlink(self):
+        # The option of the command line turns the store on when the config turns it off.
+        config = self.write_config(start=self.day(4), end=self.day(1), downloadfiles="tc", dedup="off")
+        result = self.run_cli("-c", config, "--dedup", "hardlink")
+        self.assertEqual(result.returncode, 0, result.stdout)
+        files = self._files()
+        self.assertEqual(len(files), 4)
+        blobs = self._blobs()
+        self.assertEqual(len(blobs), 1)
+        self.assertEqual(blobs[0].name, hashlib.sha256(files[0].read_bytes()).hexdigest())
+        self.assertEqual({os.stat(path).st_ino for path in files}, {os.stat(blobs[0]).st_ino})
+        self.assertIn(f"Dedup: 3 file(s) linked to a stored blob, saved {3 * self.FILE_SIZE / 1e6:.2f} MB.",
+                      (self.workdir / "test.log").read_text())
+        self.assertEqual(list((self.workdir / "data").rglob("*.link")), [])
+
+        result = self.run_cli("-c", config, "--dedup-report")
+        self.assertEqual(result.returncode, 0, result.stdout)
+        self.assertIn(f"Dedup report: 4 file(s) in the store, {4 * self.FILE_SIZE / 1e6:.2f} MB in 1 blob(s) of "
+                      f"{self.FILE_SIZE / 1e6:.2f} MB, saved {3 * self.FILE_SIZE / 1e6:.2f} MB",
+                      (self.workdir / "test.log").read_text())
+
+    def test_reflink(self):
+        with self.downloader(file=["tc"], dedup="reflink") as downloader:
+            results = list(downloader.fetch_range(self.day(2), self.day(1)))
+        self.assertTrue(all(result["ok"] for result in results))
+        blobs = self._blobs()
+        self.assertEqual(len(blobs), 1)
+        # A reflink falls back to a hard link when the file system can not clone the blob.
+        for path in self._files():
+            self.assertEqual(path.read_bytes(), blobs[0].read_bytes())
+        self.assertEqual(list((self.workdir / "data").rglob("*.link")), [])
+
+    def test_report_without_store(self):
+        config = self.write_config(start=self.day(3), end=self.day(1), downloadfiles="tc")
+        self.assertEqual(self.run_cli("-c", config).returncode, 0)
+        self.assertEqual(self._blobs(), [])
+        self.assertEqual(len({os.stat(path).st_ino for path in self._files()}), 3)
+        result = self.run_cli("-c", config, "--dedup-report")
+        self.assertEqual(result.returncode, 0, result.stdout)
+        log = (self.workdir / "test.log").read_text()
+        self.assertIn("Dedup report: 0 file(s) in the store", log)
+        self.assertIn(f"Dedup report: 3 file(s) out of the store have a duplicate, {2 * self.FILE_SIZE / 1e6:.2f} MB "
+                      f"can be saved by downloading them again with --dedup", log)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+"""Tests of the feeds of several configs run in one process (FairExecutor)."""
+
+import contextvars
+import threading
+import time
+import unittest
+
+import sgx_downloader
+from tests.mock_sgx import MockSgxTestCase
+
+
+class FairExecutorTest(unittest.TestCase):
+
+    def _submit(self, executor, feed, function, *function_args):
+        def submit():
+            sgx_downloader.FEED.set(feed)
+            return executor.submit(function, *function_args)
+        return contextvars.copy_context().run(submit)
+
+    def test_feeds_take_turns(self):
+        executor = sgx_downloader.FairExecutor(1)
+        self.addCleanup(executor.close)
+        started, release = threading.Event(), threading.Event()
+        order = []
+
+        def block():
+            started.set()
+            return release.wait()
+
+        # The only worker is busy while the tasks of both feeds are queued.
+        blocker = self._submit(executor, "a", block)
+        started.wait(timeout=10)
+        futures = [self._submit(executor, "a", order.append, f"a{task}") for task in range(4)]
+        futures += [self._submit(executor, "b", order.append, f"b{task}") for task in range(2)]
+        release.set()
+        for future in [blocker, *futures]:
+            future.result(timeout=10)
+        self.assertEqual(order, ["a0", "b0", "a1", "b1", "a2", "a3"])
+
+    def test_task_runs_for_its_feed(self):
+        executor = sgx_downloader.FairExecutor(2)
+        self.addCleanup(executor.close)
+        future = self._submit(executor, "b", sgx_downloader.FEED.get)
+        self.assertEqual(future.result(timeout=10), "b")
+
+    def test_closed_executor_cancels_queued_tasks(self):
+        executor = sgx_downloader.FairExecutor(1)
+        release = threading.Event()
+        blocker = self._submit(executor, "a", release.wait)
+        queued = self._submit(executor, "a", int)
+        closer = threading.Thread(target=executor.close)
+        closer.start()
+        # The running task is released once the queued task is cancelled.
+        while not queued.cancelled():
+            time.sleep(0.01)
+        release.set()
+        closer.join(timeout=10)
+        self.assertTrue(blocker.result(timeout=10))
+        self.assertTrue(queued.cancelled())
+        with self.assertRaises(RuntimeError):
+            self._submit(executor, "a", int)
+
+
+class FeedsFairnessTest(MockSgxTestCase):
+
+    def test_small_feed_is_not_held_back(self):
+        self.server.latency = 0.02
+        self.write_config("a.cfg", start=self.day(30), end=self.day(11), downloadfiles="tc",
+                          output=self.workdir / "data_a", indexfile=self.workdir / "a.json")
+        self.write_config("b.cfg", start=self.day(3), end=self.day(1), downloadfiles="tc",
+                          output=self.workdir / "data_b", indexfile=self.workdir / "b.json")
+        result = self.run_cli("-c", "a.cfg", "b.cfg")
+        self.assertEqual(result.returncode, 0, result.stdout)
+        downloads = [path for method, path, headers in self.stats.log if method == "GET" and "Range" not in headers]
+        self.assertEqual(len(downloads), 23)
+        small_feed = [index for index, path in enumerate(downloads)
+                      if int(path.split("/")[3]) in {self.day_id(offset) for offset in (1, 2, 3)}]
+        # The two workers take the files of the feeds in turn, so the 3 files of the small feed are
+        # among the first ones and do not wait for the 20 files of the other feed.
+        self.assertEqual(len(small_feed), 3)
+        self.assertLess(small_feed[-1], 8)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+"""Tests of the manifest of the downloaded files and --sync."""
+
+import json
+import unittest
+
+import sgx_downloader
+from tests.mock_sgx import MockSgxTestCase
+
+
+class SyncTest(MockSgxTestCase):
+
+    def _fetch(self, **options):
+        downloader = self.downloader(file=["td", "tc"], **options)
+        results = list(downloader.fetch_day(self.day(3)))
+        downloader.close()
+        self.assertTrue(all(result["ok"] for result in results), results)
+        return {result["file"]: result["path"] for result in results}
+
+    def test_manifest(self):
+        paths = self._fetch()
+        with open(self.workdir / "data" / sgx_downloader.MANIFEST_NAME) as manifest_file:
+            entries = {entry["filename"]: entry for entry in map(json.loads, manifest_file)}
+        self.assertEqual(sorted(entries), sorted(path.name for path in paths.values()))
+        for path in paths.values():
+            entry = entries[path.name]
+            self.assertEqual((entry["day_id"], entry["date"], entry["size"]), (self.day_id(3), self.day(3), self.FILE_SIZE))
+            self.assertEqual(entry["checksum"], sgx_downloader._file_checksum(path))
+
+    def test_sync_sends_no_request(self):
+        self._fetch()
+        self.stats.reset()
+        self._fetch(sync=True)
+        self.assertEqual(self.stats.requests, 0)
+
+    def test_sync_from_the_command_line(self):
+        config = self.write_config(day=self.day(3), downloadfiles="td,tc")
+        for _ in range(2):
+            self.stats.reset()
+            result = self.run_cli("-c", config, "--sync")
+            self.assertEqual(result.returncode, 0, result.stdout)
+        self.assertEqual(self.stats.requests, 0)
+
+    def test_sync_downloads_a_changed_file_again(self):
+        paths = self._fetch()
+        with open(paths["TC.txt"], "r+b") as changed_file:
+            changed_file.write(b"changed")
+        paths["WEBPXTICK_DT.zip"].unlink()
+        self.stats.reset()
+        paths = self._fetch(sync=True)
+        self.assertEqual(self.stats.gets, 2)
+        self.assertEqual(paths["TC.txt"].read_bytes(), self.server.body)
+
+    def test_without_sync(self):
+        self._fetch()
+        self.stats.reset()
+        self._fetch()
+        self.assertEqual(self.stats.gets, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
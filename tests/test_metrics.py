@@ -0,0 +1,96 @@
+"""Tests of the metrics of the requests and files (--metrics and --prometheus)."""
+
+import json
+import unittest
+
+import sgx_downloader
+from tests.mock_sgx import MockSgxTestCase
+
+
+class MetricsFileTest(MockSgxTestCase):
+
+    def _records(self, path):
+        with open(path) as metrics_file:
+            return [json.loads(line) for line in metrics_file]
+
+    def test_feeds_with_the_same_file_are_merged(self):
+        for name, offset in (("a", 3), ("b", 4)):
+            self.write_config(f"{name}.cfg", day=self.day(offset), output=self.workdir / f"data_{name}",
+                              downloadfiles="tc", metricsfile="metrics.jsonl", prometheusfile="sgx.prom")
+        result = self.run_cli("-c", "a.cfg", "b.cfg")
+        self.assertEqual(result.returncode, 0, result.stdout)
+        records = self._records(self.workdir / "metrics.jsonl")
+        files = [record for record in records if record["phase"] == "file"]
+        self.assertEqual(sorted(record["day"] for record in files), [self.day(4), self.day(3)])
+        self.assertEqual(sum(1 for record in records if record["phase"] == "transfer"), 2)
+        prometheus = (self.workdir / "sgx.prom").read_text()
+        self.assertIn('sgx_downloader_files_total{result="success"} 2', prometheus)
+
+    def test_feeds_with_their_own_file(self):
+        for name, offset in (("a", 3), ("b", 4)):
+            self.write_config(f"{name}.cfg", day=self.day(offset), output=self.workdir / f"data_{name}",
+                              downloadfiles="tc", metricsfile=f"{name}.jsonl")
+        result = self.run_cli("-c", "a.cfg", "b.cfg")
+        self.assertEqual(result.returncode, 0, result.stdout)
+        for name, offset in (("a", 3), ("b", 4)):
+            files = [record for record in self._records(self.workdir / f"{name}.jsonl") if record["phase"] == "file"]
+            self.assertEqual([record["day"] for record in files], [self.day(offset)])
+
+
+class MetricsRecordsTest(MockSgxTestCase):
+
+    def _records(self, path):
+        with open(path) as metrics_file:
+            return [json.loads(line) for line in metrics_file]
+
+    def test_records_of_a_retried_file(self):
+        link = self.link(self.day_id(3), "td")
+        downloader = self.downloader(file=["td"], metrics=str(self.workdir / "m.jsonl"),
+                                     prometheus=str(self.workdir / "sgx.prom"))
+        downloader.resolve(self.day(3))
+        self.server.scripted.append((503, {"Retry-After": "0"}))
+        [result] = downloader.fetch_day(self.day(3))
+        self.assertTrue(result["ok"], result["error"])
+        downloader.close()
+
+        records = self._records(self.workdir / "m.jsonl")
+        self.assertEqual([record["phase"] for record in records], ["probe", "transfer", "transfer", "file"])
+        failed, transfer = records[1:3]
+        self.assertEqual((failed["link"], failed["status"], failed["attempt"]), (link, 503, 0))
+        self.assertEqual((transfer["link"], transfer["status"], transfer["attempt"]), (link, 200, 1))
+        self.assertEqual(transfer["bytes"], self.FILE_SIZE)
+        self.assertLessEqual(transfer["ttfb"], transfer["latency"])
+        self.assertEqual({key: records[3][key] for key in ("link", "day", "retries", "success")},
+                         {"link": link, "day": self.day(3), "retries": 1, "success": True})
+
+        prometheus = (self.workdir / "sgx.prom").read_text()
+        for line in ('sgx_downloader_requests_total{phase="transfer",status="503"} 1',
+                     'sgx_downloader_requests_total{phase="transfer",status="200"} 1',
+                     f'sgx_downloader_bytes_total{{phase="transfer"}} {self.FILE_SIZE}',
+                     'sgx_downloader_files_total{result="success"} 1',
+                     'sgx_downloader_retries_total 1'):
+            self.assertIn(line + "\n", prometheus)
+        self.assertFalse((self.workdir / "sgx.prom.tmp").exists())
+
+    def test_options_of_the_command_line(self):
+        # The config has empty metricsfile and prometheusfile.
+        config = self.write_config(day=self.day(3), downloadfiles="tc")
+        result = self.run_cli("-c", config, "--metrics", "m.jsonl", "--prometheus", "sgx.prom")
+        self.assertEqual(result.returncode, 0, result.stdout)
+        phases = [record["phase"] for record in self._records(self.workdir / "m.jsonl")]
+        self.assertEqual(phases.count("file"), 1)
+        self.assertIn('sgx_downloader_files_total{result="success"} 1', (self.workdir / "sgx.prom").read_text())
+
+
+class PercentileTest(unittest.TestCase):
+
+    def test_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(sgx_downloader._percentile(values, 50), 50)
+        self.assertEqual(sgx_downloader._percentile(values, 95), 95)
+        self.assertEqual(sgx_downloader._percentile([3.0], 95), 3.0)
+        self.assertIsNone(sgx_downloader._percentile([], 50))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+"""Tests of the progress of the downloads (Progress, --progress-interval)."""
+
+import io
+import json
+import time
+import unittest
+
+import sgx_downloader
+from tests.mock_sgx import MockSgxTestCase
+
+
+class TerminalStream(io.StringIO):
+
+    def isatty(self):
+        return True
+
+
+class ProgressTest(unittest.TestCase):
+
+    def test_status(self):
+        progress = sgx_downloader.Progress(10, enabled=False)
+        self.addCleanup(progress.close)
+        progress.add(4)
+        self.assertEqual(progress.status()["queued"], 4)
+        self.assertIsNone(progress.status()["eta"])
+        with progress.transfer() as reporthook:
+            reporthook(100, 400)
+            reporthook(400, 400)
+        progress.finish(True)
+        with progress.transfer() as reporthook:
+            reporthook(300, 1000)
+            # 700 bytes in one second.
+            progress.start = time.monotonic() - 1
+            status = progress.status()
+            self.assertEqual((status["files"], status["done"], status["active"], status["queued"]), (4, 1, 1, 2))
+            self.assertEqual(status["bytes"], 700)
+            # The rest of the active file and two queued files of the average size (400 bytes).
+            self.assertAlmostEqual(status["eta"], (700 + 2 * 400) / 700, delta=0.2)
+        progress.finish(False)
+        status = progress.status()
+        self.assertEqual((status["done"], status["failed"], status["active"], status["queued"]), (1, 1, 0, 2))
+
+    def test_unknown_size_has_no_eta(self):
+        progress = sgx_downloader.Progress(10, enabled=False)
+        self.addCleanup(progress.close)
+        progress.add(1)
+        with progress.transfer() as reporthook:
+            reporthook(100, -1)
+            self.assertIsNone(progress.status()["eta"])
+
+    def test_json_lines(self):
+        stream = io.StringIO()
+        progress = sgx_downloader.Progress(0.05, stream=stream)
+        progress.add(2)
+        progress.finish(True)
+        progress.close()
+        lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+        self.assertTrue(lines)
+        self.assertEqual(lines[-1]["progress"]["done"], 1)
+        self.assertEqual(lines[-1]["progress"]["queued"], 1)
+
+    def test_terminal_line(self):
+        stream = TerminalStream()
+        progress = sgx_downloader.Progress(10, stream=stream)
+        progress.add(2)
+        with progress.hidden():
+            stream.write("log\n")
+        progress.finish(True)
+        progress.close()
+        output = stream.getvalue()
+        self.assertIn("log\n", output)
+        self.assertIn("\x1b[K1/2 file(s), 0 active, 1 queued, 0 failed", output)
+        self.assertTrue(output.endswith("\r\n"))
+
+    def test_disabled(self):
+        stream = io.StringIO()
+        progress = sgx_downloader.Progress(0.01, enabled=False, stream=stream)
+        progress.add(1)
+        progress.finish(True)
+        progress.close()
+        self.assertEqual(stream.getvalue(), "")
+
+
+class ProgressCliTest(MockSgxTestCase):
+
+    def test_json_lines_when_stderr_is_not_a_terminal(self):
+        self.server.latency = 0.02
+        config = self.write_config(start=self.day(8), end=self.day(1), downloadfiles="tc", quiet="false",
+                                   loglevel="warning")
+        result = self.run_cli("-c", config)
+        self.assertEqual(result.returncode, 0, result.stdout)
+        lines = [json.loads(line)["progress"] for line in result.stdout.splitlines() if line.startswith('{"time"')]
+        self.assertGreater(len(lines), 1)
+        self.assertEqual(lines[-1], {"files": 8, "done": 8, "failed": 0, "active": 0, "queued": 0,
+                                     "bytes": 8 * self.FILE_SIZE, "mb_per_s": lines[-1]["mb_per_s"], "eta": 0.0})
+        # The counts only grow.
+        self.assertEqual([line["done"] for line in lines], sorted(line["done"] for line in lines))
+
+    def test_quiet(self):
+        config = self.write_config(start=self.day(2), end=self.day(1), downloadfiles="tc")
+        result = self.run_cli("-c", config)
+        self.assertEqual(result.returncode, 0, result.stdout)
+        self.assertNotIn('{"time"', result.stdout)
+
+
+if __name__ == "__main__":
+    unittest.main()
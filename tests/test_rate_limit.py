@@ -0,0 +1,113 @@
+"""Tests of the rate limits (--max-rps, --max-bps, SCHEDULE) and of the push back of the server."""
+
+import time
+import unittest
+from datetime import datetime
+
+import sgx_downloader
+from sgx_downloader import RateLimiter
+from tests.mock_sgx import MockSgxTestCase
+
+
+class RateLimiterTest(unittest.TestCase):
+
+    def test_push_back_halves_the_rate(self):
+        limiter = RateLimiter(8)
+        with self.assertLogs(level="WARNING"):
+            limiter.push_back()
+        self.assertEqual(limiter.adaptive_rps, 4)
+        # The requests in flight when the server pushed back only halve the rate once.
+        limiter.push_back()
+        self.assertEqual(limiter.adaptive_rps, 4)
+        # No recovery between the next push backs.
+        limiter.RECOVERY_TIME = float("inf")
+        for rate in (2, 1, 1):
+            limiter.last_push_back -= 2
+            with self.assertLogs(level="WARNING"):
+                limiter.push_back()
+            # The rate does not go below MIN_ADAPTIVE_FRACTION of the rate before the first push back.
+            self.assertEqual(limiter.adaptive_rps, rate)
+
+    def test_recovery(self):
+        limiter = RateLimiter(8)
+        with self.assertLogs(level="WARNING"):
+            limiter.push_back()
+        now = time.monotonic()
+        self.assertAlmostEqual(limiter._request_rate(8, now), 4, delta=0.01)
+        limiter.last_push_back = now - RateLimiter.RECOVERY_TIME / 2
+        self.assertAlmostEqual(limiter._request_rate(8, now), 4 * 2 ** 0.5, delta=0.01)
+        limiter.last_push_back = now - RateLimiter.RECOVERY_TIME
+        with self.assertLogs(level="INFO") as logs:
+            limiter.wait()
+        self.assertIn("back to the full request rate", logs.output[0])
+        self.assertIsNone(limiter.adaptive_rps)
+
+    def test_push_back_without_limit_measures_the_rate(self):
+        limiter = RateLimiter(0)
+        for _ in range(10):
+            limiter.wait()
+        with self.assertLogs(level="WARNING"):
+            limiter.push_back()
+        # 10 requests in less than a second.
+        self.assertEqual(limiter.adaptive_rps, 5)
+
+    def test_retry_after_holds_the_requests(self):
+        limiter = RateLimiter(0)
+        with self.assertLogs(level="WARNING") as logs:
+            limiter.push_back(2)
+        self.assertIn("after 2 s", logs.output[0])
+        self.assertAlmostEqual(limiter._reserve(), 2, delta=0.1)
+
+    def test_schedule(self):
+        # 08:30-17:00 and 22:00-06:00 (wraps midnight).
+        limiter = RateLimiter(10, 1000, [sgx_downloader._schedule_window("0830-1700=2,500"),
+                                         sgx_downloader._parse_window("2200-0600", "5")])
+        self.assertEqual(limiter.limits(datetime(2026, 6, 1, 8, 29)), (10, 1000))
+        self.assertEqual(limiter.limits(datetime(2026, 6, 1, 8, 30)), (2, 500))
+        self.assertEqual(limiter.limits(datetime(2026, 6, 1, 17, 0)), (10, 1000))
+        self.assertEqual(limiter.limits(datetime(2026, 6, 1, 23, 0)), (5, 0))
+        self.assertEqual(limiter.limits(datetime(2026, 6, 2, 5, 59)), (5, 0))
+
+    def test_parse_retry_after(self):
+        self.assertEqual(sgx_downloader._parse_retry_after("3"), 3)
+        self.assertEqual(sgx_downloader._parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT"), 0)
+        self.assertIsNone(sgx_downloader._parse_retry_after("soon"))
+        self.assertIsNone(sgx_downloader._parse_retry_after(None))
+
+
+class PushBackTest(MockSgxTestCase):
+
+    def test_429_with_retry_after(self):
+        self.server.scripted.append((429, {"Retry-After": "1"}))
+        downloader = self.downloader(file=["tc"], max_rps=20)
+        started = time.monotonic()
+        with self.assertLogs(level="WARNING") as logs:
+            results = list(downloader.fetch_day(self.day(2)))
+        elapsed = time.monotonic() - started
+        self.assertTrue(results[0]["ok"], results[0]["error"])
+        self.assertEqual(self.stats.snapshot()["errors"], 1)
+        # The requests after the push back waited for the Retry-After at half the request rate.
+        self.assertGreaterEqual(elapsed, 0.9)
+        self.assertEqual(downloader.feed.rate_limiter.adaptive_rps, 10)
+        self.assertTrue(any("slow down to 10.00 request(s) per second after 1 s" in line for line in logs.output))
+
+    def test_503_without_retry_after_does_not_slow_down(self):
+        self.server.scripted.append((503, {}))
+        downloader = self.downloader(file=["tc"], max_rps=20)
+        with self.assertLogs(level="WARNING"):
+            results = list(downloader.fetch_day(self.day(2)))
+        self.assertTrue(results[0]["ok"], results[0]["error"])
+        self.assertIsNone(downloader.feed.rate_limiter.adaptive_rps)
+
+    def test_max_bps(self):
+        downloader = self.downloader(file=["tc"], max_bps=4 * self.FILE_SIZE)
+        started = time.monotonic()
+        results = list(downloader.fetch_range(self.day(6), self.day(1)))
+        elapsed = time.monotonic() - started
+        self.assertTrue(all(result["ok"] for result in results))
+        # 6 files of FILE_SIZE bytes at 4 FILE_SIZE per second, after a burst of one chunk.
+        self.assertGreaterEqual(elapsed, 1.2)
+
+
+if __name__ == "__main__":
+    unittest.main()
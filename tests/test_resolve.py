@@ -0,0 +1,65 @@
+"""Tests of the resolution of days to day_ids against the mock SGX server."""
+
+import unittest
+
+from tests.mock_sgx import MockSgxTestCase, benchmark
+
+
+class ResolveTest(MockSgxTestCase):
+    """Resolve days against the mock SGX server without an index."""
+
+    def test_stale_pivot(self):
+        # The pivot of the config is 30 ids after the latest one, like an old pivot with unknown holidays.
+        downloader = self.downloader(self.write_config(pivotorder=self.PIVOT_ID + 30))
+        self.assertEqual(downloader.resolve(self.day(4)), [(self.day_id(4), self.day(4))])
+
+    def test_infer_range(self):
+        expected = [(self.day_id(offset), self.day(offset)) for offset in range(12, 1, -1)]
+        self.assertEqual(self.downloader().resolve(self.day(12), self.day(2)), expected)
+        # Only the start and the end days are probed, the days between them are inferred.
+        self.assertEqual(self.stats.snapshot()["probes"], 2)
+
+        self.stats.reset()
+        downloader = self.downloader(self.write_config("probe.cfg", indexfile=self.workdir / "probe.json"),
+                                     infer_range=False)
+        self.assertEqual(downloader.resolve(self.day(12), self.day(2)), expected)
+        self.assertEqual(self.stats.snapshot()["probes"], len(expected))
+
+    def test_no_infer_range_option(self):
+        config = self.write_config(start=self.day(12), end=self.day(2), file="tc", inferrange="true")
+        result = self.run_cli("-c", config, "--no-infer-range")
+        self.assertEqual(result.returncode, 0, result.stdout)
+        self.assertGreaterEqual(self.stats.snapshot()["probes"], 11)
+
+    def test_inferred_days_are_checked(self):
+        # The feed has a day_id without data and a holiday that the config does not list, so the days
+        # inferred between the start and the end days are wrong from the hole to the holiday.
+        days = {offset: self.day(offset) for offset in range(13)}
+        hole, holiday = self.day_id(6), self.feed.days[self.day_id(8)]
+        self.feed = self.server.feed = benchmark.MockFeed(self.feed.pivot_date, self.PIVOT_ID, self.HISTORY,
+                                                          {hole}, {holiday})
+        for key, saved_name in (("tc", "TC_{day}.txt"), ("td", "WEBPXTICK_DT-{day}.zip")):
+            with self.subTest(file=key):
+                index = self.workdir / f"{key}.json"
+                downloader = self.downloader(self.write_config(f"{key}.cfg", indexfile=index), file=[key])
+                results = list(downloader.fetch_range(days[12], days[2]))
+                self.assertEqual(len(results), 11)
+                failed = [result for result in results if not result["ok"]]
+                self.assertEqual([result["id"] for result in failed], [hole])
+                self.assertIsInstance(failed[0]["error"], FileNotFoundError)
+                for result in results:
+                    if result["ok"]:
+                        # Every file is saved in the folder of the day in its name.
+                        self.assertEqual(result["path"].parent.name, result["day"])
+                        self.assertEqual(result["path"].name, saved_name.format(day=result["day"]))
+                        self.assertEqual(result["day"], f"{self.feed.days[result['id']]:%Y%m%d}")
+                day_index = downloader.feed.day_index
+                self.assertEqual(day_index.days[hole - 1], days[6])
+                self.assertEqual(day_index.days[hole - 2], days[7])
+                self.assertNotIn(hole, day_index.days)
+                # Only the key file tells that the day_id has no data, the day of the hole is read again otherwise.
+                self.assertEqual(hole in day_index.missing, key == "tc")
+
+
+if __name__ == "__main__":
+    unittest.main()
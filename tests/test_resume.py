@@ -0,0 +1,68 @@
+"""Tests of the .part downloads that continue with Range requests."""
+
+import json
+import unittest
+
+from tests.mock_sgx import MockSgxTestCase, benchmark
+
+
+class ResumeTest(MockSgxTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.qid = self.day_id(3)
+        self.path = f"/1.0.0/{benchmark.FEED}/{self.qid}/{benchmark.FILE_NAME['td']}"
+        self.save_dir = self.workdir / "data" / self.day(3)
+
+    def _fetch(self, **options):
+        downloader = self.downloader(file=["td"], **options)
+        results = list(downloader.fetch_day(self.day(3)))
+        downloader.close()
+        return results
+
+    def _gets(self):
+        return [headers for method, path, headers in self.stats.log
+                if method == "GET" and path == self.path and headers.get("Range") != "bytes=0-0"]
+
+    def test_retry_continues_a_truncated_body(self):
+        self.server.cut.add(self.path)
+        [result] = self._fetch(max_retry=1)
+        self.assertTrue(result["ok"], result["error"])
+        self.assertEqual(result["path"].read_bytes(), self.server.body)
+        first, second = self._gets()
+        self.assertNotIn("Range", first)
+        self.assertEqual(second["Range"], f"bytes={self.FILE_SIZE // 2}-")
+        self.assertEqual(second["If-Range"], f'"{self.qid}-{benchmark.FILE_NAME["td"]}-{self.FILE_SIZE}"')
+        self.assertEqual(self.stats.bytes_sent, self.FILE_SIZE)
+        self.assertEqual(list(self.save_dir.glob("*.part*")), [])
+
+    def test_next_run_continues_the_part_file(self):
+        self.server.cut.add(self.path)
+        [result] = self._fetch(max_retry=0)
+        self.assertFalse(result["ok"])
+        part_path = self.save_dir / f"{benchmark.FILE_NAME['td']}.part"
+        self.assertEqual(part_path.stat().st_size, self.FILE_SIZE // 2)
+
+        [result] = self._fetch(max_retry=0)
+        self.assertTrue(result["ok"], result["error"])
+        self.assertEqual(result["path"].read_bytes(), self.server.body)
+        self.assertEqual(self._gets()[-1]["Range"], f"bytes={self.FILE_SIZE // 2}-")
+        self.assertFalse(part_path.exists())
+
+    def test_changed_file_is_downloaded_again(self):
+        # The part file is from another version of the file: the server ignores the Range.
+        self.save_dir.mkdir(parents=True)
+        part_path = self.save_dir / f"{benchmark.FILE_NAME['td']}.part"
+        part_path.write_bytes(b"x" * 1000)
+        with open(f"{part_path}.json", "w") as info_file:
+            json.dump({"link": self.link(self.qid, "td"), "filename": "old.zip", "offset": 1000,
+                       "etag": '"old"', "last_modified": None}, info_file)
+        [result] = self._fetch(max_retry=0)
+        self.assertTrue(result["ok"], result["error"])
+        self.assertEqual(result["path"].read_bytes(), self.server.body)
+        [get] = self._gets()
+        self.assertEqual((get["Range"], get["If-Range"]), ("bytes=1000-", '"old"'))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,146 @@
+"""Tests of the retries of the failed files."""
+
+import argparse
+import unittest
+import zipfile
+from unittest import mock
+from urllib.error import ContentTooShortError, HTTPError, URLError
+
+import sgx_downloader
+from tests.mock_sgx import MockSgxTestCase
+
+
+class BackoffTest(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(sgx_downloader, "args", argparse.Namespace(backoff=1, max_backoff=8), create=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_exponential_with_jitter(self):
+        for retry, delay in ((1, 1), (2, 2), (3, 4), (4, 8), (10, 8)):
+            for _ in range(20):
+                self.assertTrue(delay / 2 <= sgx_downloader._backoff_delay(retry) <= delay, retry)
+
+    def test_retry_after(self):
+        error = HTTPError("http://x", 429, "Too Many Requests", {"Retry-After": "30"}, None)
+        self.assertEqual(sgx_downloader._backoff_delay(1, error), 30)
+        error = HTTPError("http://x", 503, "Service Unavailable", {"Retry-After": "0"}, None)
+        self.assertLessEqual(sgx_downloader._backoff_delay(1, error), 1)
+
+    def test_transient_errors(self):
+        for error in (HTTPError("http://x", 503, "", {}, None), HTTPError("http://x", 429, "", {}, None),
+                      URLError("refused"), ContentTooShortError("short", None), zipfile.BadZipFile("crc")):
+            self.assertTrue(sgx_downloader._is_transient(error), error)
+        for error in (HTTPError("http://x", 404, "", {}, None), FileNotFoundError("no data")):
+            self.assertFalse(sgx_downloader._is_transient(error), error)
+
+
+class DeferredRetryTest(MockSgxTestCase):
+
+    def _jobs(self, offsets, **options):
+        """Resolve days and list the jobs of their 'tc' file for a Downloader with one worker.
+
+        Returns:
+            Downloader: The downloader.
+            list: The jobs.
+        """
+        downloader = self.downloader(file=["tc"], workers=1, **options)
+        days = [(self.day_id(offset), self.day(offset)) for offset in offsets]
+        for day_id, str_day in days:
+            self.assertEqual(downloader.resolve(str_day), [(day_id, str_day)])
+        return downloader, [({"id": day_id, "day": str_day}, "TC.txt") for day_id, str_day in days]
+
+    def test_other_files_go_on_while_a_file_waits(self):
+        downloader, jobs = self._jobs([3, 4, 5], backoff=0.3)
+        # The first GET (the file of the first day) fails.
+        self.server.scripted.append((503, {}))
+        results = list(downloader.iter_results(jobs))
+        self.assertEqual([result["day"] for result in results], [self.day(4), self.day(5), self.day(3)])
+        self.assertTrue(all(result["ok"] for result in results), results)
+
+    def test_give_up_after_max_retry(self):
+        downloader, jobs = self._jobs([3], backoff=0.01, max_retry=2)
+        self.server.scripted.extend([(503, {})] * 3)
+        [result] = downloader.iter_results(jobs)
+        self.assertFalse(result["ok"])
+        self.assertEqual(result["error"].code, 503)
+        self.assertEqual(self.stats.errors, 3)
+
+    def test_permanent_error_is_not_retried(self):
+        downloader, jobs = self._jobs([3], backoff=0.01)
+        self.server.scripted.append((404, {}))
+        [result] = downloader.iter_results(jobs)
+        self.assertEqual(result["error"].code, 404)
+        self.assertEqual(self.stats.gets, 1)
+
+    def test_failed_log(self):
+        # The day is resolved and saved in the index, so the first GETs are the tries of the file.
+        self._jobs([3])[0].close()
+        config = self.write_config(day=self.day(3), downloadfiles="tc", max_retry=1, backoff=0.01)
+        for engine in ("thread", "async"):
+            with self.subTest(engine=engine):
+                self.stats.reset()
+                self.server.scripted.extend([(503, {})] * 2)
+                result = self.run_cli("-c", config, "--engine", engine)
+                self.assertEqual((self.stats.errors, self.stats.gets), (2, 2), result.stdout)
+                failed = (self.workdir / "failed.txt").read_text()
+                self.assertIn(f"{self.link(self.day_id(3), 'tc')}\t{self.day(3)}\tHTTPError\tcode=503", failed)
+                (self.workdir / "failed.txt").unlink()
+
+
+class RetryOptionTest(MockSgxTestCase):
+
+    HEADER = "Link\tQueryDay\tErrorType\n"
+
+    def setUp(self):
+        super().setUp()
+        self.config = self.write_config(downloadfiles="tc", max_retry=0)
+        self.failed_path = self.workdir / "failed.txt"
+
+    def _row(self, offset, key="tc"):
+        return f"{self.link(self.day_id(offset), key)}\t{self.day(offset)}\tURLError\n"
+
+    def _retry(self, *argv):
+        result = self.run_cli("-c", self.config, "--retry", *argv)
+        self.assertEqual(result.returncode, 0, result.stdout)
+        self.assertFalse((self.workdir / "failed.txt.retrying").exists())
+        self.assertFalse((self.workdir / "failed.txt.done").exists())
+        return result
+
+    def test_each_link_once(self):
+        self.failed_path.write_text(self.HEADER + self._row(3) + self._row(4) + self._row(3) + "\n" + self._row(3, "td"))
+        self._retry()
+        self.assertEqual(self.stats.gets, 3)
+        self.assertEqual(self.stats.probes, 0)
+        self.assertEqual(len(self.stats.files), 3)
+        self.assertEqual(self.failed_path.read_text(), self.HEADER)
+        self.assertTrue((self.workdir / "data" / self.day(4) / f"TC_{self.day(4)}.txt").exists())
+
+    def test_links_that_fail_again_and_bad_rows_are_kept(self):
+        self.failed_path.write_text(self.HEADER + "not a link\n" + self._row(3))
+        self.server.scripted.append((503, {}))
+        self._retry("failed.txt")
+        self.assertEqual(self.failed_path.read_text().splitlines(), [
+            self.HEADER.rstrip("\n"), "not a link",
+            f"{self.link(self.day_id(3), 'tc')}\t{self.day(3)}\tHTTPError\tcode=503\terrno=None"])
+
+    def test_continue_an_interrupted_retry(self):
+        (self.workdir / "failed.txt.retrying").write_text(self.HEADER + self._row(3) + self._row(4) + self._row(5))
+        (self.workdir / "failed.txt.done").write_text(self.link(self.day_id(3), "tc") + "\n")
+        self._retry()
+        self.assertEqual(self.stats.gets, 2)
+        self.assertFalse((self.workdir / "data" / self.day(3)).exists())
+        self.assertNotIn("http", self.failed_path.read_text())
+
+    def test_retry_of_another_file(self):
+        (self.workdir / "old.txt").write_text(self.HEADER + self._row(3))
+        self._retry("old.txt")
+        self.assertEqual(self.stats.gets, 1)
+        # The links that fail again go to the failed log, no new file is started at the retried path.
+        self.assertFalse((self.workdir / "old.txt").exists())
+        self.assertFalse((self.workdir / "old.txt.retrying").exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
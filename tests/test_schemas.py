@@ -0,0 +1,135 @@
+"""Tests of the schema registry of the structure files and --skip-structure."""
+
+import tempfile
+import unittest
+from pathlib import Path
+
+from sgx_downloader import SCHEMA_DIR_NAME, SchemaRegistry
+from tests.mock_sgx import TICK_STRUCTURE, MockSgxTestCase
+
+STRUCTURE_NAME = "TickData_structure.dat"
+NEW_STRUCTURE = TICK_STRUCTURE + b"Buyer          Buyer id           varchar(10)\n"
+
+
+class SchemaRegistryTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        self.registry = SchemaRegistry(self.directory / "schemas")
+
+    def _add(self, day_id, content, etag=None, registry=None):
+        path = self.directory / f"{day_id}.dat"
+        path.write_bytes(content)
+        return (registry or self.registry).add(STRUCTURE_NAME, day_id, path, etag)
+
+    def test_versions(self):
+        first = self._add(100, TICK_STRUCTURE, '"a"')
+        self.assertEqual(self._add(101, TICK_STRUCTURE, '"a"'), first)
+        second = self._add(110, NEW_STRUCTURE, '"b"')
+        self.assertNotEqual(second, first)
+        entry = self.registry.data[STRUCTURE_NAME]
+        self.assertEqual(sorted(entry["versions"]), sorted([first, second]))
+        self.assertEqual(entry["days"], {"100": first, "101": first, "110": second})
+        self.assertEqual(len(list((self.directory / "schemas" / "TickData_structure").iterdir())), 2)
+
+    def test_lookup_nearest_day_before(self):
+        self._add(100, TICK_STRUCTURE)
+        self._add(110, NEW_STRUCTURE)
+        self.assertEqual(len(self.registry.lookup(STRUCTURE_NAME, 105)), 10)
+        self.assertEqual(len(self.registry.lookup(STRUCTURE_NAME, 110)), 11)
+        self.assertEqual(len(self.registry.lookup(STRUCTURE_NAME, 200)), 11)
+        # Before the first registered day, the first version.
+        self.assertEqual(len(self.registry.lookup(STRUCTURE_NAME, 50)), 10)
+        self.assertIsNone(self.registry.lookup("TC_structure.dat", 100))
+
+    def test_known_etag(self):
+        checksum = self._add(100, TICK_STRUCTURE, '"a"')
+        self.assertFalse(self.registry.has_etags("TC_structure.dat"))
+        self.assertTrue(self.registry.has_etags(STRUCTURE_NAME))
+        self.assertEqual(self.registry.known(STRUCTURE_NAME, 120, '"a"'), checksum)
+        self.assertEqual(self.registry.data[STRUCTURE_NAME]["days"]["120"], checksum)
+        self.assertIsNone(self.registry.known(STRUCTURE_NAME, 121, '"b"'))
+        self.assertIsNone(self.registry.known(STRUCTURE_NAME, 121, None))
+
+    def test_without_etag(self):
+        self._add(100, TICK_STRUCTURE)
+        self.assertFalse(self.registry.has_etags(STRUCTURE_NAME))
+
+    def test_reload(self):
+        checksum = self._add(100, TICK_STRUCTURE, '"a"')
+        self._add(110, NEW_STRUCTURE)
+        registry = SchemaRegistry(self.directory / "schemas")
+        self.assertEqual(registry.known(STRUCTURE_NAME, 105, '"a"'), checksum)
+        self.assertEqual(len(registry.lookup(STRUCTURE_NAME, 107)), 10)
+        self.assertEqual(len(registry.lookup(STRUCTURE_NAME, 111)), 11)
+
+    def test_unreadable_file(self):
+        (self.directory / "schemas").mkdir()
+        (self.directory / "schemas" / "schemas.json").write_text('{"TickData_structure.dat": {"ver')
+        with self.assertLogs(level="WARNING"):
+            registry = SchemaRegistry(self.directory / "schemas")
+        self.assertIsNone(registry.lookup(STRUCTURE_NAME, 100))
+        self._add(100, TICK_STRUCTURE, registry=registry)
+        self.assertEqual(len(SchemaRegistry(self.directory / "schemas").lookup(STRUCTURE_NAME, 100)), 10)
+
+
+class SkipStructureTest(MockSgxTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.server.bodies[STRUCTURE_NAME] = TICK_STRUCTURE
+
+    def _fetch(self, *offsets, **options):
+        downloader = self.downloader(file=["tds"], skip_structure=True, **options)
+        for offset in offsets:
+            results = list(downloader.fetch_day(self.day(offset)))
+            self.assertTrue(all(result["ok"] for result in results), results)
+        downloader.close()
+
+    def _requests(self, method):
+        return [path for command, path, headers in self.stats.log
+                if command == method and path.endswith(STRUCTURE_NAME) and headers.get("Range") != "bytes=0-0"]
+
+    def test_known_version_is_not_downloaded(self):
+        self._fetch(3)
+        self.stats.reset()
+        self._fetch(4, 5)
+        self.assertEqual(len(self._requests("GET")), 0)
+        self.assertEqual(len(self._requests("HEAD")), 2)
+        registry = SchemaRegistry(self.workdir / "data" / SCHEMA_DIR_NAME)
+        self.assertEqual(registry.lookup(STRUCTURE_NAME, self.day_id(5)), registry.lookup(STRUCTURE_NAME, self.day_id(3)))
+        self.assertFalse((self.workdir / "data" / self.day(5)).exists())
+
+    def test_first_download_is_not_probed(self):
+        self._fetch(3, 4)
+        self.assertEqual(len(self._requests("HEAD")), 1)
+        self.assertEqual(len(self._requests("GET")), 1)
+
+    def test_without_etag(self):
+        self.server.etag = False
+        self._fetch(3, 4, 5)
+        self.assertEqual(len(self._requests("HEAD")), 0)
+        self.assertEqual(len(self._requests("GET")), 3)
+
+    def test_server_stops_sending_etags(self):
+        self._fetch(3)
+        self.server.etag = False
+        self.stats.reset()
+        self._fetch(4, 5, 6)
+        # Only the first probe, the next files are downloaded without one.
+        self.assertEqual(len(self._requests("HEAD")), 1)
+        self.assertEqual(len(self._requests("GET")), 3)
+
+    def test_option_of_the_command_line(self):
+        self._fetch(3)
+        self.stats.reset()
+        config = self.write_config(day=self.day(4), downloadfiles="tds")
+        result = self.run_cli("-c", config, "--skip-structure")
+        self.assertEqual(result.returncode, 0, result.stdout)
+        self.assertEqual(len(self._requests("GET")), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+"""Tests of the zip check and extraction (--verify and --extract)."""
+
+import io
+import tempfile
+import unittest
+import zipfile
+from pathlib import Path
+
+import sgx_downloader
+from tests.mock_sgx import TICK_CSV, MockSgxTestCase, zip_bytes
+
+
+def _corrupt(data):
+    """Flip a byte in the compressed data of the first member (its CRC-32 no longer matches)."""
+    offset = 30 + len(zipfile.ZipFile(io.BytesIO(data)).infolist()[0].filename) + 20
+    return data[:offset] + bytes([data[offset] ^ 0xff]) + data[offset + 1:]
+
+
+class CheckZipTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        self.extract_dir = self.directory / "day"
+        self.extract_dir.mkdir()
+
+    def _check(self, data, extract=True):
+        path = self.directory / "test.zip"
+        path.write_bytes(data)
+        return sgx_downloader._check_zip(path, self.extract_dir if extract else None)
+
+    def test_extract(self):
+        extracted = self._check(zip_bytes([("WEBPXTICK_DT-20260610.csv", TICK_CSV), ("readme.txt", b"text")]))
+        self.assertEqual(extracted, ["WEBPXTICK_DT-20260610.csv"])
+        self.assertEqual(sorted(path.name for path in self.extract_dir.iterdir()), ["WEBPXTICK_DT-20260610.csv"])
+        self.assertEqual((self.extract_dir / "WEBPXTICK_DT-20260610.csv").read_bytes(), TICK_CSV)
+
+    def test_verify_only(self):
+        self.assertEqual(self._check(zip_bytes([("a.csv", TICK_CSV)]), extract=False), [])
+        self.assertEqual(list(self.extract_dir.iterdir()), [])
+
+    def test_members_with_the_same_name(self):
+        extracted = self._check(zip_bytes([("a/data.csv", TICK_CSV), ("b/data.csv", TICK_CSV[:100]), ("../c.csv", TICK_CSV)]))
+        self.assertEqual(extracted, ["a/data.csv", "b/data.csv", "c.csv"])
+        self.assertEqual((self.extract_dir / "b" / "data.csv").read_bytes(), TICK_CSV[:100])
+
+    def test_corrupt_member(self):
+        data = _corrupt(zip_bytes([("a.csv", TICK_CSV), ("b.csv", TICK_CSV)]))
+        for extract in (False, True):
+            with self.assertRaises(zipfile.BadZipFile):
+                self._check(data, extract)
+        self.assertEqual(list(self.extract_dir.iterdir()), [])
+
+    def test_truncated(self):
+        data = zip_bytes([("a.csv", TICK_CSV)])
+        with self.assertRaises(zipfile.BadZipFile):
+            self._check(data[:len(data) // 2])
+        self.assertEqual(list(self.extract_dir.iterdir()), [])
+
+
+class ZipDownloadTest(MockSgxTestCase):
+
+    def _fetch(self, *argv):
+        config = self.write_config(day=self.day(3), downloadfiles="td", max_retry=0)
+        result = self.run_cli("-c", config, *argv)
+        return result, self.workdir / "data" / self.day(3)
+
+    def test_extract_from_the_command_line(self):
+        self.server.bodies["WEBPXTICK_DT.zip"] = zip_bytes([("WEBPXTICK_DT.csv", TICK_CSV)])
+        result, day_dir = self._fetch("--extract")
+        self.assertEqual(result.returncode, 0, result.stdout)
+        self.assertEqual((day_dir / "WEBPXTICK_DT.csv").read_bytes(), TICK_CSV)
+        self.assertTrue((day_dir / f"WEBPXTICK_DT-{self.day(3)}.zip").exists())
+
+    def test_corrupt_zip_is_logged(self):
+        self.server.bodies["WEBPXTICK_DT.zip"] = _corrupt(zip_bytes([("WEBPXTICK_DT.csv", TICK_CSV)]))
+        result, day_dir = self._fetch("--verify")
+        self.assertEqual(list(day_dir.iterdir()), [])
+        failed = (self.workdir / "failed.txt").read_text()
+        self.assertIn(f"{self.link(self.day_id(3), 'td')}\t{self.day(3)}\tBadZipFile", failed)
+
+
+if __name__ == "__main__":
+    unittest.main()